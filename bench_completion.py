@@ -0,0 +1,148 @@
+'''
+Benchmark latency of command: netmiko timing read vs prompt-driven completion
+Simulated device - local ssh server with cisco-like cli
+'''
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+assert sys.version_info.major == 3, 'For script run please use python3'
+import asyncssh
+from netmiko import ConnectHandler
+
+import core_completion
+
+PROMPT = 'sim-sw#'
+USERNAME = 'bench'
+PASSWORD = 'bench'
+CONFIG = ''.join(f'interface GigabitEthernet0/{num}\n description port {num}\n switchport access vlan {num % 10 + 1}\n!\n'
+                 for num in range(48)) + 'end\n'
+OUTPUTS = {'show run': CONFIG,
+           'show clock': '*12:00:00.000 UTC Fri Nov 13 2020\n'}
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+class SimServer(asyncssh.SSHServer):
+    '''
+    Accept any password
+    '''
+
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    def validate_password(self, username, password):
+        return True
+
+
+async def sim_shell(process, latency):
+    '''
+    Cli of simulated device: echo of input, output of known commands after latency, prompt
+    '''
+    process.stdout.write(PROMPT)
+    line = ''
+    try:
+        while True:
+            data = await process.stdin.read(1)
+            if not data:
+                break
+            if data in '\r\n':
+                process.stdout.write('\r\n')
+                command = line.strip()
+                line = ''
+                if command:
+                    await asyncio.sleep(latency)
+                    output = OUTPUTS.get(command, '')
+                    process.stdout.write(output.replace('\n', '\r\n'))
+                process.stdout.write(PROMPT)
+            else:
+                line += data
+                process.stdout.write(data)
+    except asyncssh.BreakReceived:
+        pass
+    process.exit(0)
+
+
+def start_server(port, latency):
+    '''
+    Start simulated device in thread
+    '''
+    ready = threading.Event()
+
+    async def serve():
+        key = asyncssh.generate_private_key('ssh-ed25519')
+        await asyncssh.create_server(SimServer, '127.0.0.1', port, server_host_keys=[key],
+                                     process_factory=lambda process: sim_shell(process, latency),
+                                     line_editor=False)
+        ready.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    ready.wait()
+
+
+def bench(func, count):
+    '''
+    Return list of command latency in seconds
+    '''
+    result = list()
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        result.append(time.perf_counter() - start)
+    return result
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start benchmark")
+    parser = argparse.ArgumentParser(description='Benchmark latency of command completion')
+    parser.add_argument('--port', '-p', action='store', type=int, default=22022,
+                        help="Port of simulated device")
+    parser.add_argument('--latency', '-l', action='store', type=float, default=0.05,
+                        help="Latency of simulated device, seconds")
+    parser.add_argument('--count', '-n', action='store', type=int, default=5,
+                        help="Count of commands")
+    parser.add_argument('--command', '-c', action='store', default='show run',
+                        help="Command for benchmark")
+    args = parser.parse_args()
+
+    start_server(args.port, args.latency)
+    connection = ConnectHandler(device_type='cisco_ios', host='127.0.0.1', port=args.port, username=USERNAME,
+                                password=PASSWORD, global_delay_factor=2)
+    timing = bench(lambda: connection.send_command_timing(args.command, delay_factor=5), args.count)
+    prompt = bench(lambda: core_completion.send_command(connection, args.command,
+                                                        [core_completion.CISCO_CONFIG_TRAILER]), args.count)
+    same = connection.send_command_timing(args.command) == core_completion.send_command(connection, args.command)
+    connection.disconnect()
+    print(f'Command: {args.command}, device latency {args.latency}s')
+    print(f'Timing read: median {statistics.median(timing):.3f}s, max {max(timing):.3f}s')
+    print(f'Prompt read: median {statistics.median(prompt):.3f}s, max {max(prompt):.3f}s')
+    print(f'Speedup: {statistics.median(timing)/statistics.median(prompt):.1f}x, equal output: {same}')
+    logger.info("End benchmark")
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+'''
+Benchmark of flows dev_connect, get_users and save_config against simulated devices
+Devices started by sim_devices in local processes, inventory generated for them with groups of repo
+Every flow run for every count of hosts in modes:
+    threaded - nornir runner (limited from config.yaml or threaded)
+    async - asyncssh tasks of core_async (save_config have not async mode)
+JunOS devices excluded from save_config - napalm junos driver work over netconf, it not simulated
+Host counted as failed if marked with error or any field of result not equal expected record of host,
+expected record - output of simulated device for command of flow parsed by parse function of platform,
+save_config - normalized config in store not equal config of simulated device
+Benchmark exit with 1 if any host failed
+'''
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+assert sys.version_info.major == 3, 'For script run please use python3'
+import yaml
+from nornir.core.filter import F
+import core_runner
+
+from netmiko.utilities import get_structured_data
+
+import core_async
+import core_config_store
+import core_dispatch
+import core_ios_task
+import core_jun_task
+import core_metrics
+import core_normalize
+import core_qtech_task
+import core_routeros_task
+import core_task
+import save_config
+import sim_devices
+
+GROUPS_FILE = 'inventory/groups.yaml'
+DEFAULTS_FILE = 'inventory/defaults.yaml'
+CONFIG_FILE = 'config.yaml'
+MODE_THREADED = 'threaded'
+MODE_ASYNC = 'async'
+FLOW_SAVE_CONFIG = 'save_config'
+PHASES = ('connect', 'tcp_connect', 'ssh_auth', 'task', 'command', 'transfer')
+
+# set mapping from flow to device task of mode
+map_flow_task = {'dev_connect': {MODE_THREADED: core_dispatch.task_get_info,
+                                 MODE_ASYNC: core_async.task_get_info},
+                 'get_users': {MODE_THREADED: core_dispatch.task_get_users,
+                               MODE_ASYNC: core_async.task_get_users},
+                 FLOW_SAVE_CONFIG: {MODE_THREADED: save_config.save_configs}}
+
+# set mapping from platform to command of config saved by save_config
+map_platform_config_command = {core_normalize.PLATFORM_ROUTEROS: 'export compact',
+                               core_normalize.PLATFORM_QTECH: 'show startup-config',
+                               core_normalize.PLATFORM_IOS: 'show startup-config'}
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def set_log_level(level):
+    '''
+    Set level of all loggers except this script, modules log every host on debug
+    '''
+    for name in list(logging.Logger.manager.loggerDict):
+        if name != __name__:
+            logging.getLogger(name).setLevel(level)
+
+
+def write_inventory(fleet, inventory_dir, login_rate):
+    '''
+    Write hosts and defaults files of simulated devices, groups used from repo
+    Return dict of nornir inventory options
+    '''
+    with open(GROUPS_FILE) as groups_file:
+        groups = yaml.safe_load(groups_file)
+    hosts = dict()
+    for device in fleet:
+        hosts[device['name']] = {'hostname': sim_devices.ADDRESS, 'port': device['port'],
+                                 'groups': [device['platform']]}
+        # nornir_napalm write port of first host to optional_args of group, shared by all hosts of group,
+        # every host get own optional_args with port
+        napalm = groups[device['platform']].get('connection_options', dict()).get('napalm', dict())
+        if 'optional_args' in (napalm.get('extras') or dict()):
+            extras = dict(napalm['extras'], optional_args=dict(napalm['extras']['optional_args'],
+                                                               port=device['port']))
+            hosts[device['name']]['connection_options'] = {'napalm': {'extras': extras}}
+    with open(DEFAULTS_FILE) as defaults_file:
+        defaults = yaml.safe_load(defaults_file)
+    defaults['username'] = sim_devices.USERNAME
+    defaults['password'] = sim_devices.PASSWORD
+    defaults.setdefault('data', dict())['login_rate'] = login_rate
+    # host keys of simulated devices generated on start, not in known_hosts
+    defaults['data']['insecure_host_key'] = True
+    result = {'host_file': os.path.join(inventory_dir, f'hosts_{len(fleet)}.yaml'),
+              'group_file': GROUPS_FILE,
+              'defaults_file': os.path.join(inventory_dir, 'defaults.yaml')}
+    with open(result['host_file'], 'w') as hosts_file:
+        yaml.safe_dump(hosts, hosts_file)
+    with open(result['defaults_file'], 'w') as defaults_file:
+        yaml.safe_dump(defaults, defaults_file)
+    return result
+
+
+def get_expected_record(flow, device, files_dir):
+    '''
+    Return record of device for flow: output of simulated device parsed by parse function of platform
+    '''
+    result = None
+    sim = sim_devices.SimDevice(device['name'], device['platform'], device['port'], files_dir)
+    name = device['name']
+    if flow == 'dev_connect':
+        if device['platform'] == core_normalize.PLATFORM_ROUTEROS:
+            result = core_routeros_task.parse_info(name, sim_devices.ADDRESS, sim.run_command('system resource print'))
+        elif device['platform'] == core_normalize.PLATFORM_QTECH:
+            result = core_qtech_task.parse_info(name, sim.run_command('show version'))
+        elif device['platform'] == core_normalize.PLATFORM_IOS:
+            result = core_ios_task.parse_info(name, get_structured_data(sim.run_command('show version'),
+                                                                        'cisco_ios', 'show version'))
+        elif device['platform'] == core_normalize.PLATFORM_JUNOS:
+            result = core_jun_task.parse_info(name, get_structured_data(sim.run_command('show version'),
+                                                                        'juniper_junos', 'show version'))
+    elif flow == 'get_users':
+        if device['platform'] == core_normalize.PLATFORM_ROUTEROS:
+            result = core_routeros_task.parse_users(name, sim.run_command('user export verbose compact'))
+        elif device['platform'] == core_normalize.PLATFORM_QTECH:
+            result = core_qtech_task.parse_users(name, sim.run_command('show startup | include username'))
+        elif device['platform'] == core_normalize.PLATFORM_IOS:
+            result = core_ios_task.parse_users_config(name, sim.run_command(core_ios_task.USERS_COMMAND))
+        elif device['platform'] == core_normalize.PLATFORM_JUNOS:
+            result = core_jun_task.parse_users(name, sim.run_command('show configuration system login'))
+    return result
+
+
+def get_record_diff(record, expected):
+    '''
+    Return list of fields of record not equal with expected record, all fields if record not exists
+    '''
+    if record is None:
+        return list(expected._fields)
+    result = [field for field in expected._fields if getattr(record, field, None) != getattr(expected, field)]
+    return result
+
+
+def get_failed_hosts(all_devices, flow, out, work_dir, fleet):
+    '''
+    Return set of failed hosts: marked with error, without result or any field not equal with expected
+    save_config - host failed if config in store not equal config of simulated device
+    '''
+    logger = logging.getLogger(__name__)
+    result = {name for name, host in all_devices.inventory.hosts.items() if host.get('error')}
+    devices = {device['name']: device for device in fleet if device['name'] in all_devices.inventory.hosts}
+    files_dir = os.path.join(os.path.dirname(work_dir), 'expected')
+    if flow == FLOW_SAVE_CONFIG:
+        for name, device in devices.items():
+            sim = sim_devices.SimDevice(name, device['platform'], device['port'], files_dir)
+            config = core_config_store.get_config(work_dir, name)
+            expected = sim.run_command(map_platform_config_command[device['platform']])
+            text = config.decode('utf-8', errors='replace') if config is not None else None
+            if text is None or (core_normalize.hash_text(text, device['platform'])
+                                != core_normalize.hash_text(expected, device['platform'])):
+                logger.warning(f'Config of {name} not equal config of device')
+                result.add(name)
+    else:
+        records = {record.hostname: record for record in out if record is not None}
+        for name, device in devices.items():
+            fields = get_record_diff(records.get(name), get_expected_record(flow, device, files_dir))
+            if fields:
+                logger.warning(f'Result of {name} not equal expected in fields {fields}')
+                result.add(name)
+    return result
+
+
+def run_flow(inventory, fleet, flow, mode, runner, work_dir, max_sessions=core_async.MAX_SESSIONS):
+    '''
+    Run flow over all hosts of inventory
+    Output - dict {hosts, failed, seconds} and p50/p95 of phases over all hosts
+    '''
+    all_devices = core_runner.init_nornir(runner=runner,
+                                          inventory={'plugin': 'SimpleInventory', 'options': inventory},
+                                          logging={'enabled': False})
+    if flow == FLOW_SAVE_CONFIG:
+        all_devices = all_devices.filter(~F(groups__contains=core_normalize.PLATFORM_JUNOS))
+    core_metrics.clear()
+    start = time.perf_counter()
+    if flow == FLOW_SAVE_CONFIG:
+        os.makedirs(work_dir, exist_ok=True)
+        out = map_flow_task[flow][mode](all_devices, work_dir)
+    elif mode == MODE_ASYNC:
+        out = map_flow_task[flow][mode](all_devices, max_sessions)
+    else:
+        out = map_flow_task[flow][mode](all_devices)
+    seconds = time.perf_counter() - start
+    all_devices.close_connections()
+    core_task.close_ssh_pool()
+    result = {'hosts': len(all_devices.inventory.hosts),
+              'failed': len(get_failed_hosts(all_devices, flow, out, work_dir, fleet)), 'seconds': seconds}
+    summary = core_metrics.get_summary([dict(rec, platform='all') for rec in core_metrics.get_records()])
+    for phase in PHASES:
+        if ('all', phase) in summary:
+            result[phase] = summary[('all', phase)]
+    return result
+
+
+def format_result(flow, mode, result):
+    '''
+    Return line of result table
+    '''
+    phases = ' '.join(f"{phase} p50/p95 {result[phase]['p50']:.3f}/{result[phase]['p95']:.3f}s"
+                      for phase in PHASES if phase in result)
+    return (f"{flow:<12} {mode:<9} hosts {result['hosts']:>5} failed {result['failed']:>4} "
+            f"time {result['seconds']:8.2f}s {result['hosts'] / result['seconds']:8.1f} hosts/s  {phases}")
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start benchmark")
+    with open(CONFIG_FILE) as config_file:
+        runner_config = yaml.safe_load(config_file)['runner']
+    parser = argparse.ArgumentParser(description='Benchmark of flows against simulated devices')
+    parser.add_argument('--hosts', '-n', action='store', type=int, nargs='+', default=[10, 100, 1000],
+                        help="Counts of simulated devices")
+    parser.add_argument('--flows', '-f', action='store', nargs='+', choices=list(map_flow_task),
+                        default=list(map_flow_task), help="Flows for benchmark")
+    parser.add_argument('--modes', '-m', action='store', nargs='+', choices=[MODE_THREADED, MODE_ASYNC],
+                        default=[MODE_THREADED, MODE_ASYNC], help="Modes of run")
+    parser.add_argument('--runner', action='store', default=runner_config['plugin'],
+                        help="Nornir runner of threaded mode")
+    parser.add_argument('--num-workers', action='store', type=int,
+                        default=runner_config['options']['num_workers'], help="Workers of nornir runner")
+    parser.add_argument('--max-sessions', action='store', type=int, default=core_async.MAX_SESSIONS,
+                        help="Concurrent sessions of async mode")
+    parser.add_argument('--latency', '-l', action='store', type=float, default=sim_devices.LATENCY,
+                        help="Latency of command of devices, seconds")
+    parser.add_argument('--login-latency', action='store', type=float, default=sim_devices.LOGIN_LATENCY,
+                        help="Latency of password check of devices, seconds")
+    parser.add_argument('--login-rate', action='store', type=float, default=0,
+                        help="Logins per second in runner 'limited', 0 - without limit")
+    parser.add_argument('--base-port', '-p', action='store', type=int, default=sim_devices.BASE_PORT,
+                        help="Port of first simulated device")
+    parser.add_argument('--processes', action='store', type=int, default=2,
+                        help="Count of processes for simulated devices")
+    parser.add_argument('--log-level', action='store', default='WARNING',
+                        help="Log level of modules")
+    args = parser.parse_args()
+
+    set_log_level(args.log_level)
+    work_dir = tempfile.mkdtemp(prefix='bench_fleet_')
+    fleet = sim_devices.get_fleet(max(args.hosts), args.base_port)
+    processes = sim_devices.start_fleet(fleet, os.path.join(work_dir, 'devices'), args.latency,
+                                        args.login_latency, processes=args.processes)
+    runner = {'plugin': args.runner, 'options': {'num_workers': args.num_workers}}
+    failed = 0
+    print(f'Runner {args.runner}, workers {args.num_workers}, async sessions {args.max_sessions}, device latency {args.latency}s, '
+          f'login latency {args.login_latency}s, login rate {args.login_rate or "not limited"}')
+    try:
+        for hosts in args.hosts:
+            inventory = write_inventory(fleet[:hosts], work_dir, args.login_rate)
+            for flow in args.flows:
+                for mode in args.modes:
+                    if mode not in map_flow_task[flow]:
+                        continue
+                    result = run_flow(inventory, fleet[:hosts], flow, mode, runner,
+                                      os.path.join(work_dir, f'config_{hosts}'), args.max_sessions)
+                    print(format_result(flow, mode, result), flush=True)
+                    failed += result['failed']
+    finally:
+        sim_devices.stop_fleet(processes)
+    logger.info(f"End benchmark, files in {work_dir}")
+    if failed:
+        logger.error(f"Failed {failed} hosts")
+        sys.exit(1)
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+'''
+Benchmark join of device facts: linear scan per device vs dict index (summary_devices_descr)
+'''
+import argparse
+import logging
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import core_task
+
+# scan join too slow for big lists, run it only for lists not more then limit
+SCAN_LIMIT = 10000
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def summary_devices_scan(devices_list_p1, devices_list_p2, shared_attr='hostname'):
+    '''
+    Join as before index - scan list_p2 and create namedtuple class for every device
+    '''
+    result = list()
+    summary_keys = [key for device in devices_list_p1+devices_list_p2 for key in device._fields]
+    null_dict = {key: 'None' for key in set(summary_keys)}
+    for device in devices_list_p1:
+        device_summary = dict()
+        device_summary.update(null_dict)
+        device_summary.update(device._asdict())
+        devices_p2_sel_device = [x for x in devices_list_p2 if getattr(x, shared_attr) == getattr(device, shared_attr)]
+        for device_p2 in devices_p2_sel_device:
+            device_summary.update(device_p2._asdict())
+        tn_summary = namedtuple('summary', device_summary.keys(), defaults=(None,))
+        result.append(tn_summary(*device_summary.values()))
+    return result
+
+
+def make_devices(hosts):
+    '''
+    Return lists of info and packages facts for hosts, packages in reverse order
+    '''
+    info = [core_task.create_info_tuple({'hostname': f'rt-{num}', 'address': f'10.{num >> 16}.{num >> 8 & 255}.{num & 255}',
+                                         'version': '6.46.5', 'arch': 'mmips', 'free_memory': '207.7MiB'})
+            for num in range(hosts)]
+    packages = [core_task.create_info_tuple({'hostname': f'rt-{num}', 'packages': ['routeros', 'wireless']})
+                for num in reversed(range(hosts))]
+    return info, packages
+
+
+def bench(func, info, packages):
+    '''
+    Return (time in seconds, peak of allocated memory in MiB) of join
+    Memory measured in separate run, tracemalloc slow down join
+    '''
+    start = time.perf_counter()
+    func(info, packages)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(info, packages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1048576
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start benchmark")
+    parser = argparse.ArgumentParser(description='Benchmark join of device facts')
+    parser.add_argument('--hosts', '-n', action='store', type=int, nargs='+', default=[10000, 100000],
+                        help="Counts of emulated hosts")
+    parser.add_argument('--scan-limit', action='store', type=int, default=SCAN_LIMIT,
+                        help="Max count of hosts for benchmark of linear scan")
+    args = parser.parse_args()
+
+    for hosts in args.hosts:
+        info, packages = make_devices(hosts)
+        index_time, index_memory = bench(core_task.summary_devices_descr, info, packages)
+        print(f'Hosts: {hosts}')
+        print(f'Dict index: {index_time:.2f} s, peak {index_memory:.1f} MiB')
+        if hosts <= args.scan_limit:
+            scan_time, scan_memory = bench(summary_devices_scan, info, packages)
+            print(f'Linear scan: {scan_time:.2f} s, peak {scan_memory:.1f} MiB')
+            print(f'Speedup: {scan_time/index_time:.1f}x')
+        else:
+            print(f'Linear scan: skipped, more then {args.scan_limit} hosts')
+    logger.info("End benchmark")
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
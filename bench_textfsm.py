@@ -0,0 +1,93 @@
+'''
+Benchmark parse time per host: TextFSM compile per host vs template registry
+'''
+import argparse
+import logging
+import sys
+import timeit
+assert sys.version_info.major == 3, 'For script run please use python3'
+import textfsm
+
+import core_routeros_task
+import core_task
+
+TEMPLATE = 'templates/routeros_system_resource_print.template'
+TEXT = '''
+    uptime: 8h42m20s
+    version: 6.46.5 (stable)
+    build-time: Apr/07/2020 08:28:27
+    factory-software: 6.43.10
+    free-memory: 207.7MiB
+    total-memory: 256.0MiB
+    cpu: MIPS 1004Kc V2.15
+    cpu-count: 4
+    cpu-frequency: 880MHz
+    cpu-load: 4%
+    free-hdd-space: 6.8MiB
+    total-hdd-space: 16.3MiB
+    write-sect-since-reboot: 1181
+    write-sect-total: 13673
+    bad-blocks: 0%
+    architecture-name: mmips
+    board-name: RBM33G
+    platform: MikroTik
+'''
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def parse_info_compile(hostname, address, dict_prop):
+    '''
+    Parse as before registry - open and compile template for every host
+    '''
+    with open(TEMPLATE) as template:
+        fsm = textfsm.TextFSM(template)
+        dict_out = dict(zip(fsm.header, fsm.ParseText(dict_prop)[0]))
+    dict_out['hostname'] = hostname
+    dict_out['address'] = address
+    return core_task.create_info_tuple(dict_out)
+
+
+def bench(func, hosts):
+    '''
+    Return parse time per host in microseconds
+    '''
+    timer = timeit.Timer(lambda: [func(f'rt-{num}', '192.0.2.1', TEXT) for num in range(hosts)])
+    return min(timer.repeat(repeat=3, number=1)) / hosts * 1000000
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start benchmark")
+    parser = argparse.ArgumentParser(description='Benchmark TextFSM parse per host')
+    parser.add_argument('--hosts', '-n', action='store', type=int, default=1000,
+                        help="Count of emulated hosts")
+    args = parser.parse_args()
+
+    before = bench(parse_info_compile, args.hosts)
+    after = bench(core_routeros_task.parse_info, args.hosts)
+    print(f'Hosts: {args.hosts}')
+    print(f'Compile per host: {before:.1f} us/host')
+    print(f'Template registry: {after:.1f} us/host')
+    print(f'Speedup: {before/after:.1f}x')
+    logger.info("End benchmark")
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
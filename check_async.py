@@ -0,0 +1,103 @@
+'''
+Check of core_async tasks against nornir tasks on simulated devices
+Records of every host from async mode compared with threaded mode field by field,
+host without record in any mode or marked with error is failed
+'''
+import argparse
+import logging
+import os
+import sys
+import tempfile
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import bench_fleet
+import core_async
+import core_dispatch
+import core_runner
+import core_task
+import sim_devices
+
+HOSTS = 20
+# set mapping from check name to tasks of threaded and async modes
+map_check_task = {'get_info': (core_dispatch.task_get_info, core_async.task_get_info),
+                  'get_users': (core_dispatch.task_get_users, core_async.task_get_users)}
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def run_task(inventory, task):
+    '''
+    Run task over all hosts of inventory, return dict {host: record} and set of hosts with error
+    '''
+    all_devices = core_runner.init_nornir(runner={'plugin': 'limited', 'options': {'num_workers': HOSTS}},
+                                          inventory={'plugin': 'SimpleInventory', 'options': inventory},
+                                          logging={'enabled': False})
+    out = task(all_devices)
+    all_devices.close_connections()
+    core_task.close_ssh_pool()
+    errors = {name for name, host in all_devices.inventory.hosts.items() if host.get('error')}
+    return {record.hostname: record for record in out if record is not None}, errors
+
+
+def check(name, inventory, hosts):
+    '''
+    Run task of check in both modes, return True if records of all hosts equal
+    '''
+    logger = logging.getLogger(__name__)
+    threaded_task, async_task = map_check_task[name]
+    threaded, threaded_errors = run_task(inventory, threaded_task)
+    async_records, async_errors = run_task(inventory, async_task)
+    passed = True
+    for host in hosts:
+        if host in threaded_errors | async_errors or host not in threaded or host not in async_records:
+            logger.error(f'{name} {host}: no result, threaded {host in threaded}, async {host in async_records}')
+            passed = False
+            continue
+        for field in bench_fleet.get_record_diff(async_records[host], threaded[host]):
+            logger.error(f'{name} {host} {field}: threaded {getattr(threaded[host], field)!r}, '
+                         f'async {getattr(async_records[host], field, None)!r}')
+            passed = False
+    logger.info(f"{name}: {'OK' if passed else 'FAIL'}")
+    return passed
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start check")
+    parser = argparse.ArgumentParser(description='Check async tasks against nornir tasks on simulated devices')
+    parser.add_argument('--base-port', '-p', action='store', type=int, default=sim_devices.BASE_PORT,
+                        help="Port of first simulated device")
+    args = parser.parse_args()
+
+    bench_fleet.set_log_level('WARNING')
+    logger.setLevel(logging.INFO)
+    work_dir = tempfile.mkdtemp(prefix='check_async_')
+    fleet = sim_devices.get_fleet(HOSTS, args.base_port)
+    processes = sim_devices.start_fleet(fleet, os.path.join(work_dir, 'devices'), 0.01, 0.0, processes=1)
+    try:
+        inventory = bench_fleet.write_inventory(fleet, work_dir, 0)
+        results = [check(name, inventory, [device['name'] for device in fleet]) for name in map_check_task]
+    finally:
+        sim_devices.stop_fleet(processes)
+    logger.info(f"End check, failed {results.count(False)} of {len(results)}")
+    sys.exit(0 if all(results) else 1)
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+'''
+Check of core_task.download_file against local HTTP server
+Cases: continue of part file (206), server without Range (200), part file with all data or
+bigger then file on server (416), hash of file not equal expected
+'''
+import argparse
+import hashlib
+import http.server
+import logging
+import os
+import sys
+import tempfile
+import threading
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import core_task
+
+CONTENT = os.urandom(300000)
+CONTENT_MD5 = hashlib.md5(CONTENT).hexdigest()
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Return CONTENT on /file with support of Range: bytes=N-, on /norange ignore Range
+    '''
+
+    def do_GET(self):
+        start = 0
+        if self.path == '/file' and self.headers.get('Range', '').startswith('bytes='):
+            start = int(self.headers['Range'][len('bytes='):].split('-')[0])
+            if start >= len(CONTENT):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(CONTENT)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(CONTENT) - start))
+        self.end_headers()
+        self.wfile.write(CONTENT[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+def check(name, url, part=None, expected_md5=None, expected=True):
+    '''
+    Run download with part file, return True if result as expected
+    '''
+    logger = logging.getLogger(__name__)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        dest_path = os.path.join(temp_dir, 'file')
+        if part is not None:
+            with open(dest_path + '.part', 'wb') as part_file:
+                part_file.write(part)
+        result = core_task.download_file(url, dest_path, expected_md5)
+        if expected:
+            with open(dest_path, 'rb') as dest_file:
+                passed = result == CONTENT_MD5 and dest_file.read() == CONTENT
+        else:
+            passed = result is False and not os.path.exists(dest_path) and not os.path.exists(dest_path + '.part')
+    logger.info(f"{name}: {'OK' if passed else 'FAIL'}")
+    return passed
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start check")
+    parser = argparse.ArgumentParser(description='Check download_file against local HTTP server')
+    parser.add_argument('--port', '-p', action='store', type=int, default=0,
+                        help="Port of HTTP server, 0 - any free port")
+    args = parser.parse_args()
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', args.port), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    results = [
+        check('continue part file (206)', f'{base_url}/file', CONTENT[:100000], CONTENT_MD5),
+        check('continue part file without hash (206)', f'{base_url}/file', CONTENT[:100000]),
+        check('server without Range (200)', f'{base_url}/norange', b'stale data'),
+        check('full download (200)', f'{base_url}/file'),
+        check('part file complete (416)', f'{base_url}/file', CONTENT),
+        check('part file complete with hash (416)', f'{base_url}/file', CONTENT, CONTENT_MD5),
+        check('part file bigger then file (416)', f'{base_url}/file', CONTENT + b'garbage'),
+        check('part file bigger then file with hash (416)', f'{base_url}/file', CONTENT + b'garbage',
+              CONTENT_MD5, expected=False),
+        check('hash not equal (200)', f'{base_url}/file', None, '0' * 32, expected=False),
+        check('hash not equal (206)', f'{base_url}/file', b'x' * 1000, CONTENT_MD5, expected=False),
+    ]
+    server.shutdown()
+    logger.info(f"End check, failed {results.count(False)} of {len(results)}")
+    sys.exit(0 if all(results) else 1)
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,26 @@ import argparse
 import os
 import hashlib
 import sys
+import concurrent.futures
+import sqlite3
 import magic
+import core_config_store
+import core_normalize
 assert sys.version_info.major == 3, 'For script run please use python3'
 
+KIND_TEXT = 'text'
+KIND_BIN = 'bin'
+# size of first block for compare files
+BLOCK_SIZE = 4096
+# count of files for one task in process pool
+CHUNK_SIZE = 64
+# file of hash index in processed directory
+INDEX_FILENAME = '.dedupe_index.sqlite'
+# version of hash calc, index with other version rebuild
+HASH_VERSION = '2'
+# mime detector, create once per process
+_MIME = None
+
 
 def configure_logging():
     '''
@@ -25,72 +42,209 @@ def configure_logging():
     logger.addHandler(console)
 
 
-def get_filehash_md5_txt(filename, begin_str):
+def init_worker():
     '''
-    Function for calc md5 hash for files
-    If file is PLAIN md5 hash for strings, exclude begin with begin_str
+    Init process of pool, mime detector create one time per process
     '''
-    result = ''
-    logger = logging.getLogger(__name__)
-    md5 = hashlib.md5()
-    mime = magic.Magic(mime=True)
-    if 'plain' in mime.from_file(filename):
-        logger.debug('Text file - try calc hash md5 without comment string')
-        with open(filename, 'r',) as f:
-            while True:
-                data = f.readline()
-                if not data:
-                    break
-                if not data.startswith(begin_str):
-                    md5.update(data.encode('utf-8'))
-        result = md5.hexdigest()
-    else:
-        logger.debug('Binary file - try calc hash md5 as binary data')
-        result = get_filehash_md5_bin(filename)
-    return result
+    global _MIME
+    _MIME = magic.Magic(mime=True)
+
+
+def get_mime():
+    '''
+    Return mime detector of current process
+    '''
+    global _MIME
+    if _MIME is None:
+        _MIME = magic.Magic(mime=True)
+    return _MIME
+
+
+def get_file_kind(filename):
+    '''
+    Return kind of file: text - for PLAIN files, bin - for other
+    '''
+    return KIND_TEXT if 'plain' in get_mime().from_file(filename) else KIND_BIN
 
 
-def get_filehash_md5_bin(filename):
+def get_filehash_md5_bin(filename, limit=None):
     '''
     function calc md5 sum for all files (binary or plain)
+    limit - calc hash only for first limit bytes
     '''
     buf_size = 4096
     md5 = hashlib.md5()
+    size = 0
     with open(filename, 'rb') as f:
         while True:
             data = f.read(buf_size)
             if not data:
                 break
             md5.update(data)
+            size += len(data)
+            if limit and size >= limit:
+                break
     return md5.hexdigest()
 
 
-def delete_duplicate(directory, recursive, delete):
+def get_filehash(filename, kind, limit=None):
+    '''
+    Calc hash for file of known kind, function for run in process pool
+    '''
+    if kind == KIND_TEXT:
+        return core_normalize.hash_file(filename, limit=limit)
+    return get_filehash_md5_bin(filename, limit)
+
+
+def get_filehash_prefix(filename, kind):
+    '''
+    Calc hash of first block of file, function for run in process pool
+    '''
+    return get_filehash(filename, kind, BLOCK_SIZE)
+
+
+def split_groups(groups, keys):
+    '''
+    Split every group by keys of files, return groups with more then one file
+    '''
+    result = list()
+    for group in groups:
+        sub_groups = dict()
+        for file in group:
+            sub_groups.setdefault(keys[file], list()).append(file)
+        result.extend(sub_group for sub_group in sub_groups.values() if len(sub_group) > 1)
+    return result
+
+
+def fill_stage(pool, files, cache, field, stage_func, *stage_args):
+    '''
+    Calc field in cache for files without it, stage_func run in process pool
+    stage_args - names of cache fields passed to stage_func after filename
+    '''
+    logger = logging.getLogger(__name__)
+    missing = [file for file in files if cache[file].get(field) is None]
+    logger.debug('Calc %s for %s files (%s from index)', field, len(missing), len(files) - len(missing))
+    if missing:
+        args = [[cache[file][arg] for file in missing] for arg in stage_args]
+        for file, value in zip(missing, pool.map(stage_func, missing, *args, chunksize=CHUNK_SIZE)):
+            cache[file][field] = value
+
+
+def find_duplicate(f_list, jobs=None, cache=None):
+    '''
+    Find duplicate files with stages:
+    group by kind and size (normalized text files can be equal with different size), hash first block,
+    full hash only for files with equal first block
+    cache - dict {file: {kind, prefix, hash}}, values from it not calc again, new values added
+    Return list of duplicate groups, in group files in order of f_list
+    '''
+    cache = cache if cache is not None else dict()
+    for file in f_list:
+        cache.setdefault(file, dict())
+    with concurrent.futures.ProcessPoolExecutor(jobs, initializer=init_worker) as pool:
+        fill_stage(pool, f_list, cache, 'kind', get_file_kind)
+        first_keys = {file: (cache[file]['kind'], os.path.getsize(file) if cache[file]['kind'] == KIND_BIN else None)
+                      for file in f_list}
+        groups = split_groups([f_list], first_keys)
+        for field, stage_func in (('prefix', get_filehash_prefix), ('hash', get_filehash)):
+            candidates = [file for group in groups for file in group]
+            fill_stage(pool, candidates, cache, field, stage_func, 'kind')
+            groups = split_groups(groups, {file: cache[file][field] for file in candidates})
+    return groups
+
+
+def open_index(directory, rebuild=False):
+    '''
+    Open index of file hashes in directory, create if not exists
+    If rebuild or index created for other hash version - index cleared
+    '''
+    logger = logging.getLogger(__name__)
+    conn = sqlite3.connect(os.path.join(directory, INDEX_FILENAME))
+    conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute('''CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, inode INTEGER, size INTEGER,
+                    mtime_ns INTEGER, kind TEXT, prefix TEXT, hash TEXT)''')
+    row = conn.execute("SELECT value FROM meta WHERE key='hash_version'").fetchone()
+    if rebuild or row is None or row[0] != HASH_VERSION:
+        logger.info('Rebuild index of file hashes')
+        conn.execute('DELETE FROM files')
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('hash_version', ?)", (HASH_VERSION,))
+    conn.commit()
+    return conn
+
+
+def read_index(conn, directory, f_stat):
+    '''
+    Read values for not changed files (inode, size, mtime) from index
+    Return cache dict {file: {kind, prefix, hash, indexed}}, indexed - values saved in index
+    '''
+    cache = dict()
+    for path, inode, size, mtime_ns, kind, prefix, md5_hash in conn.execute('SELECT * FROM files'):
+        file = os.path.join(directory, path)
+        stat = f_stat.get(file)
+        if stat and (stat.st_ino, stat.st_size, stat.st_mtime_ns) == (inode, size, mtime_ns):
+            cache[file] = {'kind': kind, 'prefix': prefix, 'hash': md5_hash, 'indexed': (kind, prefix, md5_hash)}
+    return cache
+
+
+def write_index(conn, directory, f_stat, cache):
+    '''
+    Save values of new or changed files to index, remove deleted files from index
+    '''
+    logger = logging.getLogger(__name__)
+    rows = list()
+    for file, stat in f_stat.items():
+        values = tuple(cache.get(file, dict()).get(field) for field in ('kind', 'prefix', 'hash'))
+        if file in cache and cache[file].get('indexed') != values:
+            rows.append((os.path.relpath(file, directory), stat.st_ino, stat.st_size, stat.st_mtime_ns) + values)
+    paths = {os.path.relpath(file, directory) for file in f_stat}
+    deleted = [(path,) for path, in conn.execute('SELECT path FROM files') if path not in paths]
+    logger.debug('Update %s files in index, remove %s files', len(rows), len(deleted))
+    conn.executemany('''INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET
+                        inode=excluded.inode, size=excluded.size, mtime_ns=excluded.mtime_ns,
+                        kind=excluded.kind, prefix=excluded.prefix, hash=excluded.hash''', rows)
+    conn.executemany('DELETE FROM files WHERE path=?', deleted)
+    conn.commit()
+
+
+def delete_duplicate(directory, recursive, delete, jobs=None, rebuild=False):
     '''
     function for detect duplicate files in directory
+    Hashes of files saved in index in directory, only new or changed files hashed
+    Dirs of config store skipped: equal files of store are refs of different hosts
+    rebuild - clear index before run
     '''
     logger = logging.getLogger(__name__)
     logger.info('Check files for duplicate in %s', directory)
-    md5_hashes = dict()
-    if os.path.isdir(directory):
+    if os.path.isfile(os.path.join(directory, core_config_store.STORE_MARKER)):
+        logger.error("Directory is config store, skip it: %s", directory)
+    elif os.path.isdir(directory):
         if recursive:
-            f_list = [os.path.join(dp, f) for dp, dn, filenames in os.walk(
-                directory) for f in filenames]
+            f_list = list()
+            for dp, dn, filenames in os.walk(directory):
+                store_dirs = [d for d in dn if os.path.isfile(os.path.join(dp, d, core_config_store.STORE_MARKER))]
+                for d in store_dirs:
+                    logger.info('Skip config store %s', os.path.join(dp, d))
+                    dn.remove(d)
+                f_list.extend(os.path.join(dp, f) for f in filenames)
         else:
             r, _, f = next(os.walk(directory))
             f_list = [os.path.join(r, fname) for fname in f]
-        for file in f_list:
-            logger.debug('Processing file %s', file)
-            md5_hash = get_filehash_md5_txt(file, '#')
-            logger.debug('Add %sto md5_hash', md5_hash)
-            if md5_hashes.get(md5_hash):
-                logger.info('Duplicate file {} equal with {}'.format(
-                    file, md5_hashes[md5_hash]))
-                if delete:
-                    logger.warning('Delete dupilcate file %s', file)
-                    os.unlink(file)
-            else:
-                md5_hashes[md5_hash] = file
+        f_list = [file for file in f_list if not os.path.basename(file).startswith(INDEX_FILENAME)]
+        f_stat = {file: os.stat(file) for file in f_list}
+        conn = open_index(directory, rebuild)
+        try:
+            cache = read_index(conn, directory, f_stat)
+            for group in find_duplicate(f_list, jobs, cache):
+                for file in group[1:]:
+                    logger.info('Duplicate file {} equal with {}'.format(
+                        file, group[0]))
+                    if delete:
+                        logger.warning('Delete dupilcate file %s', file)
+                        os.unlink(file)
+                        del f_stat[file]
+            write_index(conn, directory, f_stat, cache)
+        finally:
+            conn.close()
     else:
         logger.error("Directory not exists: %s", directory)
 
@@ -111,12 +265,16 @@ def main():
                         help="Select recursive process")
     parser.add_argument('--delete_duplicate', '-d', action='store_true', default=False,
                         help="Only log, without delete duplicate")
+    parser.add_argument('--jobs', '-j', action='store', type=int, default=None,
+                        help="Count of process for calc hash, default - count of CPU")
+    parser.add_argument('--rebuild', action='store_true', default=False,
+                        help="Rebuild index of file hashes, hash all files")
     args = parser.parse_args()
 
     logger.debug("Directory for process: %s", args.folder)
     logger.debug("Recursive: %s", args.rec)
     logger.debug("Delete duplicate: %s", args.delete_duplicate)
-    delete_duplicate(args.folder, args.rec, args.delete_duplicate)
+    delete_duplicate(args.folder, args.rec, args.delete_duplicate, args.jobs, args.rebuild)
 
     logger.info("End program")
 
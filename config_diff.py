@@ -0,0 +1,65 @@
+'''
+Module for show config changes from index of config store
+'''
+import argparse
+import logging
+import sys
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import core_config_diff
+import core_config_store
+
+CONFIGDIR = core_config_store.STORE_DIR
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start program")
+
+    logger.debug("Parse arguments")
+    parser = argparse.ArgumentParser(
+        description='Show config changes, default - hosts changed in last run')
+    parser.add_argument('--config', '-c', action='store', default=CONFIGDIR,
+                        help="Directory of config store")
+    parser.add_argument('--host', action='store', default=None,
+                        help="Show changes of host")
+    parser.add_argument('--since', '-s', action='store', default=None,
+                        help="Show changes after date, format YYYY-mm-dd or YYYY-mm-dd_HHMMSS")
+    parser.add_argument('--update', '-u', action='store_true', default=False,
+                        help="Update index before show changes")
+    args = parser.parse_args()
+
+    if args.update:
+        core_config_diff.update_index(args.config)
+    if args.host:
+        for change in core_config_diff.get_changes(args.config, args.host, args.since):
+            print(f"{change['ts']} {change['previous']} -> {change['hash']} "
+                  f"+{change['added']} -{change['removed']}")
+            print(change['diff'])
+    else:
+        for host, (added, removed) in core_config_diff.get_changed_hosts(args.config).items():
+            print(f'{host} +{added} -{removed}')
+
+    logger.info("End program")
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,9 @@ Quick test connect to managment devices
 
 import logging
 
-from nornir import InitNornir
 from nornir.core.filter import F
+import core_runner
+import core_metrics
 
 import core_ios_task
 import core_jun_task
@@ -40,7 +41,7 @@ def main():
     logger.info("Start program for config network")
 
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file="config.yaml")
+    all_devices = core_runner.init_nornir(config_file="config.yaml")
 
     # Set password in nornir object inventory
     all_devices.inventory.defaults.password = PASSWORD
@@ -55,6 +56,7 @@ def main():
     jun_srx = core_jun_task.task_get_info(
         all_devices.filter(F(groups__contains="jun_srx")))
 
+    core_metrics.export('connect')
     logger.info("End program for config network")
 
     for device in routeros:
@@ -0,0 +1,276 @@
+'''
+Module for run device tasks in asyncio over asyncssh: one process and one thread
+for thousands of concurrent sessions
+Commands run in exec channel, output parsed by parse functions of platform modules,
+so result objects equal with result of nornir tasks
+Host keys checked by ~/.ssh/known_hosts, check disabled only with host data insecure_host_key: True
+Limits of runner 'limited' used: max_sessions of group and login token bucket of AAA server (core_runner)
+'''
+import asyncio
+import logging
+import sys
+assert sys.version_info.major == 3, 'For script run please use python3'
+import asyncssh
+from netmiko.utilities import get_structured_data
+
+import core_ios_task
+import core_jun_task
+import core_metrics
+import core_normalize
+import core_qtech_task
+import core_routeros_task
+import core_runner
+
+# limit of concurrent ssh sessions
+MAX_SESSIONS = 1000
+# connect timeout if not set in netmiko extras of host
+CONNECT_TIMEOUT = 10
+# timeout of one command if read_timeout not set in netmiko extras of host
+COMMAND_TIMEOUT = 10
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+async def send_command(conn, command):
+    '''
+    Run command in exec channel, return output with unix line ends
+    Command not ended in command_timeout of connection raise asyncio.TimeoutError
+    '''
+    out = await conn.run(command, check=False, timeout=conn.get_extra_info('command_timeout'))
+    return out.stdout.replace('\r\n', '\n')
+
+
+async def subtask_get_info_routeros(conn, host):
+    '''
+    Host task for get RouterOS version
+    '''
+    out = await send_command(conn, 'system resource print')
+    return core_routeros_task.parse_info(host.name, host.hostname, out)
+
+
+async def subtask_get_users_routeros(conn, host):
+    '''
+    Host task for get user from RouterOS
+    '''
+    out = await send_command(conn, 'user export verbose compact')
+    return core_routeros_task.parse_users(host.name, out)
+
+
+async def subtask_get_packages_routeros(conn, host):
+    '''
+    Host task for get RouterOS installed packages
+    '''
+    out = await send_command(conn, 'system package print terse')
+    return core_routeros_task.parse_packages(host.name, out)
+
+
+async def subtask_get_info_qtech(conn, host):
+    '''
+    Host task for get Qtech firmware version
+    '''
+    out = await send_command(conn, 'show version')
+    return core_qtech_task.parse_info(host.name, out)
+
+
+async def subtask_get_users_qtech(conn, host, configmode='startup'):
+    '''
+    Host task for get user from Qtech
+    '''
+    out = await send_command(conn, f'show {configmode} | include username')
+    return core_qtech_task.parse_users(host.name, out)
+
+
+async def subtask_get_info_ios(conn, host):
+    '''
+    Host task for get IOS version, output parsed by ntc-templates as in netmiko
+    '''
+    out = await send_command(conn, 'show version')
+    return core_ios_task.parse_info(host.name, get_structured_data(out, 'cisco_ios', 'show version'))
+
+
+async def subtask_get_users_ios(conn, host):
+    '''
+    Host task for get user from IOS, command and parse as in threaded mode
+    '''
+    out = await send_command(conn, core_ios_task.USERS_COMMAND)
+    if core_ios_task.INVALID_INPUT in out:
+        out = await send_command(conn, core_ios_task.USERS_COMMAND_INCLUDE)
+    return core_ios_task.parse_users_config(host.name, out)
+
+
+async def subtask_get_info_jun(conn, host):
+    '''
+    Host task for get SRX version, output parsed by ntc-templates as in netmiko
+    '''
+    out = await send_command(conn, 'show version')
+    return core_jun_task.parse_info(host.name, get_structured_data(out, 'juniper_junos', 'show version'))
+
+
+async def subtask_get_users_jun(conn, host):
+    '''
+    Host task for get user from JUN
+    '''
+    out = await send_command(conn, 'show configuration system login')
+    return core_jun_task.parse_users(host.name, out)
+
+
+# set mapping from groupname to called async host task
+map_group_subtask_get_info = {'ios': subtask_get_info_ios,
+                              'jun_srx': subtask_get_info_jun,
+                              'routeros': subtask_get_info_routeros,
+                              'qtech': subtask_get_info_qtech}
+
+map_group_subtask_get_users = {'ios': subtask_get_users_ios,
+                               'jun_srx': subtask_get_users_jun,
+                               'routeros': subtask_get_users_routeros,
+                               'qtech': subtask_get_users_qtech}
+
+map_group_subtask_get_packages = {'routeros': subtask_get_packages_routeros}
+
+
+def get_connect_options(host):
+    '''
+    Return dict of asyncssh connect options from nornir host, creds from netmiko options
+    Host keys checked by default known_hosts, without check if host data insecure_host_key is True
+    '''
+    params = host.get_connection_parameters('netmiko')
+    result = {'host': params.hostname,
+              'port': params.port or 22,
+              'username': params.username,
+              'password': params.password}
+    if host.get('insecure_host_key'):
+        result['known_hosts'] = None
+    return result
+
+
+def get_timeouts(host):
+    '''
+    Return (connect timeout, command timeout) of host from netmiko options
+    '''
+    extras = host.get_connection_parameters('netmiko').extras or dict()
+    result = (extras.get('timeout') or CONNECT_TIMEOUT, extras.get('read_timeout') or COMMAND_TIMEOUT)
+    return result
+
+
+def get_group_sessions(hosts, max_sessions):
+    '''
+    Return dict {group: semaphore} for max_sessions of groups, None - hosts without limit of group
+    '''
+    result = {None: asyncio.Semaphore(max_sessions)}
+    for host in hosts:
+        group, group_max_sessions = core_runner.get_limit_group(host)
+        if group is not None and group not in result:
+            result[group] = asyncio.Semaphore(group_max_sessions)
+    return result
+
+
+async def subtask_dispatch(host, group_task_map, sessions, group_sessions):
+    '''
+    Host task - select platform implementation by host group, connect and run it
+    Session slot of group taken before global slot, so hosts of busy group not hold global slots
+    '''
+    logger = logging.getLogger(__name__)
+    group = core_normalize.get_host_platform(host)
+    if group not in group_task_map:
+        logger.warning(f'Device {host.name} not have task for groups {host.groups}')
+        return None
+    connect_timeout, command_timeout = get_timeouts(host)
+    limiter = core_runner.get_login_limiter(host)
+    async with group_sessions[core_runner.get_limit_group(host)[0]], sessions:
+        if limiter:
+            logger.debug(f'Wait login token for {host.name}')
+            await asyncio.sleep(limiter.reserve(1))
+        with core_metrics.measure(host.name, 'connect', 'asyncssh', group):
+            conn = await asyncio.wait_for(asyncssh.connect(**get_connect_options(host)), connect_timeout)
+        async with conn:
+            conn.set_extra_info(command_timeout=command_timeout)
+            return await group_task_map[group](conn, host)
+
+
+async def run_dispatch(hosts, group_task_map, max_sessions):
+    '''
+    Run host tasks for all hosts, return list of results or exceptions in order of hosts
+    max_sessions - limit of concurrent sessions of all hosts, groups limited by max_sessions of group data
+    '''
+    sessions = asyncio.Semaphore(max_sessions)
+    group_sessions = get_group_sessions(hosts, max_sessions)
+    return await asyncio.gather(*(subtask_dispatch(host, group_task_map, sessions, group_sessions)
+                                  for host in hosts), return_exceptions=True)
+
+
+def task_dispatch(task, group_task_map, max_sessions=MAX_SESSIONS):
+    '''
+    Run one pass for all hosts of nornir object in event loop
+    Output - list of object from platform host tasks, failed hosts marked with error as in nornir tasks
+    '''
+    logger = logging.getLogger(__name__)
+    result = list()
+    hosts = list(task.inventory.hosts.values())
+    out = asyncio.run(run_dispatch(hosts, group_task_map, max_sessions))
+    for host, res in zip(hosts, out):
+        if isinstance(res, asyncio.TimeoutError):
+            logger.warning(f'Timeout of task on device {host.name}')
+            host['error'] = True
+        elif isinstance(res, Exception):
+            logger.warning(f'Failed task on device {host.name}: {res!r}')
+            host['error'] = True
+        elif res is not None:
+            host['error'] = False
+            result.append(res)
+    return result
+
+
+def task_get_info(task, max_sessions=MAX_SESSIONS):
+    '''
+    Function for get OS version from all devices
+    Output - list of object, present device
+    '''
+    logger = logging.getLogger(__name__)
+    logger.debug('Get OS version')
+    return task_dispatch(task, map_group_subtask_get_info, max_sessions)
+
+
+def task_get_users(task, max_sessions=MAX_SESSIONS):
+    '''
+    Function for get users from all devices
+    Output - list of object, present device with users
+    '''
+    logger = logging.getLogger(__name__)
+    logger.debug('Get users info')
+    return task_dispatch(task, map_group_subtask_get_users, max_sessions)
+
+
+def task_get_packages(task, max_sessions=MAX_SESSIONS):
+    '''
+    Function for get RouterOS installed packages
+    Output - list of object, present RouterOS device
+    '''
+    logger = logging.getLogger(__name__)
+    logger.debug('Get RouterOS installed packages')
+    return task_dispatch(task, map_group_subtask_get_packages, max_sessions)
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
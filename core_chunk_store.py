@@ -0,0 +1,236 @@
+'''
+Module for store binary files (RouterOS .backup) as content-defined chunks
+Boundaries of chunks found by gear rolling hash, so insert or change of data
+change only near chunks, other chunks of file shared with previous versions
+Layout of store dir:
+    chunks/<2 first chars>/<sha256> - zlib compressed chunk
+    manifests/<2 first chars>/<md5> - json {"size", "chunks": [[sha256, length], ...]} of file
+'''
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import zlib
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import core_config_store
+
+# chunk sizes in bytes, average size 2**AVG_BITS
+MIN_CHUNK = 1024
+AVG_BITS = 12
+MAX_CHUNK = 65536
+BOUNDARY_MASK = ((1 << AVG_BITS) - 1) << (32 - AVG_BITS)
+# gear table must not changed, else boundaries of new files not equal with stored
+GEAR = [random.Random(20201113 + byte).getrandbits(32) for byte in range(256)]
+READ_SIZE = 1048576
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def find_boundary(data, start, end):
+    '''
+    Return end of chunk started at start, data[start:end] - available data
+    '''
+    gear = GEAR
+    mask = BOUNDARY_MASK
+    limit = min(end, start + MAX_CHUNK)
+    position = start + MIN_CHUNK
+    if position >= limit:
+        return limit
+    rolling = 0
+    for byte in data[position:limit]:
+        rolling = ((rolling << 1) + gear[byte]) & 0xFFFFFFFF
+        position += 1
+        if not rolling & mask:
+            return position
+    return limit
+
+
+def iter_chunks(file_obj):
+    '''
+    Generator of chunks (bytes) of file
+    '''
+    buffer = b''
+    while True:
+        data = file_obj.read(READ_SIZE)
+        buffer += data
+        start = 0
+        # without new data last chunk can be shorter then MAX_CHUNK
+        while len(buffer) - start >= MAX_CHUNK or (not data and start < len(buffer)):
+            end = find_boundary(buffer, start, len(buffer))
+            yield buffer[start:end]
+            start = end
+        buffer = buffer[start:]
+        if not data:
+            break
+
+
+def get_chunk_path(store_dir, chunk):
+    '''
+    Return path of chunk in store
+    '''
+    return os.path.join(store_dir, 'chunks', chunk[:2], chunk)
+
+
+def get_manifest_path(store_dir, blob):
+    '''
+    Return path of file manifest in store
+    '''
+    return os.path.join(store_dir, 'manifests', blob[:2], blob)
+
+
+def has_manifest(store_dir, blob):
+    '''
+    Check file saved as chunks
+    '''
+    return os.path.isfile(get_manifest_path(store_dir, blob))
+
+
+def put_chunk(store_dir, data):
+    '''
+    Save chunk to store if not exists
+    Return (hash of chunk, True if chunk created)
+    '''
+    chunk = hashlib.sha256(data).hexdigest()
+    chunk_path = get_chunk_path(store_dir, chunk)
+    if os.path.isfile(chunk_path):
+        return chunk, False
+    core_config_store.write_atomic(chunk_path, zlib.compress(data))
+    return chunk, True
+
+
+def get_chunk(store_dir, chunk):
+    '''
+    Return data of chunk
+    '''
+    with open(get_chunk_path(store_dir, chunk), 'rb') as chunk_file:
+        return zlib.decompress(chunk_file.read())
+
+
+def put_file(store_dir, filename):
+    '''
+    Split file to chunks and save new chunks and manifest to store
+    Return (md5 hash of file, count of new chunks, size of new chunks)
+    '''
+    logger = logging.getLogger(__name__)
+    md5 = hashlib.md5()
+    chunks = list()
+    new_count = 0
+    new_size = 0
+    with open(filename, 'rb') as binary_file:
+        for data in iter_chunks(binary_file):
+            md5.update(data)
+            chunk, created = put_chunk(store_dir, data)
+            chunks.append([chunk, len(data)])
+            if created:
+                new_count += 1
+                new_size += len(data)
+    blob = md5.hexdigest()
+    manifest_path = get_manifest_path(store_dir, blob)
+    if not os.path.isfile(manifest_path):
+        manifest = {'size': sum(length for _, length in chunks), 'chunks': chunks}
+        core_config_store.write_atomic(manifest_path, json.dumps(manifest).encode('utf-8'))
+    logger.debug(f'File {filename} saved as {blob}: {len(chunks)} chunks, {new_count} new ({new_size} bytes)')
+    return blob, new_count, new_size
+
+
+def read_manifest(store_dir, blob):
+    '''
+    Return manifest of file
+    '''
+    with open(get_manifest_path(store_dir, blob)) as manifest_file:
+        return json.load(manifest_file)
+
+
+def iter_file(store_dir, blob):
+    '''
+    Generator of data of file saved as chunks, read one chunk in memory
+    '''
+    for chunk, _ in read_manifest(store_dir, blob)['chunks']:
+        yield get_chunk(store_dir, chunk)
+
+
+def restore_file(store_dir, blob, filename):
+    '''
+    Restore file from chunks, check md5 hash of restored data
+    Return True if restored file equal with saved
+    '''
+    logger = logging.getLogger(__name__)
+    md5 = hashlib.md5()
+    with open(filename, 'wb') as binary_file:
+        for data in iter_file(store_dir, blob):
+            md5.update(data)
+            binary_file.write(data)
+    if md5.hexdigest() != blob:
+        logger.error(f'Restored file {filename} not equal with saved {blob}')
+        return False
+    return True
+
+
+def store_file(store_dir, host, filename, timestamp=None, kind=core_config_store.KIND_BACKUP):
+    '''
+    Save binary file of host as chunks and add it to index of config store
+    Return (hash, hash of previous file or None)
+    '''
+    logger = logging.getLogger(__name__)
+    timestamp = timestamp or core_config_store.get_timestamp()
+    previous = core_config_store.get_latest(store_dir, host, kind)
+    blob, new_count, new_size = put_file(store_dir, filename)
+    logger.debug(f'Save {kind} {blob} of {host}, new chunks {new_count} ({new_size} bytes)')
+    core_config_store.add_index(store_dir, host, blob, timestamp, kind)
+    return blob, previous[1] if previous else None
+
+
+def restore_host_file(store_dir, host, filename, timestamp=None, kind=core_config_store.KIND_BACKUP):
+    '''
+    Restore binary file of host from store, latest if timestamp not set
+    Return False if file not found or restored with error
+    '''
+    logger = logging.getLogger(__name__)
+    for file_timestamp, blob in reversed(core_config_store.list_configs(store_dir, host, kind)):
+        if timestamp is None or file_timestamp == timestamp:
+            if not has_manifest(store_dir, blob):
+                logger.error(f'{kind} {blob} of {host} not saved as chunks')
+                return False
+            return restore_file(store_dir, blob, filename)
+    logger.error(f'{kind} of {host} with timestamp {timestamp} not found')
+    return False
+
+
+def store_size(store_dir):
+    '''
+    Return size in bytes of chunks and manifests in store
+    '''
+    result = 0
+    for sub_dir in ('chunks', 'manifests'):
+        for dir_path, _, filenames in os.walk(os.path.join(store_dir, sub_dir)):
+            result += sum(os.path.getsize(os.path.join(dir_path, filename)) for filename in filenames)
+    return result
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
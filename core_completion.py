@@ -0,0 +1,149 @@
+'''
+Module for read command output until device prompt instead of fixed timing waits
+End of output detected by:
+    prompt of device on last line (after echo of command, so prompt left from previous
+    command or session preparation not taken as end of output)
+    trailer pattern of command (for example 'end' of cisco config) and short pause
+    timing fallback - no new data for idle_timeout after output started
+'''
+import logging
+import re
+import sys
+import time
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+from nornir.core.task import Result, Task
+
+import core_metrics
+
+# pause between reads of channel
+READ_INTERVAL = 0.02
+# wait after trailer pattern without prompt
+TRAILER_TIMEOUT = 0.2
+# timing fallback: no new data after output started
+IDLE_TIMEOUT = 5.0
+# max time of command
+READ_TIMEOUT = 120.0
+# last chars of prompt for all platforms: cisco, junos, routeros
+PROMPT_TERMINATORS = '>#%$'
+# first chars of command for find echo, long commands can be wrapped by terminal
+ECHO_CHARS = 30
+# known trailers of command outputs
+CISCO_CONFIG_TRAILER = r'^end\s*$'
+JUNOS_COMMIT_TRAILER = r'^commit complete\s*$'
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def get_prompt_regex(base_prompt):
+    '''
+    Return regex of prompt line
+    '''
+    return re.compile(rf'\s*{re.escape(base_prompt)}.*[{re.escape(PROMPT_TERMINATORS)}]\s*$')
+
+
+def read_until_end(connection, prompt_regex, trailer_regexes=(), idle_timeout=IDLE_TIMEOUT,
+                   read_timeout=READ_TIMEOUT, echo=''):
+    '''
+    Read channel until prompt, trailer and pause, or pause of idle_timeout (timing fallback)
+    Prompt and trailers checked only after line with echo of command, empty echo - after first line
+    Return (output, reason of end)
+    '''
+    output = ''
+    # start of lines not checked for trailers
+    checked = None
+    trailer_found = False
+    start = last_data = time.monotonic()
+    while True:
+        data = connection.read_channel()
+        now = time.monotonic()
+        if data:
+            output += data
+            last_data = now
+            echo_pos = output.find(echo) if checked is None else -1
+            if echo_pos >= 0 and '\n' in output[echo_pos:]:
+                checked = output.index('\n', echo_pos) + 1
+            if checked is not None:
+                lines_end = output.rfind('\n') + 1
+                if prompt_regex.match(output, lines_end):
+                    return output, 'prompt'
+                if not trailer_found and lines_end > checked:
+                    trailer_found = any(trailer_regex.search(output, checked, lines_end)
+                                        for trailer_regex in trailer_regexes)
+                    checked = lines_end
+        elif output:
+            if trailer_found and now - last_data >= TRAILER_TIMEOUT:
+                return output, 'trailer'
+            if now - last_data >= idle_timeout:
+                return output, 'timing'
+        if now - start >= read_timeout:
+            raise TimeoutError(f'Output of command not completed for {read_timeout} seconds')
+        time.sleep(READ_INTERVAL)
+
+
+def send_command(connection, command_string, trailer_patterns=(), idle_timeout=IDLE_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, strip_prompt=True, strip_command=True):
+    '''
+    Send command over netmiko connection and read output until end detected
+    Return output without echo of command and prompt, as netmiko send_command
+    '''
+    logger = logging.getLogger(__name__)
+    prompt_regex = get_prompt_regex(connection.base_prompt)
+    trailer_regexes = [re.compile(pattern, re.M) for pattern in trailer_patterns]
+    # drop rest of previous output, clear_buffer of netmiko sleep with delay factor
+    connection.read_channel()
+    start = time.monotonic()
+    connection.write_channel(connection.normalize_cmd(command_string))
+    echo = command_string.strip()[:ECHO_CHARS]
+    output, end = read_until_end(connection, prompt_regex, trailer_regexes, idle_timeout, read_timeout, echo)
+    logger.debug(f'Command {command_string!r} completed by {end} in {time.monotonic() - start:.3f}s')
+    if end == 'timing':
+        logger.warning(f'Prompt of device not found after command {command_string!r}, output read by timing')
+    output = connection.normalize_linefeeds(output)
+    # prompts of session preparation can come after read of rest, output start from echo for strip_command
+    echo_pos = output.find(echo)
+    if echo_pos > 0:
+        output = output[echo_pos:]
+    if strip_command:
+        output = connection.strip_command(command_string, output)
+    if strip_prompt:
+        output = connection.strip_prompt(output)
+    return output
+
+
+def netmiko_send_command_prompt(task: Task, command_string, trailer_patterns=(), idle_timeout=IDLE_TIMEOUT,
+                                read_timeout=READ_TIMEOUT, **kwargs):
+    '''
+    Host task - send command over netmiko connection, output end detected by prompt
+    '''
+    connection = core_metrics.get_connection(task.host, 'netmiko', task.nornir.config)
+    with core_metrics.measure(task.host.name, 'command', command_string) as counter:
+        result = send_command(connection, command_string, trailer_patterns, idle_timeout, read_timeout, **kwargs)
+        counter['bytes'] = len(result)
+    return Result(host=task.host, result=result)
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+'''
+Module for index of config changes in content-addressed store
+After every save run new configs compared with previous config of host (normalized form),
+line diff saved in sqlite index, so queries not read and diff config files
+First config of host saved as baseline in state, it not reported as change
+Tables:
+    runs - id and timestamp of every index update
+    state - last indexed timestamp, hash and platform (for normalize) of every host
+    changes - diff of every changed config: host, timestamp, run, hashes, added/removed lines count
+'''
+import difflib
+import logging
+import os
+import sqlite3
+import sys
+import zlib
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import core_config_store
+import core_normalize
+
+INDEX_FILENAME = 'diff_index.sqlite'
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def open_index(store_dir):
+    '''
+    Open diff index of store, create if not exists
+    '''
+    conn = sqlite3.connect(os.path.join(store_dir, INDEX_FILENAME))
+    conn.execute('CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT)')
+    conn.execute('CREATE TABLE IF NOT EXISTS state (host TEXT PRIMARY KEY, ts TEXT, hash TEXT, platform TEXT)')
+    if 'platform' not in [column[1] for column in conn.execute('PRAGMA table_info(state)')]:
+        conn.execute('ALTER TABLE state ADD COLUMN platform TEXT')
+    conn.execute('''CREATE TABLE IF NOT EXISTS changes (host TEXT, ts TEXT, run INTEGER, hash TEXT,
+                    previous TEXT, added INTEGER, removed INTEGER, diff BLOB)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS changes_host_ts ON changes (host, ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS changes_run ON changes (run)')
+    conn.commit()
+    return conn
+
+
+def get_normalized_lines(store_dir, host, timestamp, platform=None):
+    '''
+    Return normalized lines of config of host saved at timestamp, empty list for None
+    platform - platform used for hash of config, None - detect by content
+    '''
+    if timestamp is None:
+        return list()
+    text = core_config_store.get_config(store_dir, host, timestamp).decode('utf-8', errors='replace')
+    return list(core_normalize.normalize_lines(text.splitlines(), platform))
+
+
+def make_diff(old_lines, new_lines, old_name='', new_name=''):
+    '''
+    Return (diff text without context, count of added lines, count of removed lines)
+    '''
+    diff = list(difflib.unified_diff(old_lines, new_lines, old_name, new_name, n=0))
+    added = sum(1 for line in diff if line.startswith('+') and not line.startswith('+++'))
+    removed = sum(1 for line in diff if line.startswith('-') and not line.startswith('---'))
+    return ''.join(diff), added, removed
+
+
+def update_index(store_dir, hosts=None, platforms=None):
+    '''
+    Add changes of configs saved after last update to index
+    hosts - list of hosts for check, default - all hosts of store
+    platforms - dict {host: platform} used for save configs, default - platform from state
+    Return id of run
+    '''
+    logger = logging.getLogger(__name__)
+    platforms = platforms or dict()
+    conn = open_index(store_dir)
+    try:
+        run_id = conn.execute('INSERT INTO runs (ts) VALUES (?)', (core_config_store.get_timestamp(),)).lastrowid
+        state = {host: (ts, blob, platform)
+                 for host, ts, blob, platform in conn.execute('SELECT host, ts, hash, platform FROM state')}
+        for host in hosts or core_config_store.list_hosts(store_dir):
+            last_ts, previous, platform = state.get(host, ('', None, None))
+            platform = platforms.get(host, platform)
+            configs = [(ts, blob) for ts, blob in core_config_store.list_configs(store_dir, host) if ts > last_ts]
+            previous_ts = last_ts or None
+            if host not in state and configs:
+                logger.debug(f'Baseline config of {host} {configs[0][1]}')
+                previous_ts, previous = configs[0]
+            previous_lines = None
+            for ts, blob in configs:
+                if blob != previous:
+                    if previous_lines is None:
+                        previous_lines = get_normalized_lines(store_dir, host, previous_ts, platform)
+                    lines = get_normalized_lines(store_dir, host, ts, platform)
+                    diff, added, removed = make_diff(previous_lines, lines, previous or '', blob)
+                    logger.debug(f'Config of {host} changed at {ts}: +{added} -{removed}')
+                    conn.execute('INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 (host, ts, run_id, blob, previous, added, removed,
+                                  zlib.compress(diff.encode('utf-8'))))
+                    previous, previous_lines = blob, lines
+                last_ts = ts
+            if configs:
+                conn.execute('INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)', (host, last_ts, previous, platform))
+        conn.commit()
+    finally:
+        conn.close()
+    return run_id
+
+
+def get_changes(store_dir, host, since=None):
+    '''
+    Return list of changes of host after timestamp since (all if None), old first
+    change - dict {ts, hash, previous, added, removed, diff}
+    '''
+    conn = open_index(store_dir)
+    try:
+        rows = conn.execute('''SELECT ts, hash, previous, added, removed, diff FROM changes
+                               WHERE host = ? AND ts > ? ORDER BY ts''', (host, since or '')).fetchall()
+    finally:
+        conn.close()
+    return [{'ts': ts, 'hash': blob, 'previous': previous, 'added': added, 'removed': removed,
+             'diff': zlib.decompress(diff).decode('utf-8')}
+            for ts, blob, previous, added, removed, diff in rows]
+
+
+def get_last_run(store_dir):
+    '''
+    Return id of last run, None if index empty
+    '''
+    conn = open_index(store_dir)
+    try:
+        return conn.execute('SELECT MAX(id) FROM runs').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_changed_hosts(store_dir, run_id=None):
+    '''
+    Return dict {host: (added, removed)} of hosts changed in run, default - last run
+    '''
+    run_id = run_id or get_last_run(store_dir)
+    conn = open_index(store_dir)
+    try:
+        rows = conn.execute('''SELECT host, SUM(added), SUM(removed) FROM changes WHERE run = ?
+                               GROUP BY host ORDER BY host''', (run_id,)).fetchall()
+    finally:
+        conn.close()
+    return {host: (added, removed) for host, added, removed in rows}
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
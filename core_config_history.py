@@ -0,0 +1,220 @@
+'''
+Module for store history of host configs as compressed delta chain
+Layout of history dir:
+    <host>.pack - records of versions: full config (keyframe) or delta from previous version
+    <host>.idx - json lines {"ts", "offset", "length", "type"} for every version
+Every KEYFRAME_INTERVAL version saved full, so for get any version need apply
+not more then KEYFRAME_INTERVAL-1 deltas
+'''
+import difflib
+import json
+import logging
+import os
+import sys
+import zlib
+assert sys.version_info.major == 3, 'For script run please use python3'
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+KEYFRAME_INTERVAL = 16
+TYPE_KEY = 'key'
+TYPE_DELTA = 'delta'
+# first byte of record - compress method
+COMPRESS_ZLIB = b'z'
+COMPRESS_ZSTD = b's'
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def compress(data):
+    '''
+    Compress bytes with zstd if installed, else with zlib
+    '''
+    if zstandard:
+        return COMPRESS_ZSTD + zstandard.ZstdCompressor(level=19).compress(data)
+    return COMPRESS_ZLIB + zlib.compress(data, 9)
+
+
+def decompress(data):
+    '''
+    Decompress record
+    '''
+    if data[:1] == COMPRESS_ZSTD:
+        if zstandard is None:
+            raise RuntimeError('Record compressed with zstd, please install zstandard')
+        return zstandard.ZstdDecompressor().decompress(data[1:])
+    return zlib.decompress(data[1:])
+
+
+def make_delta(base_lines, lines):
+    '''
+    Make delta of lines from base_lines, opcodes of matcher used by difflib.unified_diff
+    Delta - list of ["c", start, end] (copy lines from base) and ["i", lines] (insert lines)
+    '''
+    result = list()
+    matcher = difflib.SequenceMatcher(None, base_lines, lines)
+    for tag, base_start, base_end, start, end in matcher.get_opcodes():
+        if tag == 'equal':
+            result.append(['c', base_start, base_end])
+        elif tag in ('replace', 'insert'):
+            result.append(['i', lines[start:end]])
+    return result
+
+
+def apply_delta(base_lines, delta):
+    '''
+    Return lines restored from base_lines and delta
+    '''
+    result = list()
+    for operation in delta:
+        if operation[0] == 'c':
+            result.extend(base_lines[operation[1]:operation[2]])
+        else:
+            result.extend(operation[1])
+    return result
+
+
+def get_paths(history_dir, host):
+    '''
+    Return paths of pack and index files of host
+    '''
+    return os.path.join(history_dir, f'{host}.pack'), os.path.join(history_dir, f'{host}.idx')
+
+
+def read_index(history_dir, host):
+    '''
+    Return list of index records of host, old first
+    '''
+    _, index_path = get_paths(history_dir, host)
+    if not os.path.isfile(index_path):
+        return list()
+    with open(index_path) as index_file:
+        return [json.loads(line) for line in index_file if line.strip()]
+
+
+def list_versions(history_dir, host):
+    '''
+    Return list of timestamps of saved versions, old first
+    '''
+    return [record['ts'] for record in read_index(history_dir, host)]
+
+
+def list_hosts(history_dir):
+    '''
+    Return list of hosts with history
+    '''
+    if not os.path.isdir(history_dir):
+        return list()
+    return sorted(filename[:-4] for filename in os.listdir(history_dir) if filename.endswith('.idx'))
+
+
+def read_record(pack_file, record):
+    '''
+    Read and decode record of pack
+    '''
+    pack_file.seek(record['offset'])
+    return json.loads(decompress(pack_file.read(record['length'])).decode('utf-8'))
+
+
+def get_version_lines(history_dir, host, version, index=None):
+    '''
+    Return lines of version, version - number in history or timestamp
+    '''
+    index = index if index is not None else read_index(history_dir, host)
+    if isinstance(version, str):
+        version = [record['ts'] for record in index].index(version)
+    keyframe = version
+    while index[keyframe]['type'] != TYPE_KEY:
+        keyframe -= 1
+    pack_path, _ = get_paths(history_dir, host)
+    with open(pack_path, 'rb') as pack_file:
+        lines = read_record(pack_file, index[keyframe])
+        for record in index[keyframe+1:version+1]:
+            lines = apply_delta(lines, read_record(pack_file, record))
+    return lines
+
+
+def get_version(history_dir, host, version=-1):
+    '''
+    Return config text of version, default - latest
+    version - number in history (negative from end) or timestamp
+    '''
+    index = read_index(history_dir, host)
+    if isinstance(version, int) and version < 0:
+        version += len(index)
+    return ''.join(get_version_lines(history_dir, host, version, index))
+
+
+def get_version_at(history_dir, host, timestamp):
+    '''
+    Return config text of last version saved not later then timestamp, None if not found
+    '''
+    index = read_index(history_dir, host)
+    versions = [number for number, record in enumerate(index) if record['ts'] <= timestamp]
+    if not versions:
+        return None
+    return ''.join(get_version_lines(history_dir, host, versions[-1], index))
+
+
+def append_version(history_dir, host, text, timestamp):
+    '''
+    Add config text of host to history
+    Return type of saved record
+    '''
+    logger = logging.getLogger(__name__)
+    os.makedirs(history_dir, exist_ok=True)
+    pack_path, index_path = get_paths(history_dir, host)
+    index = read_index(history_dir, host)
+    lines = text.splitlines(keepends=True)
+    if len(index) % KEYFRAME_INTERVAL == 0:
+        record_type = TYPE_KEY
+        payload = lines
+    else:
+        record_type = TYPE_DELTA
+        payload = make_delta(get_version_lines(history_dir, host, len(index) - 1, index), lines)
+    data = compress(json.dumps(payload).encode('utf-8'))
+    with open(pack_path, 'ab') as pack_file:
+        offset = pack_file.tell()
+        pack_file.write(data)
+    with open(index_path, 'a') as index_file:
+        index_file.write(json.dumps({'ts': timestamp, 'offset': offset, 'length': len(data),
+                                     'type': record_type}) + '\n')
+    logger.debug(f'Add {record_type} version {timestamp} of {host}, {len(data)} bytes')
+    return record_type
+
+
+def history_size(history_dir, host=None):
+    '''
+    Return size in bytes of history files (for host or all)
+    '''
+    hosts = [host] if host else list_hosts(history_dir)
+    return sum(os.path.getsize(path) for host_name in hosts for path in get_paths(history_dir, host_name)
+               if os.path.isfile(path))
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+'''
+Module for content-addressed store of device configs
+Layout of store dir:
+    index/<host>.<kind> - lines "timestamp hash", one line per saved config, hash of normalized config
+                          (kind backup - hash of file saved as chunks by core_chunk_store)
+    refs/<host>.<kind> - line "timestamp hash" of latest config
+    history/<host>.pack, history/<host>.idx - delta history of changed configs (core_config_history),
+                                              only content of configs, config of index line - last version
+                                              of history not later then timestamp of line
+    objects/<2 first chars>/<hash> - config content of stores saved before history, read only
+    .config_store - marker of store, clean_duplicate_file skip marked dirs
+Equal files of different hosts are not duplicates in store, so store dir placed out of config archive
+'''
+import logging
+import os
+import sys
+import tempfile
+from time import gmtime, strftime
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import core_config_history
+import core_normalize
+
+# default store dir, out of config archive processed by clean_duplicate_file
+STORE_DIR = 'config_store'
+STORE_MARKER = '.config_store'
+HISTORY_DIR = 'history'
+KIND_CONFIG = 'cfg'
+KIND_BACKUP = 'backup'
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H%M%S"
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def get_timestamp():
+    '''
+    Return timestamp for saved config
+    '''
+    return strftime(TIMESTAMP_FORMAT, gmtime())
+
+
+def write_atomic(path, data):
+    '''
+    Write bytes to file through temp file and rename
+    '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as temp_file:
+        temp_file.write(data)
+    os.replace(temp_path, path)
+
+
+def init_store(store_dir):
+    '''
+    Create store dir with marker if not exists
+    '''
+    marker_path = os.path.join(store_dir, STORE_MARKER)
+    if not os.path.isfile(marker_path):
+        write_atomic(marker_path, b'')
+
+
+def get_blob_path(store_dir, blob):
+    '''
+    Return path of object in store
+    '''
+    return os.path.join(store_dir, 'objects', blob[:2], blob)
+
+
+def get_blob(store_dir, blob):
+    '''
+    Return content of object as bytes
+    '''
+    with open(get_blob_path(store_dir, blob), 'rb') as blob_file:
+        return blob_file.read()
+
+
+def get_latest(store_dir, host, kind=KIND_CONFIG):
+    '''
+    Return (timestamp, hash) of latest config of host, None if host not have configs
+    '''
+    ref_path = os.path.join(store_dir, 'refs', f'{host}.{kind}')
+    if not os.path.isfile(ref_path):
+        return None
+    with open(ref_path) as ref_file:
+        timestamp, blob = ref_file.read().split()
+    return timestamp, blob
+
+
+def list_configs(store_dir, host, kind=KIND_CONFIG):
+    '''
+    Return list of (timestamp, hash) of host configs, old first
+    '''
+    index_path = os.path.join(store_dir, 'index', f'{host}.{kind}')
+    if not os.path.isfile(index_path):
+        return list()
+    with open(index_path) as index_file:
+        return [tuple(line.split()) for line in index_file if line.strip()]
+
+
+def list_hosts(store_dir, kind=KIND_CONFIG):
+    '''
+    Return list of hosts with saved configs
+    '''
+    refs_dir = os.path.join(store_dir, 'refs')
+    if not os.path.isdir(refs_dir):
+        return list()
+    return sorted(filename[:-len(kind)-1] for filename in os.listdir(refs_dir)
+                  if filename.endswith(f'.{kind}'))
+
+
+def get_config(store_dir, host, timestamp=None):
+    '''
+    Return config of host as bytes, latest if timestamp not set
+    None if config not found, backups restore with core_chunk_store.restore_host_file
+    '''
+    if timestamp is None:
+        latest = get_latest(store_dir, host, KIND_CONFIG)
+        if latest is None:
+            return None
+        timestamp = latest[0]
+    text = core_config_history.get_version_at(os.path.join(store_dir, HISTORY_DIR), host, timestamp)
+    if text is not None:
+        return text.encode('utf-8')
+    # configs saved before history kept as objects
+    for config_timestamp, blob in list_configs(store_dir, host, KIND_CONFIG):
+        if config_timestamp == timestamp and os.path.isfile(get_blob_path(store_dir, blob)):
+            return get_blob(store_dir, blob)
+    return None
+
+
+def add_index(store_dir, host, blob, timestamp, kind):
+    '''
+    Add config of host to index and set it latest
+    '''
+    init_store(store_dir)
+    index_dir = os.path.join(store_dir, 'index')
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, f'{host}.{kind}'), 'a') as index_file:
+        index_file.write(f'{timestamp} {blob}\n')
+    write_atomic(os.path.join(store_dir, 'refs', f'{host}.{kind}'), f'{timestamp} {blob}\n'.encode('utf-8'))
+
+
+def store_config(store_dir, host, text, platform=None, timestamp=None):
+    '''
+    Save text config of host to store, hash calc for normalized config
+    Unchanged config add only index line, changed config added to history of host
+    Return (hash, hash of previous config or None)
+    '''
+    logger = logging.getLogger(__name__)
+    timestamp = timestamp or get_timestamp()
+    blob = core_normalize.hash_text(text, platform)
+    previous = get_latest(store_dir, host, KIND_CONFIG)
+    if previous is None or previous[1] != blob:
+        logger.debug(f'Save new config {blob} of {host}')
+        core_config_history.append_version(os.path.join(store_dir, HISTORY_DIR), host, text, timestamp)
+    else:
+        logger.debug(f'Config of {host} not changed {blob}')
+    add_index(store_dir, host, blob, timestamp, KIND_CONFIG)
+    return blob, previous[1] if previous else None
+
+
+def store_file(store_dir, host, filename, platform=None, timestamp=None):
+    '''
+    Save config file to store, binary files save with core_chunk_store.store_file
+    Return (hash, hash of previous config or None)
+    '''
+    with open(filename, 'r', errors='replace') as config_file:
+        return store_config(store_dir, host, config_file.read(), platform, timestamp)
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
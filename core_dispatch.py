@@ -0,0 +1,109 @@
+'''
+Module for run one nornir pass over all inventory with per host platform dispatch
+'''
+import logging
+import sys
+assert sys.version_info.major == 3, 'For script run please use python3'
+from nornir.core.task import Task
+
+import core_ios_task
+import core_jun_task
+import core_normalize
+import core_qtech_task
+import core_routeros_task
+
+# set mapping from groupname to called host task
+map_group_subtask_get_info = {'ios': core_ios_task.subtask_get_info,
+                              'jun_srx': core_jun_task.subtask_get_info,
+                              'routeros': core_routeros_task.subtask_get_info,
+                              'qtech': core_qtech_task.subtask_get_info}
+
+map_group_subtask_get_users = {'ios': core_ios_task.subtask_get_users,
+                               'jun_srx': core_jun_task.subtask_get_users,
+                               'routeros': core_routeros_task.subtask_get_users,
+                               'qtech': core_qtech_task.subtask_get_users}
+
+# set mapping from groupname to platform name for output
+map_group_platform_name = {'ios': 'IOS',
+                           'jun_srx': 'JunOS',
+                           'routeros': 'ROS',
+                           'qtech': 'Qtech'}
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def subtask_dispatch(task: Task, group_task_map):
+    '''
+    Host task - select platform implementation by host group and run it
+    '''
+    logger = logging.getLogger(__name__)
+    group = core_normalize.get_host_platform(task.host)
+    if group not in group_task_map:
+        logger.warning(f'Device {task.host.name} not have task for groups {task.host.groups}')
+        return None
+    return group_task_map[group](task)
+
+
+def task_dispatch(task: Task, group_task_map):
+    '''
+    Run one pass for all hosts, platform task select per host in worker
+    Output - list of object from platform host tasks
+    '''
+    logger = logging.getLogger(__name__)
+    result = list()
+    out = task.run(task=subtask_dispatch, group_task_map=group_task_map)
+    if out.failed:
+        for host in out.failed_hosts.keys():
+            logger.warning(f'Failed task on device {host}')
+            task.inventory.hosts[host]['error'] = True
+    for host, res in out.items():
+        if not res.failed and res.result is not None:
+            task.inventory.hosts[host]['error'] = False
+            result.append(res.result)
+    return result
+
+
+def task_get_info(task: Task):
+    '''
+    Function for get OS version from all devices
+    Output - list of object, present device
+    '''
+    logger = logging.getLogger(__name__)
+    logger.debug('Get OS version')
+    return task_dispatch(task, map_group_subtask_get_info)
+
+
+def task_get_users(task: Task):
+    '''
+    Function for get users from all devices
+    Output - list of object, present device with users
+    '''
+    logger = logging.getLogger(__name__)
+    logger.debug('Get users info')
+    return task_dispatch(task, map_group_subtask_get_users)
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
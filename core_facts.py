@@ -0,0 +1,185 @@
+'''
+Module for columnar table of device facts
+Facts of devices stored as numpy columns: numeric facts - float arrays (nan for unknown),
+text facts - str arrays, so checks for all devices run as vector operations
+Table saved per run as <facts_dir>/facts_<timestamp>.npz, export to csv or parquet (need pyarrow)
+'''
+import csv
+import logging
+import os
+import sys
+from time import gmtime, strftime
+assert sys.version_info.major == 3, 'For script run please use python3'
+import numpy as np
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H%M%S"
+# columns of RouterOS facts from task_get_info
+NUMERIC_COLUMNS = ('freememory', 'totalmemory', 'cpuloadprc', 'freehddspace')
+TEXT_COLUMNS = ('hostname', 'address', 'version', 'arch', 'model')
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def to_float(value):
+    '''
+    Convert fact value to float, nan for unknown value
+    '''
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class FactsTable:
+    '''
+    Columnar table of facts, columns - dict {name: numpy array}, all arrays with equal length
+    '''
+
+    def __init__(self, columns):
+        self.columns = dict(columns)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_records(cls, records, numeric_columns=NUMERIC_COLUMNS, text_columns=TEXT_COLUMNS):
+        '''
+        Create table from list of records (namedtuple or slotted records), absent field - unknown value
+        '''
+        columns = dict()
+        for name in text_columns:
+            columns[name] = np.array([str(getattr(record, name, '')) for record in records], dtype=str)
+        for name in numeric_columns:
+            columns[name] = np.array([to_float(getattr(record, name, None)) for record in records], dtype=float)
+        return cls(columns)
+
+    def select(self, mask):
+        '''
+        Return table with rows selected by boolean mask or indexes
+        '''
+        return FactsTable({name: column[mask] for name, column in self.columns.items()})
+
+    def with_column(self, name, values):
+        '''
+        Return table with added or replaced column
+        '''
+        columns = dict(self.columns)
+        columns[name] = np.asarray(values)
+        return FactsTable(columns)
+
+    def histogram(self, *names):
+        '''
+        Return dict {(values of columns): count of rows}, for example version by model
+        '''
+        if not len(self):
+            return dict()
+        keys = np.stack([self.columns[name].astype(str) for name in names], axis=1)
+        values, counts = np.unique(keys, axis=0, return_counts=True)
+        return {tuple(str(item) for item in value): int(count) for value, count in zip(values, counts)}
+
+    def rows(self):
+        '''
+        Generator of rows as dict
+        '''
+        names = list(self.columns)
+        for values in zip(*(self.columns[name].tolist() for name in names)):
+            yield dict(zip(names, values))
+
+    def save(self, facts_dir, timestamp=None):
+        '''
+        Save table to facts dir, return path of file
+        '''
+        os.makedirs(facts_dir, exist_ok=True)
+        timestamp = timestamp or strftime(TIMESTAMP_FORMAT, gmtime())
+        result = os.path.join(facts_dir, f'facts_{timestamp}.npz')
+        np.savez_compressed(result, **self.columns)
+        return result
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Load table from file saved by save
+        '''
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def to_csv(self, path):
+        '''
+        Export table to csv file
+        '''
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(self.columns))
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def to_parquet(self, path):
+        '''
+        Export table to parquet file, need pyarrow
+        '''
+        if pyarrow is None:
+            raise RuntimeError('For export to parquet please install pyarrow')
+        table = pyarrow.table({name: pyarrow.array(column) for name, column in self.columns.items()})
+        pyarrow.parquet.write_table(table, path)
+
+
+def list_runs(facts_dir):
+    '''
+    Return list of paths of saved tables, old first
+    '''
+    if not os.path.isdir(facts_dir):
+        return list()
+    return [os.path.join(facts_dir, filename) for filename in sorted(os.listdir(facts_dir))
+            if filename.startswith('facts_') and filename.endswith('.npz')]
+
+
+def load_latest(facts_dir):
+    '''
+    Load latest saved table, None if tables not saved
+    '''
+    runs = list_runs(facts_dir)
+    return FactsTable.load(runs[-1]) if runs else None
+
+
+def low_memory_mask(table, need_bytes, limit):
+    '''
+    Return mask of devices with free memory after upload need_bytes not more then limit
+    freememory in MiB, need_bytes - array or number, unknown free memory - not enough
+    '''
+    free_bytes = table['freememory'] * 1024 * 1024
+    with np.errstate(invalid='ignore'):
+        result = ~(free_bytes - need_bytes > limit)
+    return result
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,24 @@ Module for ios task and functions
 import logging
 import sys
 assert sys.version_info.major == 3, 'For script run please use python3'
-from nornir_napalm.plugins.tasks import napalm_get
-from nornir_netmiko.tasks import netmiko_send_command
 from nornir_netmiko.tasks import netmiko_send_config
 from nornir_utils.plugins.functions import print_result
 from nornir_netmiko.tasks import netmiko_save_config
 from nornir.core.task import Task
 
-from core_task import create_info_tuple
+from core_task import create_record_class
+from core_task import create_info_record
+from core_template import get_fsm
+import core_normalize
+import core_metrics
+
+# command of users as in napalm get_users, include for IOS without section filter
+USERS_COMMAND = 'show run | section username'
+USERS_COMMAND_INCLUDE = 'show run | include username'
+INVALID_INPUT = 'Invalid input detected'
+# records of device facts, fields in order of parse
+VersionInfo = create_record_class('VersionInfo', ('hostname', 'model', 'version', 'image', 'serial', 'uptime'))
+UsersInfo = create_record_class('UsersInfo', ('hostname', 'users'))
 
 
 def configure_logging():
@@ -29,6 +39,7 @@ def configure_logging():
     logger.addHandler(console)
 
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_IOS)
 def parse_info(hostname, dict_prop):
     '''
     Create object from hostname, info
@@ -41,10 +52,11 @@ def parse_info(hostname, dict_prop):
     dict_out['image'] = dict_prop[0]['running_image']
     dict_out['serial'] = dict_prop[0]['serial'][0]
     dict_out['uptime'] = dict_prop[0]['uptime']
-    result = create_info_tuple(dict_out)
+    result = create_info_record(VersionInfo, dict_out)
     return result
 
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_IOS)
 def parse_users(hostname, dict_users):
     '''
     Create object from hostname, dict_user
@@ -56,10 +68,46 @@ def parse_users(hostname, dict_users):
     dict_out['users'] = dict()
     for user, user_prop in dict_users.items():
         dict_out['users'][user] = user_prop
-    result = create_info_tuple(dict_out)
+    result = create_info_record(UsersInfo, dict_out)
     return result
 
 
+def parse_users_config(hostname, text):
+    '''
+    Create object from output of USERS_COMMAND, users as in napalm get_users
+    Used in threaded and async modes, so users of both modes equal
+    '''
+    result = None
+    fsm = get_fsm('templates/ios_show_run_section_username.template')
+    dict_users = dict()
+    for user in fsm.ParseText(text):
+        temp_dict = dict(zip(fsm.header, user))
+        dict_users[temp_dict['username']] = {'level': int(temp_dict['level'] or 1),
+                                             'password': temp_dict['password'],
+                                             'sshkeys': list()}
+    fsm = get_fsm('templates/ios_show_run_section_username_sshkeys.template')
+    for username, sshkey in fsm.ParseText(text):
+        if username in dict_users:
+            dict_users[username]['sshkeys'].append(sshkey)
+    result = parse_users(hostname, dict_users)
+    return result
+
+
+@core_metrics.timed('task')
+def subtask_get_info(task: Task):
+    """
+    Host task for get IOS version
+    Output - object, present IOS device
+    """
+    logger = logging.getLogger(__name__)
+    # napalm ios driver work over netmiko, use it and not login second time for get_users
+    connection = core_metrics.get_connection(task.host, 'napalm', task.nornir.config)
+    with core_metrics.measure(task.host.name, 'command', 'show version'):
+        out = connection.device.send_command("show version", use_textfsm=True)
+    logger.debug(f'Fill IOS properties {task.host.name}')
+    return parse_info(task.host.name, out)
+
+
 def task_get_info(task: Task):
     """
     Function for get IOS version
@@ -68,23 +116,35 @@ def task_get_info(task: Task):
     logger = logging.getLogger(__name__)
     logger.debug('Get IOS version')
     result = list()
-    out = task.run(task=netmiko_send_command,
-                   command_string="show version", use_textfsm=True)
-#    print_result(out)
+    out = task.run(task=subtask_get_info)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning(f'Failed task on device {host}')
             task.inventory.hosts[host]['error'] = True
     for host, res in out.items():
         if not res.failed:
-            logger.debug(f'Fill IOS properties {host}')
             task.inventory.hosts[host]['error'] = False
-#            with open('output/qtech_show_version.txt','w+') as f:
-#                f.write(r.result)
-            result.append(parse_info(host, res.result))
+            result.append(res.result)
     return result
 
 
+@core_metrics.timed('task')
+def subtask_get_users(task: Task):
+    """
+    Host task for get user from IOS
+    Output - object, present IOS device with users
+    """
+    logger = logging.getLogger(__name__)
+    connection = core_metrics.get_connection(task.host, 'napalm', task.nornir.config)
+    with core_metrics.measure(task.host.name, 'command', USERS_COMMAND):
+        out = connection.device.send_command(USERS_COMMAND)
+    if INVALID_INPUT in out:
+        with core_metrics.measure(task.host.name, 'command', USERS_COMMAND_INCLUDE):
+            out = connection.device.send_command(USERS_COMMAND_INCLUDE)
+    logger.debug('Fill IOS users properties from device {}'.format(task.host.name))
+    return parse_users_config(task.host.name, out)
+
+
 def task_get_users(task: Task):
     """
     Function for get user from IOS
@@ -93,7 +153,7 @@ def task_get_users(task: Task):
     logger = logging.getLogger(__name__)
     logger.debug('Get IOS users info')
     result = list()
-    out = task.run(napalm_get, getters=['get_users'])
+    out = task.run(task=subtask_get_users)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning('Failed task on device {}'.format(
@@ -101,12 +161,8 @@ def task_get_users(task: Task):
             task.inventory.hosts[host]['error'] = True
     for host, res in out.items():
         if not res.failed:
-            logger.debug('Fill IOS users properties from device {}'.format(
-                task.inventory.hosts[host].name))
             task.inventory.hosts[host]['error'] = False
-#            with open('output/qtech_show_version.txt','w+') as f:
-#                f.write(r.result)
-            result.append(parse_users(host, res.result['get_users']))
+            result.append(res.result)
     return result
 
 
@@ -7,17 +7,25 @@ import sys
 assert sys.version_info.major == 3, 'For script run please use python3'
 
 import crypt
-import textfsm
 from nornir_napalm.plugins.tasks import napalm_get
 from nornir_netmiko.tasks import netmiko_send_command
 from nornir_utils.plugins.functions import print_result
 from nornir_netmiko.tasks import netmiko_send_config
-from nornir_netmiko.tasks import netmiko_commit
 from nornir.core.task import Task
 
 
 
-from core_task import create_info_tuple
+from core_task import create_record_class
+from core_task import create_info_record
+from core_template import get_fsm
+import core_normalize
+import core_metrics
+from core_completion import netmiko_send_command_prompt
+from core_completion import JUNOS_COMMIT_TRAILER
+
+# records of device facts, fields in order of parse
+VersionInfo = create_record_class('VersionInfo', ('hostname', 'version'))
+UsersInfo = create_record_class('UsersInfo', ('hostname', 'users'))
 
 
 def configure_logging():
@@ -34,6 +42,7 @@ def configure_logging():
     logger.addHandler(console)
 
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_JUNOS)
 def parse_info(hostname, dict_props):
     '''
     Create object from hostname,dict_props
@@ -43,10 +52,11 @@ def parse_info(hostname, dict_props):
     dict_out['hostname'] = hostname
     dict_out['version'] = dict_props[0]['other_properties_versions'][0]
 #    result = DeviceData(**dict_out)
-    result = create_info_tuple(dict_out)
+    result = create_info_record(VersionInfo, dict_out)
     return result
 
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_JUNOS)
 def parse_users(hostname, dict_users):
     '''
     Create object from users info
@@ -54,18 +64,32 @@ def parse_users(hostname, dict_users):
     result = None
     template_file_path = 'templates/jun_show_conf_system_login.template'
     dict_out = dict()
-    with open(template_file_path) as template:
-        fsm = textfsm.TextFSM(template)
-        dict_out['hostname'] = hostname
-        dict_out['users'] = dict()
-        for user in fsm.ParseText(dict_users):
-            temp_dict = dict(zip(fsm.header, user))
-            username = temp_dict.pop('username')
-            dict_out['users'].update(dict({username: temp_dict}))
-        result = create_info_tuple(dict_out)
+    fsm = get_fsm(template_file_path)
+    dict_out['hostname'] = hostname
+    dict_out['users'] = dict()
+    for user in fsm.ParseText(dict_users):
+        temp_dict = dict(zip(fsm.header, user))
+        username = temp_dict.pop('username')
+        dict_out['users'].update(dict({username: temp_dict}))
+    result = create_info_record(UsersInfo, dict_out)
     return result
 
 
+@core_metrics.timed('task')
+def subtask_get_info(task):
+    """
+    Host task for get SRX version
+    Output - object, present JUN device
+    """
+    logger = logging.getLogger(__name__)
+    core_metrics.get_connection(task.host, 'netmiko', task.nornir.config)
+    with core_metrics.measure(task.host.name, 'command', 'show version'):
+        out = task.run(task=netmiko_send_command,
+                       command_string="show version", use_textfsm=True)
+    logger.debug(f'Fill JunOS properties {task.host.name}')
+    return parse_info(task.host.name, out.result)
+
+
 def task_get_info(task):
     """
     Function for get SRX version
@@ -74,23 +98,33 @@ def task_get_info(task):
     logger = logging.getLogger(__name__)
     logger.debug('Get JunOS firmware version')
     result = list()
-    out = task.run(task=netmiko_send_command,
-                   command_string="show version", use_textfsm=True)
-#    print_result(out)
+    out = task.run(task=subtask_get_info)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning(f'Failed task on device {host}')
             task.inventory.hosts[host]['error'] = True
     for host, res in out.items():
         if not res.failed:
-            logger.debug(f'Fill JunOS properties {host}')
             task.inventory.hosts[host]['error'] = False
-#            with open('output/qtech_show_version.txt','w+') as f:
-#                f.write(r.result)
-            result.append(parse_info(host, res.result))
+            result.append(res.result)
     return result
 
 
+@core_metrics.timed('task')
+def subtask_get_users(task):
+    """
+    Host task for get user from JUN
+    Output - object, present JUN device with users
+    """
+    logger = logging.getLogger(__name__)
+    core_metrics.get_connection(task.host, 'netmiko', task.nornir.config)
+    with core_metrics.measure(task.host.name, 'command', 'show configuration system login'):
+        out = task.run(task=netmiko_send_command,
+                       command_string="show configuration system login")
+    logger.debug('Fill JUNOS users properties from device {}'.format(task.host.name))
+    return parse_users(task.host.name, out.result)
+
+
 def task_get_users(task):
     """
     Function for get user from JUN
@@ -99,19 +133,15 @@ def task_get_users(task):
     logger = logging.getLogger(__name__)
     logger.debug('Get JUNOS users info')
     result = list()
-    out = task.run(task=netmiko_send_command,
-                   command_string="show configuration system login")
+    out = task.run(task=subtask_get_users)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning('Failed task on device {}'.format(task.inventory.hosts[host].name))
             task.inventory.hosts[host]['error'] = True
     for host, res in out.items():
         if not res.failed:
-            logger.debug('Fill JUNOS users properties from device {}'.format(task.inventory.hosts[host].name))
             task.inventory.hosts[host]['error'] = False
-#            with open('output/junos_show_conf_system_login.txt','w+') as f:
-#                f.write(r.result)
-            result.append(parse_users(host, res.result))
+            result.append(res.result)
     return result
 
 
@@ -144,6 +174,21 @@ def task_create_user(task: Task, username, password, userclass='super-user', cry
     return result
 
 
+def subtask_commit(task):
+    """
+    Host task for commit config and quit from config mode
+    netmiko_send_config exit from config mode, so enter it before commit
+    End of commit detected by prompt or 'commit complete'
+    """
+    connection = core_metrics.get_connection(task.host, 'netmiko', task.nornir.config)
+    connection.config_mode()
+    out = task.run(task=netmiko_send_command_prompt, command_string='commit and-quit',
+                   trailer_patterns=[JUNOS_COMMIT_TRAILER], strip_prompt=False)
+    if 'commit complete' not in out.result:
+        raise ValueError(f'Commit failed on device {task.host.name}: {out.result}')
+    return out.result
+
+
 def task_commit(task):
     """
     Function for commit config for JUN
@@ -152,7 +197,7 @@ def task_commit(task):
     logger = logging.getLogger(__name__)
     logger.debug('Run commit for JUNOS')
     result = {'completed': [], 'failed': []}
-    out = task.run(task=netmiko_commit, and_quit=True, delay_factor=4)
+    out = task.run(task=subtask_commit)
     print_result(out)
     if out.failed:
         for host in out.failed_hosts.keys():
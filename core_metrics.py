@@ -0,0 +1,291 @@
+'''
+Module for per host and per phase metrics of run: duration and bytes of connect, command,
+parse, transfer and store phases
+Metrics collected in memory and exported at end of script:
+    <metrics_dir>/<script>.prom - prometheus textfile (for node_exporter textfile collector)
+    <metrics_dir>/<script>.jsonl - json line per record, appended every run
+Summary p50/p95/max per platform and phase logged and saved in both files
+Connect of netmiko (and napalm drivers over netmiko) split to phases tcp_connect and ssh_auth:
+socket opened before login and passed to netmiko, ssh_auth include session preparation of netmiko
+'''
+import contextlib
+import functools
+import json
+import logging
+import math
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from time import gmtime, strftime
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+from nornir.core.task import Task
+
+import core_normalize
+
+METRICS_DIR = 'metrics'
+METRIC_PREFIX = 'home_net'
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H%M%S"
+QUANTILES = (0.5, 0.95)
+# napalm drivers work over netmiko, socket for them opened before login as for netmiko
+NAPALM_NETMIKO_PLATFORMS = ('ios',)
+# tcp connect timeout if conn_timeout not set in extras of connection, as in netmiko
+CONNECT_TIMEOUT = 10
+
+_RECORDS = list()
+_HOST_PLATFORM = dict()
+_LOCK = threading.Lock()
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def set_host_platform(host, platform):
+    '''
+    Save platform of host for records without platform
+    '''
+    with _LOCK:
+        _HOST_PLATFORM[host] = platform
+
+
+def record(host, phase, seconds, nbytes=0, task='', platform=None):
+    '''
+    Add record of phase of host
+    '''
+    with _LOCK:
+        _RECORDS.append({'host': host,
+                         'platform': platform or _HOST_PLATFORM.get(host, core_normalize.PLATFORM_DEFAULT),
+                         'task': task, 'phase': phase, 'seconds': seconds, 'bytes': nbytes})
+
+
+@contextlib.contextmanager
+def measure(host, phase, task='', platform=None):
+    '''
+    Context manager for record duration of phase
+    Yield dict, count of bytes of phase can be set in key 'bytes'
+    '''
+    counter = {'bytes': 0}
+    start = time.perf_counter()
+    try:
+        yield counter
+    finally:
+        record(host, phase, time.perf_counter() - start, counter['bytes'], task, platform)
+
+
+def timed(phase, platform=None):
+    '''
+    Decorator for record duration of function as phase
+    First argument of function - nornir Task (platform from host groups) or name of host
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(first, *args, **kwargs):
+            host_platform = platform
+            if isinstance(first, Task):
+                host = first.host.name
+                host_platform = core_normalize.get_host_platform(first.host)
+                set_host_platform(host, host_platform)
+            else:
+                host = first
+            with measure(host, phase, func.__name__, host_platform):
+                return func(first, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def open_connection_split(host, connection, config, params):
+    '''
+    Open netmiko connection of nornir host over own socket, tcp connect and ssh login recorded as phases
+    tcp_connect and ssh_auth
+    '''
+    extras = dict(params.extras or dict())
+    with measure(host.name, 'tcp_connect', connection):
+        sock = socket.create_connection((params.hostname, params.port or 22),
+                                        extras.get('conn_timeout') or CONNECT_TIMEOUT)
+    if connection == 'napalm':
+        extras['optional_args'] = dict(extras.get('optional_args') or dict(), sock=sock)
+    else:
+        extras['sock'] = sock
+    try:
+        with measure(host.name, 'ssh_auth', connection):
+            host.open_connection(connection, config, extras=extras)
+    except Exception:
+        sock.close()
+        raise
+
+
+def get_connection(host, connection, config):
+    '''
+    Return connection of nornir host, time of open new connection recorded as phase connect
+    Netmiko connections also split to phases tcp_connect and ssh_auth, other connections (napalm
+    over netconf or api) recorded only as connect
+    Platform of host saved for next records of host
+    '''
+    if connection in host.connections:
+        return host.get_connection(connection, config)
+    set_host_platform(host.name, core_normalize.get_host_platform(host))
+    params = host.get_connection_parameters(connection)
+    with measure(host.name, 'connect', connection):
+        if connection == 'netmiko' or (connection == 'napalm' and params.platform in NAPALM_NETMIKO_PLATFORMS):
+            open_connection_split(host, connection, config, params)
+        return host.get_connection(connection, config)
+
+
+def get_records():
+    '''
+    Return copy of records
+    '''
+    with _LOCK:
+        return list(_RECORDS)
+
+
+def clear():
+    '''
+    Remove all records
+    '''
+    with _LOCK:
+        _RECORDS.clear()
+        _HOST_PLATFORM.clear()
+
+
+def percentile(values, quantile):
+    '''
+    Return nearest-rank percentile of values
+    '''
+    values = sorted(values)
+    return values[max(0, math.ceil(quantile * len(values)) - 1)]
+
+
+def get_summary(records=None):
+    '''
+    Return dict {(platform, phase): {count, p50, p95, max, sum, bytes}}
+    Values - per host sum of phase durations
+    '''
+    records = get_records() if records is None else records
+    per_host = dict()
+    for rec in records:
+        key = (rec['platform'], rec['phase'], rec['host'])
+        seconds, nbytes = per_host.get(key, (0.0, 0))
+        per_host[key] = (seconds + rec['seconds'], nbytes + rec['bytes'])
+    groups = dict()
+    for (platform, phase, _), values in per_host.items():
+        groups.setdefault((platform, phase), list()).append(values)
+    result = dict()
+    for key, values in sorted(groups.items()):
+        seconds = [value[0] for value in values]
+        result[key] = {'count': len(values), 'p50': percentile(seconds, 0.5), 'p95': percentile(seconds, 0.95),
+                       'max': max(seconds), 'sum': sum(seconds), 'bytes': sum(value[1] for value in values)}
+    return result
+
+
+def format_labels(**labels):
+    '''
+    Return labels in prometheus format
+    '''
+    values = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                      for name, value in labels.items())
+    return '{' + values + '}'
+
+
+def write_prometheus(path, script, records=None):
+    '''
+    Write metrics of records to prometheus textfile, file replaced atomically
+    '''
+    records = get_records() if records is None else records
+    per_host = dict()
+    for rec in records:
+        key = (rec['host'], rec['platform'], rec['task'], rec['phase'])
+        seconds, nbytes = per_host.get(key, (0.0, 0))
+        per_host[key] = (seconds + rec['seconds'], nbytes + rec['bytes'])
+    lines = [f'# HELP {METRIC_PREFIX}_phase_seconds Duration of phase of task on host',
+             f'# TYPE {METRIC_PREFIX}_phase_seconds gauge']
+    lines.extend(f'{METRIC_PREFIX}_phase_seconds'
+                 f'{format_labels(script=script, host=host, platform=platform, task=task, phase=phase)} {seconds:.6f}'
+                 for (host, platform, task, phase), (seconds, _) in sorted(per_host.items()))
+    lines.extend([f'# HELP {METRIC_PREFIX}_phase_bytes Bytes of phase of task on host',
+                  f'# TYPE {METRIC_PREFIX}_phase_bytes gauge'])
+    lines.extend(f'{METRIC_PREFIX}_phase_bytes'
+                 f'{format_labels(script=script, host=host, platform=platform, task=task, phase=phase)} {nbytes}'
+                 for (host, platform, task, phase), (_, nbytes) in sorted(per_host.items()) if nbytes)
+    lines.extend([f'# HELP {METRIC_PREFIX}_platform_phase_seconds Per host duration of phase by platform',
+                  f'# TYPE {METRIC_PREFIX}_platform_phase_seconds summary'])
+    summaries = get_summary(records)
+    for (platform, phase), summary in summaries.items():
+        for quantile in QUANTILES:
+            labels = format_labels(script=script, platform=platform, phase=phase, quantile=quantile)
+            lines.append(f"{METRIC_PREFIX}_platform_phase_seconds{labels} {summary[f'p{int(quantile*100)}']:.6f}")
+        labels = format_labels(script=script, platform=platform, phase=phase)
+        lines.append(f"{METRIC_PREFIX}_platform_phase_seconds_sum{labels} {summary['sum']:.6f}")
+        lines.append(f"{METRIC_PREFIX}_platform_phase_seconds_count{labels} {summary['count']}")
+    lines.extend([f'# HELP {METRIC_PREFIX}_platform_phase_max_seconds Max per host duration of phase by platform',
+                  f'# TYPE {METRIC_PREFIX}_platform_phase_max_seconds gauge'])
+    lines.extend(f'{METRIC_PREFIX}_platform_phase_max_seconds'
+                 f"{format_labels(script=script, platform=platform, phase=phase)} {summary['max']:.6f}"
+                 for (platform, phase), summary in summaries.items())
+    lines.extend([f'# HELP {METRIC_PREFIX}_last_run_timestamp_seconds Time of end of run',
+                  f'# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge',
+                  f'{METRIC_PREFIX}_last_run_timestamp_seconds{format_labels(script=script)} {time.time():.0f}'])
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+    with os.fdopen(fd, 'w') as prom_file:
+        prom_file.write('\n'.join(lines) + '\n')
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+
+
+def write_jsonl(path, script, records=None):
+    '''
+    Append records and summary of run to json lines file
+    '''
+    records = get_records() if records is None else records
+    run = strftime(TIMESTAMP_FORMAT, gmtime())
+    with open(path, 'a') as jsonl_file:
+        for rec in records:
+            jsonl_file.write(json.dumps(dict(rec, script=script, run=run)) + '\n')
+        for (platform, phase), summary in get_summary(records).items():
+            jsonl_file.write(json.dumps(dict(summary, script=script, run=run, platform=platform, phase=phase,
+                                             type='summary')) + '\n')
+
+
+def export(script, metrics_dir=METRICS_DIR):
+    '''
+    Write metrics of run to prometheus textfile and json lines, log summary
+    Return summary
+    '''
+    logger = logging.getLogger(__name__)
+    os.makedirs(metrics_dir, exist_ok=True)
+    records = get_records()
+    write_prometheus(os.path.join(metrics_dir, f'{script}.prom'), script, records)
+    write_jsonl(os.path.join(metrics_dir, f'{script}.jsonl'), script, records)
+    result = get_summary(records)
+    for (platform, phase), summary in result.items():
+        logger.info(f"{platform} {phase}: hosts {summary['count']}, p50 {summary['p50']:.3f}s, "
+                    f"p95 {summary['p95']:.3f}s, max {summary['max']:.3f}s, bytes {summary['bytes']}")
+    return result
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+'''
+Module for normalize device configs: drop volatile lines (timestamps, comments)
+Used for hash, dedupe, config store and change detection
+'''
+import hashlib
+import itertools
+import logging
+import re
+import sys
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+# platforms named as groups in inventory
+PLATFORM_ROUTEROS = 'routeros'
+PLATFORM_QTECH = 'qtech'
+PLATFORM_IOS = 'ios'
+PLATFORM_JUNOS = 'jun_srx'
+PLATFORM_DEFAULT = 'default'
+
+# volatile lines for platforms
+CISCO_LIKE_PATTERNS = [r'!',
+                       r'Building configuration',
+                       r'Current configuration\s*:',
+                       r'ntp clock-period']
+map_platform_patterns = {
+    # example: # nov/13/2020 22:06:53 by RouterOS 6.47.1
+    PLATFORM_ROUTEROS: [r'#'],
+    PLATFORM_QTECH: CISCO_LIKE_PATTERNS,
+    PLATFORM_IOS: CISCO_LIKE_PATTERNS,
+    # example: ## Last commit: 2020-11-13 22:06:53 MSK by sas
+    PLATFORM_JUNOS: [r'## Last (commit|changed):',
+                     r'## Image name:'],
+    PLATFORM_DEFAULT: [r'#'],
+}
+map_platform_regex = {platform: re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+                      for platform, patterns in map_platform_patterns.items()}
+
+# count of first lines for detect platform by content
+DETECT_LINES = 20
+# patterns for detect platform by content, check in order
+detect_patterns = [
+    (PLATFORM_ROUTEROS, re.compile(r'^# .* by RouterOS')),
+    (PLATFORM_JUNOS, re.compile(r'^## Last (commit|changed):')),
+    (PLATFORM_IOS, re.compile(r'^(Building configuration|Current configuration|!)')),
+]
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def get_host_platform(host):
+    '''
+    Return platform of nornir host by inventory groups, used also for select platform task
+    '''
+    for group in host.groups:
+        if group.name in map_platform_regex:
+            return group.name
+    return PLATFORM_DEFAULT
+
+
+def detect_platform(lines):
+    '''
+    Detect platform by first lines of config
+    '''
+    for line in lines[:DETECT_LINES]:
+        for platform, regex in detect_patterns:
+            if regex.match(line):
+                return platform
+    return PLATFORM_DEFAULT
+
+
+def normalize_lines(lines, platform=None):
+    '''
+    Generator of normalized lines: without volatile lines, empty lines and end spaces
+    If platform not set - detect by first lines
+    '''
+    lines = iter(lines)
+    if platform is None:
+        head = list(itertools.islice(lines, DETECT_LINES))
+        platform = detect_platform(head)
+        lines = itertools.chain(head, lines)
+    volatile = map_platform_regex.get(platform, map_platform_regex[PLATFORM_DEFAULT])
+    for line in lines:
+        line = line.rstrip()
+        if line and not volatile.match(line):
+            yield line + '\n'
+
+
+def normalize_text(text, platform=None):
+    '''
+    Return normalized config text
+    '''
+    return ''.join(normalize_lines(text.splitlines(), platform))
+
+
+def hash_lines(lines, platform=None, limit=None):
+    '''
+    Calc md5 hash of normalized lines
+    limit - calc hash only for first limit bytes of normalized data
+    '''
+    md5 = hashlib.md5()
+    size = 0
+    for line in normalize_lines(lines, platform):
+        data = line.encode('utf-8')
+        md5.update(data)
+        size += len(data)
+        if limit and size >= limit:
+            break
+    return md5.hexdigest()
+
+
+def hash_text(text, platform=None):
+    '''
+    Calc md5 hash of normalized config text
+    '''
+    return hash_lines(text.splitlines(), platform)
+
+
+def hash_file(filename, platform=None, limit=None):
+    '''
+    Calc md5 hash of normalized config file in one pass
+    '''
+    with open(filename, 'r', errors='replace') as config_file:
+        return hash_lines(config_file, platform, limit)
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
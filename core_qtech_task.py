@@ -4,17 +4,27 @@ Module tasks and functions for Qtech devices
 import logging
 import sys
 assert sys.version_info.major == 3, 'For script run please use python3'
-import textfsm
-from core_task import create_info_tuple
-from time import gmtime, strftime
+from core_task import create_record_class
+from core_task import create_info_record
+from core_template import get_fsm
+from core_completion import netmiko_send_command_prompt
+from core_completion import CISCO_CONFIG_TRAILER
+import core_config_store
+import core_normalize
+import core_metrics
 
 
-from nornir_netmiko.tasks import netmiko_send_command
 from nornir_utils.plugins.functions import print_result
 from nornir_netmiko.tasks import netmiko_send_config
 from nornir_netmiko.tasks import netmiko_save_config
 from nornir.core.task import Task
 
+# records of device facts, fields - values of template and added fields in order of parse
+VersionInfo = create_record_class('VersionInfo', (
+    'model', 'cpumac', 'vlanmac', 'version', 'bootrom', 'hwversion', 'serial',
+    'uptime_w', 'uptime_d', 'uptime_h', 'uptime_m', 'hostname'))
+UsersInfo = create_record_class('UsersInfo', ('hostname', 'users'))
+
 
 
 
@@ -32,38 +42,49 @@ def configure_logging():
     logger.addHandler(console)
 
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_QTECH)
 def parse_info(hostname, dict_prop):
     '''
     Create object from hostname, dict_prop
     '''
     result = None
-    with open('templates/qtech_show_version.template') as template:
-        fsm = textfsm.TextFSM(template)
-        dict_out = dict(zip(fsm.header, fsm.ParseText(dict_prop)[0]))
-        dict_out['hostname'] = hostname
-#        result = DeviceData(**dict_out)
-        result = create_info_tuple(dict_out)
+    fsm = get_fsm('templates/qtech_show_version.template')
+    dict_out = dict(zip(fsm.header, fsm.ParseText(dict_prop)[0]))
+    dict_out['hostname'] = hostname
+    result = create_info_record(VersionInfo, dict_out)
     return result
 
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_QTECH)
 def parse_users(hostname, dict_users):
     '''
     Create object from hostname, users dict
     '''
     result = None
     dict_out = dict()
-    with open('templates/qtech_show_startup_include_username.template') as template:
-        fsm = textfsm.TextFSM(template)
-        dict_out['hostname'] = hostname
-        dict_out['users'] = dict()
-        for user in fsm.ParseText(dict_users):
-            temp_dict = dict(zip(fsm.header, user))
-            username = temp_dict.pop('username')
-            dict_out['users'].update(dict({username: temp_dict}))
-        result = create_info_tuple(dict_out)
+    fsm = get_fsm('templates/qtech_show_startup_include_username.template')
+    dict_out['hostname'] = hostname
+    dict_out['users'] = dict()
+    for user in fsm.ParseText(dict_users):
+        temp_dict = dict(zip(fsm.header, user))
+        username = temp_dict.pop('username')
+        dict_out['users'].update(dict({username: temp_dict}))
+    result = create_info_record(UsersInfo, dict_out)
     return result
 
 
+@core_metrics.timed('task')
+def subtask_get_info(task: Task):
+    """
+    Host task for get Qtech firmware version
+    Output - object, present QTech device
+    """
+    logger = logging.getLogger(__name__)
+    out = task.run(task=netmiko_send_command_prompt, command_string="show version")
+    logger.debug('Fill QTech firmware properties {}'.format(task.host.name))
+    return parse_info(task.host.name, out.result)
+
+
 def task_get_info(task: Task):
     """
     Function for get Qtech firmware version
@@ -72,8 +93,7 @@ def task_get_info(task: Task):
     logger = logging.getLogger(__name__)
     logger.debug('Get Qtech firmware version')
     result = list()
-    out = task.run(task=netmiko_send_command, command_string="show version")
-#    print_result(out)
+    out = task.run(task=subtask_get_info)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning('Failed task on device {}'.format(
@@ -81,15 +101,24 @@ def task_get_info(task: Task):
             task.inventory.hosts[host]['error'] = True
     for host, res in out.items():
         if not res.failed:
-            logger.debug('Fill QTech firmware properties {}'.format(
-                task.inventory.hosts[host].name))
             task.inventory.hosts[host]['error'] = False
-#            with open('output/qtech_show_version.txt','w+') as f:
-#                f.write(r.result)
-            result.append(parse_info(host, res.result))
+            result.append(res.result)
     return result
 
 
+@core_metrics.timed('task')
+def subtask_get_users(task: Task, configmode='startup'):
+    """
+    Host task for get user from Qtech
+    Output - object, present Qtech device with users
+    """
+    logger = logging.getLogger(__name__)
+    out = task.run(task=netmiko_send_command_prompt,
+                   command_string="show {} | include username".format(configmode))
+    logger.debug('Fill Qtech users properties from device {}'.format(task.host.name))
+    return parse_users(task.host.name, out.result)
+
+
 def task_get_users(task: Task, configmode='startup'):
     """
     Function for get user from Qtech
@@ -98,8 +127,7 @@ def task_get_users(task: Task, configmode='startup'):
     logger = logging.getLogger(__name__)
     logger.debug('Get Qtech users info')
     result = list()
-    out = task.run(task=netmiko_send_command,
-                   command_string="show {} | include username".format(configmode))
+    out = task.run(task=subtask_get_users, configmode=configmode)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning('Failed task on device {}'.format(
@@ -107,12 +135,8 @@ def task_get_users(task: Task, configmode='startup'):
             task.inventory.hosts[host]['error'] = True
     for host, res in out.items():
         if not res.failed:
-            logger.debug('Fill Qtech users properties from device {}'.format(
-                task.inventory.hosts[host].name))
             task.inventory.hosts[host]['error'] = False
-#            with open('output/qtech_user_export_verbose_compact.txt','w+') as f:
-#                f.write(r.result)
-            result.append(parse_users(host, res.result))
+            result.append(res.result)
     return result
 
 
@@ -172,12 +196,14 @@ def task_save_to_startup(task: Task):
 def task_get_config(task: Task, output_dir):
     '''
     Get startup compact
+    Config saved to content-addressed store in output_dir
     '''
     SHOW_RUN_COMMAND = 'show run'
     logger = logging.getLogger(__name__)
     logger.debug('Get startup config from Qtech devices')
     logger.debug('Send command - {}'.format(SHOW_RUN_COMMAND))
-    out = task.run(task=netmiko_send_command, command_string=SHOW_RUN_COMMAND,use_timing=True, delay_factor=5)
+    out = task.run(task=netmiko_send_command_prompt, command_string=SHOW_RUN_COMMAND,
+                   trailer_patterns=[CISCO_CONFIG_TRAILER])
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning(f"Device {host} config not local export")
@@ -185,10 +211,10 @@ def task_get_config(task: Task, output_dir):
     else:
         for host, res in out.items():
             if not res.failed:
-                device_config_file = output_dir+'//'+host+'_' + strftime("%Y-%m-%d_%H%M%S", gmtime())+'.cfg'
                 logger.debug('Save config on device {}'.format(task.inventory.hosts[host].name))
-                with open(device_config_file,'w') as config_file:
-                    config_file.writelines(res.result)
+                with core_metrics.measure(host, 'store', core_config_store.KIND_CONFIG) as counter:
+                    counter['bytes'] = len(res.result)
+                    core_config_store.store_config(output_dir, host, res.result, core_normalize.PLATFORM_QTECH)
 
 def main():
     '''
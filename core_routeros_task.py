@@ -2,26 +2,55 @@
 Module tasks and functions for RouterOS devices
 '''
 
+import json
 import logging
 import os
 import sys
 assert sys.version_info.major == 3, 'For script run please use python3'
 import re
-from time import gmtime, strftime
+import tempfile
+import threading
+from time import strftime
 import datetime
-import textfsm
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
+from packaging import version as pkg_version
 from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 from core_task import scp_get_file
-from core_task import create_info_tuple
-from core_task import get_filehash_md5_bin
+from core_task import get_host_transport
+from core_task import create_record_class
+from core_task import create_info_record
+from core_task import get_filehash_md5_cached
+from core_task import download_file
+from core_template import get_fsm
+from core_completion import netmiko_send_command_prompt
+import core_config_store
+import core_chunk_store
+import core_normalize
+import core_metrics
 
-from nornir_netmiko.tasks import netmiko_send_command
 from nornir_utils.plugins.functions import print_result
 from nornir_netmiko.tasks import netmiko_send_config
 from nornir.core.task import Task
 
+# default limit of concurrent file transfers from devices
+MAX_TRANSFERS = 5
+DOWNLOAD_URL = 'https://download.mikrotik.com/routeros'
+CHECKSUM_CACHE = 'routeros_package/checksum_cache.json'
+# version in package filenames: all_packages-mipsbe-6.47.7.zip, dude-6.47.7-mipsbe.npk
+PACKAGE_VERSION_REGEX = r'-(\d+\.\d+(?:\.\d+)?)(?:-\w+)?\.(?:zip|npk)'
+# records of device facts, fields - values of template and added fields in order of parse
+ResourceInfo = create_record_class('ResourceInfo', (
+    'uptime', 'version', 'freememory', 'totalmemory', 'cpu', 'cpucount', 'cpufreq', 'cpuloadprc',
+    'freehddspace', 'arch', 'model', 'platform', 'hostname', 'address'))
+RouterboardInfo = create_record_class('RouterboardInfo', (
+    'routerboard', 'boardname', 'model', 'serialnumber', 'firmwaretype', 'factoryfirmware',
+    'currentfirmware', 'upgradefirmware', 'hostname', 'address'))
+UsersInfo = create_record_class('UsersInfo', ('hostname', 'users'))
+PackagesInfo = create_record_class('PackagesInfo', ('hostname', 'packages'))
+
 
 def configure_logging():
     '''
@@ -36,9 +65,9 @@ def configure_logging():
     console.setFormatter(formatter)
     logger.addHandler(console)
 
-def get_checksum(url, version):
+def parse_checksum(html_text, version):
     '''
-    Function for parse download page
+    Parse only block md5_<version> of download page
     Return empty dict or dict with filename:hash
     '''
     result = dict()
@@ -46,27 +75,88 @@ def get_checksum(url, version):
     # example string, routeros-6.46.6-npk: e1a895225d4292ede73bc01a4cbcc8e6
     regex = r".*-\d\.\d+\.\d+\.\w{3}: [a-f0-9]{32}$"
     logger = logging.getLogger(__name__)
+    block_id = f"md5_{version.replace('.','_')}"
+    logger.debug(f"Get HTML block with id={block_id}")
+    soap = BeautifulSoup(html_text, "html.parser", parse_only=SoupStrainer(id=block_id))
+    block_md5 = soap.find(id=block_id)
+    if block_md5 is None:
+        logger.warning(f'Block {block_id} not found on download page')
+        return result
+    md5_list = block_md5.find_all(string=re.compile(regex))
+    result = {md5_file.split(':')[0].strip():md5_file.split(':')[1].strip() for md5_file in md5_list}
+    return result
+
+def load_checksum_cache(cache_file):
+    '''
+    Load cache of download page, return empty dict if cache not exists
+    '''
+    if not os.path.isfile(cache_file):
+        return dict()
+    with open(cache_file) as cache:
+        return json.load(cache)
+
+def save_checksum_cache(cache_file, cache_data):
+    '''
+    Save cache of download page
+    '''
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    with open(cache_file + '.tmp', 'w') as cache:
+        json.dump(cache_data, cache, indent=1)
+    os.replace(cache_file + '.tmp', cache_file)
+
+def get_checksum(url, version, cache_file=CHECKSUM_CACHE, session=None):
+    '''
+    Function for parse download page
+    Result of parse saved in cache_file, page request with ETag/If-Modified-Since
+    Return empty dict or dict with filename:hash
+    '''
+    result = dict()
+    logger = logging.getLogger(__name__)
+    http = session or requests
+    cache_data = load_checksum_cache(cache_file)
+    cache_url = cache_data.setdefault(url, {'etag': None, 'last_modified': None, 'versions': {}})
+    cached = cache_url['versions'].get(version)
+    headers = dict()
+    if cached:
+        if cache_url['etag']:
+            headers['If-None-Match'] = cache_url['etag']
+        if cache_url['last_modified']:
+            headers['If-Modified-Since'] = cache_url['last_modified']
     logger.debug(f'Try access to URL {url}')
-    web_req = requests.get(url)
+    try:
+        web_req = http.get(url, headers=headers)
+    except requests.RequestException as error:
+        logger.error(f'Error access to URL {url}: {error}')
+        return cached or result
     logger.debug('HTTP code {}'.format(web_req.status_code))
-    if web_req.status_code == 200:
+    if web_req.status_code == 304:
+        logger.debug('Page not modified, use cache')
+        result = cached
+    elif web_req.status_code == 200:
         logger.debug('Load HTML context')
-        html_text = web_req.content
-        soap = BeautifulSoup(html_text, "html.parser")
-        logger.debug(f"Get HTML block with id=md5_{version.replace('.','_')}'")
-        block_md5 = soap.find(id=f"md5_{version.replace('.','_')}")
-        md5_list = block_md5.find_all(string=re.compile(regex))
-        result = {md5_file.split(':')[0].strip():md5_file.split(':')[1].strip() for md5_file in md5_list}
+        result = parse_checksum(web_req.text, version)
+        cache_url['etag'] = web_req.headers.get('ETag')
+        cache_url['last_modified'] = web_req.headers.get('Last-Modified')
+        if result:
+            cache_url['versions'][version] = result
+        save_checksum_cache(cache_file, cache_data)
+    elif cached:
+        result = cached
     return result
 
-def download_packages(version, arch, download_dir='./routeros_package', hash_dict=None):
+def download_packages(version, arch, download_dir='./routeros_package', hash_dict=None, base_url=DOWNLOAD_URL,
+                      session=None):
     '''
-    Function to download and unzip packages from internet
+    Function to download packages from internet
+    Return path to downloaded file, False - if file already exists or download failed
     '''
     result = False
     need_download = True
     logger = logging.getLogger(__name__)
-    url = f'https://download.mikrotik.com/routeros/{version}/all_packages-{arch}-{version}.zip'
+    hash_dict = hash_dict or dict()
+    url = f'{base_url}/{version}/all_packages-{arch}-{version}.zip'
     logger.debug(f'Check {download_dir} exists')
     if not os.path.isdir(download_dir):
         logger.info(f'Creating dir {download_dir}')
@@ -76,7 +166,7 @@ def download_packages(version, arch, download_dir='./routeros_package', hash_dic
     logger.debug(f'Check file exist {dest_full_path}')
     if os.path.isfile(dest_full_path):
         logger.info(f'File {dest_full_path} exist, verify md5 sum')
-        if get_filehash_md5_bin(dest_full_path) != hash_dict.get(dest_file):
+        if get_filehash_md5_cached(dest_full_path) != hash_dict.get(dest_file):
             logger.info('Hash is not equal. File will be donwload')
             need_download = True
         else:
@@ -85,82 +175,133 @@ def download_packages(version, arch, download_dir='./routeros_package', hash_dic
     if need_download:
         logger.debug(f'Path for download {dest_full_path}')
         logger.info(f'Send request {url}')
-        web_req = requests.get(url)
-        logger.debug('HTTP code {}'.format(web_req.status_code))
-        if web_req.status_code == 200:
-            logger.debug(f'Save to file {dest_full_path}')
-            with open(dest_full_path, 'wb') as package_file:
-                package_file.write(web_req.content)
-        result = dest_full_path
+        if download_file(url, dest_full_path, expected_md5=hash_dict.get(dest_file), session=session):
+            result = dest_full_path
+    return result
+
+def prepare_packages(version, archs, download_dir='./routeros_package', hash_dict=None, base_url=DOWNLOAD_URL,
+                     max_workers=4):
+    '''
+    Download packages one time for each arch, archs fetch concurrently
+    over one HTTP session
+    Return dict {(version, arch): path to zip or False}
+    '''
+    logger = logging.getLogger(__name__)
+    archs = sorted(set(archs))
+    logger.info(f'Prepare packages {version} for arch {archs}')
+    if not os.path.isdir(download_dir):
+        logger.info(f'Creating dir {download_dir}')
+        os.mkdir(download_dir)
+
+    def fetch(arch):
+        download_packages(version, arch, download_dir=download_dir, hash_dict=hash_dict,
+                          base_url=base_url, session=session)
+        zip_path = os.path.join(download_dir, f'all_packages-{arch}-{version}.zip')
+        return zip_path if os.path.isfile(zip_path) else False
+
+    with requests.Session() as session:
+        with ThreadPoolExecutor(max_workers) as pool:
+            result = {(version, arch): zip_path for arch, zip_path in zip(archs, pool.map(fetch, archs))}
+    return result
+
+def evict_packages(download_dir='./routeros_package', keep_count=2, keep_versions=()):
+    '''
+    Remove files of old versions from download_dir
+    Keep keep_count newest versions and all versions from keep_versions
+    Return list of removed files
+    '''
+    result = list()
+    logger = logging.getLogger(__name__)
+    files_version = dict()
+    for filename in os.listdir(download_dir):
+        match = re.search(PACKAGE_VERSION_REGEX, filename)
+        if match:
+            files_version[filename] = match.group(1)
+    versions = sorted(set(files_version.values()), key=pkg_version.parse, reverse=True)
+    keep = set(versions[:keep_count]) | set(keep_versions)
+    for filename, file_version in files_version.items():
+        if file_version not in keep:
+            logger.info(f'Remove old package file {filename}')
+            os.unlink(os.path.join(download_dir, filename))
+            result.append(filename)
     return result
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_ROUTEROS)
 def parse_info(hostname, address, dict_prop):
     '''
     Create object from hostname, dict_prop
     '''
     template_file_path = 'templates/routeros_system_resource_print.template'
     result = None
-    with open(template_file_path) as template:
-        fsm = textfsm.TextFSM(template)
-#        print(fsm.header)
-#        print(fsm.ParseText(out)[0])
-        dict_out = dict(zip(fsm.header, fsm.ParseText(dict_prop)[0]))
-        dict_out['hostname'] = hostname
-        dict_out['address'] = address
-#        result = DeviceData(**dict_out)
-        result = create_info_tuple(dict_out)
+    fsm = get_fsm(template_file_path)
+    dict_out = dict(zip(fsm.header, fsm.ParseText(dict_prop)[0]))
+    dict_out['hostname'] = hostname
+    dict_out['address'] = address
+    result = create_info_record(ResourceInfo, dict_out)
     return result
 
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_ROUTEROS)
 def parse_routerboard(hostname, address, dict_prop):
     '''
     Create object from routerboard output
     '''
-    template_file_path = 'templates/routeros_system_routerboard.template' 
+    template_file_path = 'templates/routeros_system_routerboard.template'
     result = None
-    with open(template_file_path) as template:
-        fsm = textfsm.TextFSM(template)
-        dict_out = dict(zip(fsm.header, fsm.ParseText(dict_prop)[0]))
-        dict_out['hostname'] = hostname
-        dict_out['address'] = address
-        result = create_info_tuple(dict_out)
+    fsm = get_fsm(template_file_path)
+    dict_out = dict(zip(fsm.header, fsm.ParseText(dict_prop)[0]))
+    dict_out['hostname'] = hostname
+    dict_out['address'] = address
+    result = create_info_record(RouterboardInfo, dict_out)
     return result
 
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_ROUTEROS)
 def parse_users(hostname, dict_users):
     '''
     Create object from hostname, dict_users
     '''
     result = None
     dict_out = dict()
-    with open('templates/routeros_user_export_verbose.template') as template:
-        fsm = textfsm.TextFSM(template)
-        dict_out['hostname'] = hostname
-        dict_out['users'] = dict()
-        for user in fsm.ParseText(dict_users):
-            temp_dict = dict(zip(fsm.header, user))
-            username = temp_dict.pop('username')
-            dict_out['users'].update(dict({username: temp_dict}))
-        result = create_info_tuple(dict_out)
+    fsm = get_fsm('templates/routeros_user_export_verbose.template')
+    dict_out['hostname'] = hostname
+    dict_out['users'] = dict()
+    for user in fsm.ParseText(dict_users):
+        temp_dict = dict(zip(fsm.header, user))
+        username = temp_dict.pop('username')
+        dict_out['users'].update(dict({username: temp_dict}))
+    result = create_info_record(UsersInfo, dict_out)
     return result
 
+@core_metrics.timed('parse', core_normalize.PLATFORM_ROUTEROS)
 def parse_packages(hostname, dict_props):
     '''
     Create object from hostname, dict_prop
     '''
     result = None
     dict_out = dict()
-    with open('templates/routeros_system_package.template') as template:
-        fsm = textfsm.TextFSM(template)
-        dict_out['hostname'] = hostname
-        dict_out['packages'] = dict()
-        for package in fsm.ParseText(dict_props):
-            temp_dict = dict(zip(fsm.header, package))
-            packagename = temp_dict.pop('name')
-            dict_out['packages'].update(dict({packagename: temp_dict}))
-        result = create_info_tuple(dict_out)
+    fsm = get_fsm('templates/routeros_system_package.template')
+    dict_out['hostname'] = hostname
+    dict_out['packages'] = dict()
+    for package in fsm.ParseText(dict_props):
+        temp_dict = dict(zip(fsm.header, package))
+        packagename = temp_dict.pop('name')
+        dict_out['packages'].update(dict({packagename: temp_dict}))
+    result = create_info_record(PackagesInfo, dict_out)
     return result
 
+@core_metrics.timed('task')
+def subtask_get_info(task: Task):
+    """
+    Host task for get RouterOS version
+    Output - object, present RouterOS device
+    """
+    logger = logging.getLogger(__name__)
+    out = task.run(task=netmiko_send_command_prompt,
+                   command_string="system resource print")
+    logger.debug(f'Fill RouterOS properties {task.host.name}')
+    return parse_info(task.host.name, task.host.hostname, out.result)
+
 def task_get_info(task: Task):
     """
     Function for get RouterOS version
@@ -169,19 +310,15 @@ def task_get_info(task: Task):
     logger = logging.getLogger(__name__)
     logger.debug('Get RouterOS version')
     result = list()
-    out = task.run(task=netmiko_send_command,
-                   command_string="system resource print")
+    out = task.run(task=subtask_get_info)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning(f'Failed task on device {host}')
             task.inventory.hosts[host]['error'] = True
     for host, res in out.items():
         if not res.failed:
-            logger.debug(f'Fill RouterOS properties {host}')
             task.inventory.hosts[host]['error'] = False
- #           with open('output/debug.txt','w+') as f:
- #               f.write(r.result)
-            result.append(parse_info(host, task.inventory.hosts[host].hostname, res.result))
+            result.append(res.result)
     return result
 
 def task_get_packages(task: Task):
@@ -192,7 +329,7 @@ def task_get_packages(task: Task):
     logger = logging.getLogger(__name__)
     logger.debug('Get RouterOS installed packages')
     result = list()
-    out = task.run(task=netmiko_send_command,
+    out = task.run(task=netmiko_send_command_prompt,
                    command_string="system package print terse")
     if out.failed:
         for host in out.failed_hosts.keys():
@@ -215,7 +352,7 @@ def task_get_routerboard(task: Task):
     logger = logging.getLogger(__name__)
     logger.debug('Get RouterOS firmware version')
     result = list()
-    out = task.run(task=netmiko_send_command,
+    out = task.run(task=netmiko_send_command_prompt,
                    command_string="system routerboard print")
     if out.failed:
         for host in out.failed_hosts.keys():
@@ -229,6 +366,18 @@ def task_get_routerboard(task: Task):
     return result
 
 
+@core_metrics.timed('task')
+def subtask_get_users(task: Task):
+    """
+    Host task for get user from RouterOS
+    Output - object, present RouterOS device with users
+    """
+    logger = logging.getLogger(__name__)
+    out = task.run(task=netmiko_send_command_prompt, command_string="user export verbose compact")
+    logger.debug('Fill RouterOS users properties from device {}'.format(task.host.name))
+    return parse_users(task.host.name, out.result)
+
+
 def task_get_users(task: Task):
     """
     Function for get user from RouterOS
@@ -237,68 +386,87 @@ def task_get_users(task: Task):
     logger = logging.getLogger(__name__)
     logger.debug('Get RouterOS users info')
     result = list()
-    out = task.run(task=netmiko_send_command,
-                   command_string="user export verbose compact", use_timing=True, delay_factor=8)
+    out = task.run(task=subtask_get_users)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning('Failed task on device {}'.format(task.inventory.hosts[host].name))
             task.inventory.hosts[host]['error'] = True
     for host, res in out.items():
         if not res.failed:
-            logger.debug('Fill RouterOS users properties from device {}'.format(task.inventory.hosts[host].name))
             task.inventory.hosts[host]['error'] = False
-#            with open('output/routeros_user_export_verbose_compact.txt','w+') as f:
-#                f.write(r.result)
-            result.append(parse_users(host, res.result))
+            result.append(res.result)
     return result
 
 
-def task_get_bin_config(task: Task, output_dir):
+def subtask_get_file(task: Task, command, file_on_device, output_dir, kind, transfer_slots, **kwargs):
+    '''
+    Host task - save file on device by command, download it and save to content-addressed store
+    Binary backup saved as chunks, it differ from previous backup only in few chunks
+    Download wait free slot in transfer_slots
+    Return hash of file in store
+    '''
+    logger = logging.getLogger(__name__)
+    task.run(task=netmiko_send_command_prompt, command_string=command, **kwargs)
+    fd, device_file = tempfile.mkstemp(dir=output_dir)
+    os.close(fd)
+    try:
+        with transfer_slots:
+            logger.debug(f'Download {file_on_device} from device {task.host.name}')
+            transport = get_host_transport(task.host, task.nornir.config)
+            with core_metrics.measure(task.host.name, 'transfer', file_on_device) as counter:
+                downloaded = scp_get_file(task.host.hostname, file_on_device, device_file, transport=transport)
+                counter['bytes'] = os.path.getsize(device_file)
+        if not downloaded:
+            raise IOError(f'File {file_on_device} not downloaded from device {task.host.name}')
+        with core_metrics.measure(task.host.name, 'store', kind) as counter:
+            counter['bytes'] = os.path.getsize(device_file)
+            if kind == core_config_store.KIND_BACKUP:
+                blob, _ = core_chunk_store.store_file(output_dir, task.host.name, device_file, kind=kind)
+            else:
+                blob, _ = core_config_store.store_file(output_dir, task.host.name, device_file,
+                                                       core_normalize.PLATFORM_ROUTEROS)
+    finally:
+        os.unlink(device_file)
+    return blob
+
+
+def task_get_bin_config(task: Task, output_dir, max_transfers=MAX_TRANSFERS):
     '''
     Get bin config
+    Save and download run per device, max_transfers - limit of concurrent downloads
     '''
     logger = logging.getLogger(__name__)
     logger.debug('Get binary config from RouterOS devices')
     file_on_device = 'autosave'
     logger.debug(
         'Send command - system backup save dont-encrypt=yes name={}'.format(file_on_device))
-    out = task.run(task=netmiko_send_command,
-                   command_string='system backup save dont-encrypt=yes name={}'.format(file_on_device))
+    out = task.run(task=subtask_get_file,
+                   command='system backup save dont-encrypt=yes name={}'.format(file_on_device),
+                   file_on_device='{}.backup'.format(file_on_device), output_dir=output_dir,
+                   kind=core_config_store.KIND_BACKUP, transfer_slots=threading.BoundedSemaphore(max_transfers))
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning(f"Device {host} config not local export")
             task.inventory.hosts[host]['error'] = True
-    else:
-        for host, res in out.items():
-            if not res.failed:
-                device_config_file = output_dir+'//'+host+'_' + \
-                    strftime("%Y-%m-%d_%H%M%S", gmtime())+'.backup'
-                scp_get_file(task.inventory.hosts[host].hostname, '{}.backup'.format(file_on_device), device_config_file,
-                             task.inventory.hosts[host].username, task.inventory.hosts[host].password)
 
 
-def task_get_export(task: Task, output_dir):
+def task_get_export(task: Task, output_dir, max_transfers=MAX_TRANSFERS):
     '''
     Get export compact
+    Export and download run per device, max_transfers - limit of concurrent downloads
     '''
     logger = logging.getLogger(__name__)
     logger.debug('Get export config from RouterOS devices')
     file_on_device = 'autoexport'
     logger.debug(
         'Send command - export compact file={}'.format(file_on_device))
-    out = task.run(task=netmiko_send_command, command_string='export compact file={}'.format(file_on_device),
-                   use_timing=True, delay_factor=5)
+    out = task.run(task=subtask_get_file, command='export compact file={}'.format(file_on_device),
+                   file_on_device='{}.rsc'.format(file_on_device), output_dir=output_dir,
+                   kind=core_config_store.KIND_CONFIG, transfer_slots=threading.BoundedSemaphore(max_transfers))
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning(f"Device {host} config not local export")
             task.inventory.hosts[host]['error'] = True
-    else:
-        for host, res in out.items():
-            if not res.failed:
-                device_config_file = output_dir+'//'+host+'_' + \
-                    strftime("%Y-%m-%d_%H%M%S", gmtime())+'.cfg'
-                scp_get_file(task.inventory.hosts[host].hostname, '{}.rsc'.format(file_on_device), device_config_file,
-                             task.inventory.hosts[host].username, task.inventory.hosts[host].password)
 
 
 def task_create_user(task: Task, username, password, group='full'):
@@ -312,7 +480,7 @@ def task_create_user(task: Task, username, password, group='full'):
         username, group, password)
     logger.debug(config_command)
     result = {'completed': [], 'failed': []}
-    out = task.run(task=netmiko_send_command, command_string=config_command)
+    out = task.run(task=netmiko_send_command_prompt, command_string=config_command)
     print_result(out)
     if out.failed:
         for host in out.failed_hosts.keys():
@@ -0,0 +1,165 @@
+'''
+Module with nornir runner with concurrency limits from inventory data
+Limits:
+    max_sessions (group data) - max concurrent hosts of group
+    login_rate, login_burst (host, group or defaults data) - logins per second to AAA server
+    aaa_server (host, group or defaults data) - name of AAA server, every server have own login bucket
+Login token buckets shared by runner, async tasks (core_async) and pooled ssh logins (core_task)
+Runner registered as 'limited' by init_nornir, select it in config.yaml:
+    runner:
+      plugin: limited
+      options:
+        num_workers: 100
+'''
+import collections
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+from nornir import InitNornir
+from nornir.core.plugins.runners import RunnersPluginRegister
+from nornir.core.task import AggregatedResult
+
+from core_transfer import RateLimiter
+
+DEFAULT_AAA_SERVER = 'default'
+# login token buckets of AAA servers
+_LOGIN_LIMITERS = dict()
+_LOGIN_LIMITERS_LOCK = threading.Lock()
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def get_limit_group(host):
+    '''
+    Return (group name, max_sessions) of first group of host with max_sessions, (None, None) if not set
+    '''
+    for group in host.groups:
+        if group.data.get('max_sessions'):
+            return group.name, int(group.data['max_sessions'])
+    return None, None
+
+
+def get_login_limiter(host):
+    '''
+    Return login token bucket of AAA server of host, None if login_rate not set
+    '''
+    login_rate = host.get('login_rate')
+    if not login_rate:
+        return None
+    aaa_server = host.get('aaa_server') or DEFAULT_AAA_SERVER
+    with _LOGIN_LIMITERS_LOCK:
+        if aaa_server not in _LOGIN_LIMITERS:
+            _LOGIN_LIMITERS[aaa_server] = RateLimiter(login_rate, host.get('login_burst') or 1)
+        return _LOGIN_LIMITERS[aaa_server]
+
+
+class LimitedRunner:
+    '''
+    Run task over hosts in threads, not more then max_sessions hosts of group at once
+    and with token bucket for logins of hosts without open connections
+    '''
+
+    def __init__(self, num_workers=100):
+        self.num_workers = num_workers
+        self.condition = threading.Condition()
+        self.running = dict()
+        self.total = 0
+
+    def run_host(self, task, host):
+        '''
+        Run task on host, before login wait token of AAA server
+        '''
+        logger = logging.getLogger(__name__)
+        limiter = get_login_limiter(host)
+        if limiter and not host.connections:
+            logger.debug(f'Wait login token for {host.name}')
+            limiter.consume(1)
+        return task.start(host)
+
+    def _next_host(self, pending):
+        '''
+        Return first pending host of group with free slot, None if all slots busy
+        pending - dict {(group, max_sessions): deque of hosts}
+        '''
+        for (group, max_sessions), queue in pending.items():
+            if queue and (group is None or self.running.get(group, 0) < max_sessions):
+                return queue.popleft()
+        return None
+
+    def _done(self, group):
+        '''
+        Release slot of group
+        '''
+        with self.condition:
+            self.total -= 1
+            if group is not None:
+                self.running[group] -= 1
+            self.condition.notify_all()
+
+    def run(self, task, hosts):
+        '''
+        Run task over all hosts, return AggregatedResult
+        '''
+        result = AggregatedResult(task.name)
+        futures = list()
+        pending = dict()
+        for host in hosts:
+            pending.setdefault(get_limit_group(host), collections.deque()).append(host)
+        with ThreadPoolExecutor(self.num_workers) as pool:
+            for _ in range(len(hosts)):
+                with self.condition:
+                    host = None
+                    while host is None:
+                        if self.total < self.num_workers:
+                            host = self._next_host(pending)
+                        if host is None:
+                            self.condition.wait()
+                    group, _ = get_limit_group(host)
+                    self.total += 1
+                    if group is not None:
+                        self.running[group] = self.running.get(group, 0) + 1
+                future = pool.submit(self.run_host, task.copy(), host)
+                future.add_done_callback(lambda _, group=group: self._done(group))
+                futures.append(future)
+        for future in futures:
+            worker_result = future.result()
+            result[worker_result.host.name] = worker_result
+        return result
+
+
+def init_nornir(**kwargs):
+    '''
+    Register runner 'limited' and init nornir, kwargs passed to InitNornir
+    '''
+    RunnersPluginRegister.register('limited', LimitedRunner)
+    result = InitNornir(**kwargs)
+    return result
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
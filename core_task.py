@@ -3,13 +3,17 @@ Core module for general task and functions
 '''
 import os
 import logging
+import functools
 import tempfile
 import shutil
+import socket
 import hashlib
+import threading
 import zipfile
+import zlib
 import yaml
+import requests
 
-from time import gmtime, strftime
 from collections import namedtuple
 import paramiko
 from ansible_vault import Vault
@@ -21,6 +25,18 @@ from ansible.constants import DEFAULT_VAULT_ID_MATCH
 from ansible.parsing.vault import VaultLib
 from ansible.parsing.vault import VaultSecret
 
+import core_config_store
+import core_normalize
+import core_metrics
+
+# pool of ssh clients for hosts without nornir connection, key - (server, port, user)
+_SSH_POOL = dict()
+_SSH_POOL_LOCK = threading.Lock()
+# lock of every pool key, connect to one device not block other devices
+_SSH_POOL_LOCKS = dict()
+# record classes with fields not equal with template, warning logged once per class
+_CHANGED_RECORD_CLASSES = set()
+
 #class DeviceData:
 #    '''
 #    Device Data class for data saving
@@ -44,6 +60,87 @@ def get_filehash_md5_bin(filename):
             md5.update(data)
     return md5.hexdigest()
 
+def get_filehash_md5_cached(filename):
+    '''
+    Return md5 sum of file from file.md5, saved at download time
+    If file.md5 not exists or not actual (size, mtime) - calc md5 and save it
+    '''
+    md5_file = filename + '.md5'
+    stat = os.stat(filename)
+    if os.path.isfile(md5_file):
+        with open(md5_file) as md5_info:
+            fields = md5_info.read().split()
+        if len(fields) == 3 and fields[1:] == [str(stat.st_size), str(stat.st_mtime_ns)]:
+            return fields[0]
+    result = get_filehash_md5_bin(filename)
+    save_filehash_md5(filename, result)
+    return result
+
+def save_filehash_md5(filename, md5_hash):
+    '''
+    Save md5 sum, size and mtime of file to file.md5
+    '''
+    stat = os.stat(filename)
+    with open(filename + '.md5', 'w') as md5_info:
+        md5_info.write(f'{md5_hash} {stat.st_size} {stat.st_mtime_ns}\n')
+
+def download_file(url, dest_path, expected_md5=None, session=None, chunk_size=65536):
+    '''
+    Download file by chunks to dest_path.part, md5 calc while data received
+    Interrupted download continue with HTTP Range
+    File rename to dest_path only if md5 equal expected_md5 (if set)
+    Return md5 of file or False
+    '''
+    result = False
+    logger = logging.getLogger(__name__)
+    http = session or requests
+    part_path = dest_path + '.part'
+    md5 = hashlib.md5()
+    headers = dict()
+    if os.path.isfile(part_path):
+        offset = os.path.getsize(part_path)
+        logger.info(f'Continue download {url} from {offset} bytes')
+        with open(part_path, 'rb') as part_file:
+            for data in iter(lambda: part_file.read(chunk_size), b''):
+                md5.update(data)
+        headers['Range'] = f'bytes={offset}-'
+    try:
+        with http.get(url, headers=headers, stream=True) as web_req:
+            logger.debug('HTTP code {}'.format(web_req.status_code))
+            if web_req.status_code == 206:
+                mode = 'ab'
+            elif web_req.status_code == 200:
+                mode = 'wb'
+                md5 = hashlib.md5()
+            elif web_req.status_code == 416 and headers:
+                # part file may already have all data, check size with Content-Range: bytes */size
+                mode = None
+                total = web_req.headers.get('Content-Range', '').rpartition('/')[2]
+                if not expected_md5 and total != str(offset):
+                    logger.warning(f'Part of {url} is not equal size on server ({total}), download again')
+                    os.unlink(part_path)
+                    return download_file(url, dest_path, expected_md5, session, chunk_size)
+            else:
+                logger.error(f'Error download {url}, HTTP code {web_req.status_code}')
+                return result
+            if mode:
+                with open(part_path, mode) as part_file:
+                    for data in web_req.iter_content(chunk_size):
+                        part_file.write(data)
+                        md5.update(data)
+    except requests.RequestException as error:
+        logger.error(f'Error download {url}: {error}')
+        return result
+    file_md5 = md5.hexdigest()
+    if expected_md5 and file_md5 != expected_md5:
+        logger.error(f'Hash of {url} is not equal {expected_md5}, remove downloaded data')
+        os.unlink(part_path)
+        return result
+    os.replace(part_path, dest_path)
+    save_filehash_md5(dest_path, file_md5)
+    result = file_md5
+    return result
+
 def unzip_file(zipfile_path, extract_dir='./'):
     '''
     Function for unpack zip archive
@@ -60,46 +157,171 @@ def unzip_file(zipfile_path, extract_dir='./'):
     return result
 
 
+def get_filecrc32(filename, buf_size=65536):
+    '''
+    function calc crc32 for file, as in zip archive
+    '''
+    crc = 0
+    with open(filename, 'rb') as process_file:
+        for data in iter(lambda: process_file.read(buf_size), b''):
+            crc = zlib.crc32(data, crc)
+    return crc
+
+def extract_members(zipfile_path, members, extract_dir='./', hash_dict=None, buf_size=65536):
+    '''
+    Function for extract only need files from zip archive
+    members - list of filenames (without dir in archive)
+    File already extracted with equal size and crc skipped
+    If hash_dict have md5 for file - verify it before rename to filename
+    Return list of paths extracted (or already present) files
+    '''
+    result = list()
+    logger = logging.getLogger(__name__)
+    hash_dict = hash_dict or dict()
+    if not os.path.isdir(extract_dir):
+        logger.info(f'Creating dir {extract_dir}')
+        os.mkdir(extract_dir)
+    with zipfile.ZipFile(zipfile_path, 'r') as zip_ref:
+        zip_members = {os.path.basename(info.filename): info for info in zip_ref.infolist()}
+        for member in members:
+            info = zip_members.get(member)
+            if info is None:
+                logger.warning(f'File {member} not found in {zipfile_path}')
+                continue
+            dest_path = os.path.join(extract_dir, member)
+            if os.path.isfile(dest_path) and os.path.getsize(dest_path) == info.file_size \
+                    and get_filecrc32(dest_path) == info.CRC:
+                logger.debug(f'File {dest_path} already extracted')
+                result.append(dest_path)
+                continue
+            logger.info(f'Extract {member} from {zipfile_path} to {extract_dir}')
+            md5 = hashlib.md5()
+            with zip_ref.open(info) as src_file, open(dest_path + '.part', 'wb') as dest_file:
+                for data in iter(lambda: src_file.read(buf_size), b''):
+                    dest_file.write(data)
+                    md5.update(data)
+            if hash_dict.get(member) and hash_dict[member] != md5.hexdigest():
+                logger.error(f'Hash of {member} is not equal {hash_dict[member]}')
+                os.unlink(dest_path + '.part')
+                continue
+            os.replace(dest_path + '.part', dest_path)
+            result.append(dest_path)
+    return result
+
+
+class InfoRecord:
+    '''
+    Base class of device facts records, access to fields as namedtuple: attributes, index, _fields, _asdict
+    Fields stored in __slots__, no dict per record
+    '''
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *args, **kwargs):
+        for field, value in zip(self._fields, args):
+            setattr(self, field, value)
+        for field, value in kwargs.items():
+            setattr(self, field, value)
+
+    def _asdict(self):
+        return {field: getattr(self, field, None) for field in self._fields}
+
+    def __iter__(self):
+        return iter(getattr(self, field, None) for field in self._fields)
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        values = ', '.join(f'{field}={getattr(self, field, None)!r}' for field in self._fields)
+        return f'{type(self).__name__}({values})'
+
+
+def create_record_class(name, fields):
+    '''
+    Create record class with fields, class create once per facts schema
+    '''
+    fields = tuple(fields)
+    result = type(name, (InfoRecord,), {'__slots__': fields, '_fields': fields})
+    return result
+
+
+def create_info_record(record_class, info_dict):
+    '''
+    Create record of record_class from dict
+    If keys of dict not equal with fields of class (template changed) - create namedtuple
+    '''
+    logger = logging.getLogger(__name__)
+    if tuple(info_dict) == record_class._fields:
+        return record_class(*info_dict.values())
+    if record_class not in _CHANGED_RECORD_CLASSES:
+        _CHANGED_RECORD_CLASSES.add(record_class)
+        logger.warning(f'Fields {list(info_dict)} not equal with {record_class.__name__}, create namedtuple')
+    return create_info_tuple(info_dict)
+
+
+@functools.lru_cache(maxsize=None)
+def get_info_tuple_class(fields):
+    '''
+    Return namedtuple class for fields, class create once for every fields
+    '''
+    return namedtuple('info', fields)
+
+
 def create_info_tuple(info_dict):
     '''
     function create namedtuple from dict for easy access to properties
     '''
     result = None
-    # create namedtuple class
-    general_namedtuple = namedtuple('info', info_dict.keys())
+    # get namedtuple class
+    general_namedtuple = get_info_tuple_class(tuple(info_dict.keys()))
     # fill namedtuple class value from info_dict
     result = general_namedtuple(*info_dict.values())
     return result
 
-def summary_devices_descr(devices_list_p1, devices_list_p2, shared_attr='hostname'):
+def summary_devices_descr(devices_list_p1, *devices_lists, shared_attr='hostname'):
     '''
-    Function for summary 2 lists of namedtuple with shared fields
-    Device compare for fields - name
-    Result list contains with namedtuple with all keys in original list member, default = None
+    Function for summary lists of namedtuple with shared fields
+    Device compare for fields - shared_attr, devices from devices_lists join to devices_list_p1
+    by dict index, values from later lists replace values from earlier
+    Result list contains with namedtuple with all keys in original list member, default = 'None'
     '''
     result = list()
-    # Calc summary keys from 2 type of namedtuples
-    summary_keys = [key for device in devices_list_p1+devices_list_p2 for key in device._fields]
+    all_lists = (devices_list_p1,) + devices_lists
+    # Calc summary keys once per type of records, keys in order of first appearance
+    record_types = dict.fromkeys(type(device) for devices_list in all_lists for device in devices_list)
+    summary_keys = list(dict.fromkeys(key for record_type in record_types for key in record_type._fields))
+    # One summary class for all devices
+    tn_summary = namedtuple('summary', summary_keys)
     # Fill null dict
-    null_dict = {key:'None' for key in set(summary_keys)}
+    null_dict = {key: 'None' for key in summary_keys}
+    # Index for every joined list: shared_attr -> merged values of all equal devices
+    indexes = list()
+    for devices_list in devices_lists:
+        index = dict()
+        for device in devices_list:
+            index.setdefault(getattr(device, shared_attr), dict()).update(device._asdict())
+        indexes.append(index)
     # Cycle for list with p1 properties
     for device in devices_list_p1:
-        # Init result dict
-        device_summary = dict()
-        # Update with null_dict
-        device_summary.update(null_dict)
-        # Upadate with dict as namedtuple from list_p1
+        device_summary = dict(null_dict)
         device_summary.update(device._asdict())
-        # Find all device with equal shared_attr in list_p2
-        devices_p2_sel_device = [x for x in devices_list_p2 if getattr(x, shared_attr) == getattr(device, shared_attr)]
-        # Update dict with all equal device
-        for device_p2 in devices_p2_sel_device:
-            device_summary.update(device_p2._asdict())
-        tn_summary = namedtuple('summary', device_summary.keys(), defaults=(None,))
-        # Create namedtuple tn_summary and append to result
-        result.append(tn_summary(*device_summary.values()))
+        key = getattr(device, shared_attr)
+        for index in indexes:
+            device_summary.update(index.get(key, {}))
+        result.append(tn_summary(**device_summary))
     return result
 
+
 def read_vault(vaultfile,passwordfile):
     with open(passwordfile, "rb") as file_pass:
         password = file_pass.readline().strip()
@@ -120,13 +342,26 @@ def init_creds(task, vault, passwordfile):
 #        logger.debug('Group {} password {}'.format(key, groups_cred[key]['password']))
 
 
+@core_metrics.timed('task')
+def subtask_get_napalm_config(task):
+    '''
+    Host task for get device configuration with napalm plugin
+    Output - result of napalm getter get_config
+    '''
+    core_metrics.get_connection(task.host, 'napalm', task.nornir.config)
+    with core_metrics.measure(task.host.name, 'command', 'get_config'):
+        out = task.run(napalm_get, getters=['get_config'])
+    return out.result
+
+
 def task_get_napalm_config(task, mode, output_dir):
     '''
     Get device configuration with napalm plugin
+    Config saved to content-addressed store in output_dir
     '''
     logger = logging.getLogger(__name__)
     logger.debug('Get startup config from devices (napalm)')
-    out = task.run(napalm_get, getters=['get_config'])
+    out = task.run(task=subtask_get_napalm_config)
     if out.failed:
         for host in out.failed_hosts.keys():
             logger.warning(f"Device {host} config not local save")
@@ -134,23 +369,27 @@ def task_get_napalm_config(task, mode, output_dir):
     else:
         for host, res in out.items():
             if not res.failed:
-                device_config_file = output_dir+'//'+host+'_' + \
-                    strftime("%Y-%m-%d_%H%M%S", gmtime())+'.cfg'
-                logger.debug(
-                    f'Save config {host} to file {device_config_file}')
-                with open(device_config_file, 'w') as file:
-                    file.write(res.result['get_config'][mode])
+                logger.debug(f'Save config {host} to store {output_dir}')
+                config = res.result['get_config'][mode]
+                with core_metrics.measure(host, 'store', core_config_store.KIND_CONFIG) as counter:
+                    counter['bytes'] = len(config)
+                    core_config_store.store_config(output_dir, host, config,
+                                                   core_normalize.get_host_platform(task.inventory.hosts[host]))
 
 
-def scp_get_file(host, src, dst, user, password):
+def scp_get_file(host, src, dst, user=None, password=None, transport=None, name=None, login_limiter=None):
     '''
     Get file from device throw scp
+    If transport not set - use ssh connect from pool, name - nornir host name for metrics,
+    login_limiter - login token bucket of AAA server (core_runner.get_login_limiter)
+    Return True if file copied
     '''
+    result = False
     logger = logging.getLogger(__name__)
     logger.debug('Get file {} from device {}'.format(src, host))
-    logger.debug('Create ssh connect to device {}'.format(host))
-    ssh = create_sshclient(host, 22, user, password)
-    scp = SCPClient(ssh.get_transport())
+    if transport is None:
+        transport = get_pooled_transport(host, 22, user, password, name, login_limiter)
+    scp = SCPClient(transport)
     logger.debug('Generate tmp file')
     temp_file = tempfile.NamedTemporaryFile()
     logger.debug("Get file {} to {}".format(src, temp_file.name))
@@ -158,42 +397,169 @@ def scp_get_file(host, src, dst, user, password):
         scp.get(src, temp_file.name)
         logger.debug("Copy file {} to {}".format(temp_file.name, dst))
         shutil.copyfile(temp_file.name, dst)
+        result = True
     except:
         logger.error('Error copy {} on device {}'.format(host, src))
     finally:
         scp.close()
-        ssh.close()
         temp_file.close()
+    return result
 
-def scp_put_file(host, src, dst, user, password):
+def scp_put_file(host, src, dst, user=None, password=None, transport=None, progress=None, name=None,
+                 login_limiter=None):
     '''
     Put file from device throw scp
+    If transport not set - use ssh connect from pool, name - nornir host name for metrics,
+    login_limiter - login token bucket of AAA server (core_runner.get_login_limiter)
+    progress - scp callback (filename, size, sent)
+    Return True if file copied
     '''
+    result = False
     logger = logging.getLogger(__name__)
-#    logger.debug('Put file {} to device {}'.format(src, host))
-#    logger.debug('Create ssh connect to device {}'.format(host))
-    ssh = create_sshclient(host, 22, user, password)
-    scp = SCPClient(ssh.get_transport())
+    if transport is None:
+        transport = get_pooled_transport(host, 22, user, password, name, login_limiter)
+    scp = SCPClient(transport, progress=progress)
     logger.debug("Put file {} to {}".format(src, dst))
     try:
         scp.put(src, dst)
         logger.debug("Copy file {} to {} - OK".format(src, dst))
+        result = True
     except:
         logger.error('Error copy {} on device {}'.format(host, src))
     finally:
         scp.close()
-        ssh.close()
+    return result
+
+def sftp_list_files(transport, path='.'):
+    '''
+    Get files on device throw sftp
+    Return dict {filename: size}
+    '''
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    try:
+        result = {attr.filename: attr.st_size for attr in sftp.listdir_attr(path)}
+    finally:
+        sftp.close()
+    return result
 
-def create_sshclient(server, port, user, password):
+def sftp_put_file_resume(host, src, dst, user=None, password=None, transport=None, progress=None, name=None,
+                         login_limiter=None):
+    '''
+    Put file to device throw sftp, only missing bytes
+    If transport not set - use ssh connect from pool, name - nornir host name for metrics,
+    login_limiter - login token bucket of AAA server (core_runner.get_login_limiter)
+    File with same size on device skipped, partial file continued from its size,
+    bigger file or file which can't be continued is replaced
+    progress - scp style callback (filename, size, sent)
+    Return True if file on device have full size
+    '''
+    result = False
+    buf_size = 32768
+    logger = logging.getLogger(__name__)
+    if transport is None:
+        transport = get_pooled_transport(host, 22, user, password, name, login_limiter)
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    local_size = os.path.getsize(src)
+    try:
+        try:
+            remote_size = sftp.stat(dst).st_size
+        except IOError:
+            remote_size = None
+        if remote_size == local_size:
+            logger.info('File {} on device {} already uploaded, skip'.format(dst, host))
+            return True
+        offset = 0
+        remote_file = None
+        if remote_size and remote_size < local_size:
+            logger.info('Continue upload {} to device {} from {} bytes'.format(dst, host, remote_size))
+            try:
+                remote_file = sftp.open(dst, 'r+')
+                remote_file.seek(remote_size)
+                offset = remote_size
+            except IOError:
+                logger.warning('Device {} not support continue upload, replace {}'.format(host, dst))
+        if remote_file is None:
+            remote_file = sftp.open(dst, 'w')
+        with open(src, 'rb') as local_file, remote_file:
+            remote_file.set_pipelined(True)
+            local_file.seek(offset)
+            sent = 0
+            while True:
+                data = local_file.read(buf_size)
+                if not data:
+                    break
+                remote_file.write(data)
+                sent += len(data)
+                if progress:
+                    progress(dst, local_size - offset, sent)
+        result = sftp.stat(dst).st_size == local_size
+        if result:
+            logger.debug("Copy file {} to {} - OK".format(src, dst))
+        else:
+            logger.error('File {} on device {} have wrong size'.format(dst, host))
+    except (IOError, paramiko.SSHException):
+        logger.error('Error copy {} on device {}'.format(src, host))
+    finally:
+        sftp.close()
+    return result
+
+def create_sshclient(server, port, user, password, name=None):
     '''
     Create general ssh client connection
+    name - nornir host name for metrics, default - server
     '''
     client = paramiko.SSHClient()
     client.load_system_host_keys()
     client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    client.connect(server, port, user, password)
+    with core_metrics.measure(name or server, 'tcp_connect'):
+        sock = socket.create_connection((server, port))
+    with core_metrics.measure(name or server, 'ssh_auth'):
+        client.connect(server, port, user, password, sock=sock)
     return client
 
+def get_pooled_transport(server, port, user, password, name=None, login_limiter=None):
+    '''
+    Return transport of ssh client from pool, connect only if not exists or not active
+    Connect under lock of pool key, so other devices not wait it
+    name - nornir host name for metrics, default - server
+    login_limiter - login token bucket of AAA server, token taken before connect
+    '''
+    logger = logging.getLogger(__name__)
+    key = (server, port, user)
+    with _SSH_POOL_LOCK:
+        key_lock = _SSH_POOL_LOCKS.setdefault(key, threading.Lock())
+    with key_lock:
+        client = _SSH_POOL.get(key)
+        if client is None or not client.get_transport() or not client.get_transport().is_active():
+            if login_limiter:
+                logger.debug(f'Wait login token for {name or server}')
+                login_limiter.consume(1)
+            logger.debug('Create ssh connect to device {}'.format(server))
+            client = create_sshclient(server, port, user, password, name)
+            with _SSH_POOL_LOCK:
+                _SSH_POOL[key] = client
+    return client.get_transport()
+
+def close_ssh_pool():
+    '''
+    Close all ssh clients in pool
+    '''
+    with _SSH_POOL_LOCK:
+        for client in _SSH_POOL.values():
+            client.close()
+        _SSH_POOL.clear()
+
+def get_host_transport(host, config, connection='netmiko'):
+    '''
+    Return paramiko transport of nornir host connection
+    Connection opened by nornir one time and keeped for all run
+    For napalm connection return transport of napalm netmiko device (ios)
+    '''
+    device = core_metrics.get_connection(host, connection, config)
+    if connection == 'napalm':
+        device = device.device
+    return device.remote_conn_pre.get_transport()
+
 def sum_size_files(filepath_list):
     '''
     Calc size for list filespath
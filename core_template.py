@@ -0,0 +1,97 @@
+'''
+Module with process-wide registry of compiled TextFSM templates
+'''
+import io
+import logging
+import os
+import sys
+import threading
+assert sys.version_info.major == 3, 'For script run please use python3'
+import textfsm
+
+# template path -> (mtime_ns, template text)
+_TEMPLATES = dict()
+_TEMPLATES_LOCK = threading.Lock()
+# per thread cache of compiled fsm, key - (template path, mtime_ns)
+_LOCAL = threading.local()
+# changed by clear_registry, per thread caches of old generation dropped
+_GENERATION = 0
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def load_template(template_file_path):
+    '''
+    Load template text to registry, reload only if file was changed
+    Return mtime_ns of loaded template
+    '''
+    logger = logging.getLogger(__name__)
+    mtime = os.stat(template_file_path).st_mtime_ns
+    cached = _TEMPLATES.get(template_file_path)
+    if cached and cached[0] == mtime:
+        return mtime
+    with _TEMPLATES_LOCK:
+        cached = _TEMPLATES.get(template_file_path)
+        if not cached or cached[0] != mtime:
+            logger.debug(f'Load template {template_file_path}')
+            with open(template_file_path) as template:
+                _TEMPLATES[template_file_path] = (mtime, template.read())
+    return mtime
+
+
+def get_fsm(template_file_path):
+    '''
+    Return ready for parse TextFSM object for template
+    Template compile once per thread, before return fsm state is reset
+    '''
+    mtime = load_template(template_file_path)
+    fsm_cache = getattr(_LOCAL, 'fsm_cache', None)
+    if fsm_cache is None or _LOCAL.generation != _GENERATION:
+        fsm_cache = _LOCAL.fsm_cache = dict()
+        _LOCAL.generation = _GENERATION
+    cached = fsm_cache.get(template_file_path)
+    if cached and cached[0] == mtime:
+        fsm = cached[1]
+        fsm.Reset()
+    else:
+        template_text = _TEMPLATES[template_file_path][1]
+        fsm = textfsm.TextFSM(io.StringIO(template_text))
+        fsm_cache[template_file_path] = (mtime, fsm)
+    return fsm
+
+
+def clear_registry():
+    '''
+    Drop all loaded templates and compiled fsm of all threads
+    Next call get_fsm in every thread will load and compile templates again
+    '''
+    global _GENERATION
+    with _TEMPLATES_LOCK:
+        _TEMPLATES.clear()
+        _GENERATION += 1
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+'''
+Module for schedule file transfers to many devices at once
+'''
+import logging
+import os
+import sys
+import threading
+import time
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+from core_task import scp_put_file
+import core_metrics
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+class RateLimiter:
+    '''
+    Token bucket for limit bytes per second, shared between threads
+    '''
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, nbytes):
+        '''
+        Take nbytes from bucket, return seconds to wait before use of them (for asyncio.sleep)
+        '''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= nbytes
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def consume(self, nbytes):
+        '''
+        Take nbytes from bucket, sleep while bucket not have enough tokens
+        '''
+        wait = self.reserve(nbytes)
+        if wait:
+            time.sleep(wait)
+
+
+class TransferScheduler:
+    '''
+    Run transfer jobs with global and per host limit, largest files first
+    Job - dict with keys host, src, dst, transport
+    '''
+
+    def __init__(self, max_transfers=10, max_per_host=1, rate_limit=None, transfer_func=scp_put_file):
+        self.max_transfers = max_transfers
+        self.max_per_host = max_per_host
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.transfer_func = transfer_func
+        self.jobs = list()
+        self.active = dict()
+        self.condition = threading.Condition()
+        self.result = {'completed': [], 'failed': []}
+
+    def add(self, host, src, dst, transport=None):
+        '''
+        Add job for transfer
+        '''
+        self.jobs.append({'host': host, 'src': src, 'dst': dst, 'transport': transport,
+                          'size': os.path.getsize(src)})
+
+    def _next_job(self):
+        '''
+        Return largest job for host with free slot, None - if all jobs done
+        '''
+        with self.condition:
+            while self.jobs:
+                for index, job in enumerate(self.jobs):
+                    if self.active.get(job['host'], 0) < self.max_per_host:
+                        self.active[job['host']] = self.active.get(job['host'], 0) + 1
+                        return self.jobs.pop(index)
+                self.condition.wait()
+            return None
+
+    def _done_job(self, job, completed):
+        with self.condition:
+            self.active[job['host']] -= 1
+            self.result['completed' if completed else 'failed'].append(job)
+            self.condition.notify_all()
+
+    def _progress(self, counter):
+        '''
+        Return scp progress callback, it add sent bytes to counter and take them from rate limiter
+        Skipped or resumed upload count only bytes really sent
+        '''
+        sent_last = dict()
+
+        def progress(filename, size, sent):
+            nbytes = sent - sent_last.get(filename, 0)
+            sent_last[filename] = sent
+            counter['bytes'] += nbytes
+            if self.limiter:
+                self.limiter.consume(nbytes)
+        return progress
+
+    def _worker(self):
+        logger = logging.getLogger(__name__)
+        while True:
+            job = self._next_job()
+            if job is None:
+                break
+            logger.debug(f"Transfer {job['src']} ({job['size']} bytes) to {job['host']}")
+            try:
+                with core_metrics.measure(job['host'], 'transfer', job['dst']) as counter:
+                    completed = self.transfer_func(job['host'], job['src'], job['dst'],
+                                                   transport=job['transport'], progress=self._progress(counter))
+            except Exception as error:
+                logger.error(f"Transfer {job['src']} to {job['host']} failed: {error}")
+                completed = False
+            self._done_job(job, completed)
+
+    def run(self):
+        '''
+        Run all jobs
+        Output - dict {'completed':[], 'failed':[]}
+        '''
+        logger = logging.getLogger(__name__)
+        self.jobs.sort(key=lambda job: job['size'], reverse=True)
+        logger.info(f'Start {len(self.jobs)} transfers, {sum(job["size"] for job in self.jobs)} bytes')
+        workers = [threading.Thread(target=self._worker) for _ in range(min(self.max_transfers, len(self.jobs)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self.result
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info('Start script')
+    logger.info('End script')
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,14 @@ import logging
 import sys
 
 from nornir.core.filter import F
-from nornir import InitNornir
+import core_runner
+import core_metrics
 
 import core_qtech_task
 import core_routeros_task
 import core_jun_task
 import core_ios_task
+import core_dispatch
 import core_task
 
 assert sys.version_info.major == 3, 'For script run please use python3'
@@ -62,7 +64,7 @@ def main():
     logger.info("Start program")
 
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file="/home/sas/home-net/config.yaml")
+    all_devices = core_runner.init_nornir(config_file="/home/sas/home-net/config.yaml")
 
     # Установка пароля
     all_devices.inventory.defaults.password = PASSWORD
@@ -77,15 +79,7 @@ def main():
             group.name, group['newuser_name'], group['newuser_password']))
 
     logger.info('Pre run check')
-    devices = list()
-    devices.extend(core_ios_task.task_get_users(
-        all_devices.filter(F(groups__contains="ios"))))
-    devices.extend(core_jun_task.task_get_users(
-        all_devices.filter(F(groups__contains="jun_srx"))))
-    devices.extend(core_routeros_task.task_get_users(
-        all_devices.filter(F(groups__contains="routeros"))))
-    devices.extend(core_qtech_task.task_get_users(
-        all_devices.filter(F(groups__contains="qtech"))))
+    devices = core_dispatch.task_get_users(all_devices)
 
     logger.info('Check users')
     for device in devices:
@@ -111,15 +105,7 @@ def main():
             map_group_task_save_to_startup[group](all_devices.filter(
                 error=False).filter(F(groups__contains=group)))
     logger.info('Post run check')
-    devices = list()
-    devices.extend(core_ios_task.task_get_users(
-        all_devices.filter(F(groups__contains="ios"))))
-    devices.extend(core_jun_task.task_get_users(
-        all_devices.filter(F(groups__contains="jun_srx"))))
-    devices.extend(core_routeros_task.task_get_users(
-        all_devices.filter(F(groups__contains="routeros"))))
-    devices.extend(core_qtech_task.task_get_users(
-        all_devices.filter(F(groups__contains="qtech"))))
+    devices = core_dispatch.task_get_users(all_devices)
 
     for device in devices:
         logger.debug('Check user {} in device {} exist'.format(
@@ -131,6 +117,7 @@ def main():
             logger.error('User {} in device {} not was created'.format(
                 all_devices.inventory.hosts[device.hostname]['newuser_name'], device.hostname))
 
+    core_metrics.export('create_devuser')
     logger.info("End program")
 
 
@@ -6,7 +6,8 @@ import sys
 import argparse
 
 from nornir.core.filter import F
-from nornir import InitNornir
+import core_runner
+import core_metrics
 
 import core_qtech_task
 import core_routeros_task
@@ -71,7 +72,7 @@ def main():
     logger.debug("New username password: %s", args.password)
 
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file=CONFIG)
+    all_devices = core_runner.init_nornir(config_file=CONFIG)
 
     # Установка пароля
     logger.debug('Fill access info from vault {}'.format(VAULT))
@@ -129,6 +130,7 @@ def main():
         else:
             logger.error('User {} in device {} not was created'.format(args.username, device.hostname))
 
+    core_metrics.export('create_user')
     logger.info("End program")
 
 
@@ -3,16 +3,16 @@
 Module for check connect to this user credentials in VAULT
 '''
 
+import argparse
 import logging
 
-from nornir import InitNornir
-from nornir.core.filter import F
+import core_runner
+import core_metrics
 
 import core_task
-import core_ios_task
-import core_jun_task
-import core_routeros_task
-import core_qtech_task
+import core_async
+import core_dispatch
+import core_normalize
 
 VAULT = 'inventory/creds.yaml'
 PASSWORDVAULT = 'private/vault.passwd'
@@ -39,37 +39,34 @@ def main():
     logger = logging.getLogger(__name__)
     logger.info("Start program for config network")
 
+    logger.debug("Parse arguments")
+    parser = argparse.ArgumentParser(description='Check connect to devices and get OS version')
+    parser.add_argument('--async', dest='async_mode', action='store_true', default=False,
+                        help="Run device tasks in asyncio over asyncssh instead of nornir threads, for big inventory")
+    parser.add_argument('--max-sessions', action='store', type=int, default=core_async.MAX_SESSIONS,
+                        help="Concurrent sessions of async mode")
+    args = parser.parse_args()
+
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file="config.yaml")
+    all_devices = core_runner.init_nornir(config_file="config.yaml")
 
     # Установка пароля
     logger.debug('Fill access info from vault {}'.format(VAULT))
     core_task.init_creds(all_devices, VAULT, PASSWORDVAULT)
 
     logger.debug("Run task for get os version")
-    routeros = core_routeros_task.task_get_info(
-        all_devices.filter(F(groups__contains="routeros")))
-    qtech = core_qtech_task.task_get_info(
-        all_devices.filter(F(groups__contains="qtech")))
-    ios = core_ios_task.task_get_info(
-        all_devices.filter(F(groups__contains="ios")))
-    jun_srx = core_jun_task.task_get_info(
-        all_devices.filter(F(groups__contains="jun_srx")))
+    if args.async_mode:
+        devices = core_async.task_get_info(all_devices, args.max_sessions)
+    else:
+        devices = core_dispatch.task_get_info(all_devices)
 
+    core_metrics.export('dev_connect')
     logger.info("End program for config network")
 
-    for device in routeros:
-        print("Hostname is {} \t ROS \t {}".format(
-            device.hostname, device.version))
-    for device in qtech:
-        print("Hostname is {} \t Qtech \t {}".format(
-            device.hostname, device.version))
-    for device in ios:
-        print("Hostname is {} \t IOS \t {}".format(
-            device.hostname, device.version))
-    for device in jun_srx:
-        print("Hostname is {} \t JunOS \t {}".format(
-            device.hostname, device.version))
+    for device in devices:
+        group = core_normalize.get_host_platform(all_devices.inventory.hosts[device.hostname])
+        print("Hostname is {} \t {} \t {}".format(
+            device.hostname, core_dispatch.map_group_platform_name[group], device.version))
 
 
 configure_logging()
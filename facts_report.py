@@ -0,0 +1,69 @@
+'''
+Module for report and export of saved device facts
+'''
+import argparse
+import logging
+import sys
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import core_facts
+
+FACTSDIR = 'facts'
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start program")
+
+    logger.debug("Parse arguments")
+    parser = argparse.ArgumentParser(
+        description='Report of device facts, default - version histogram by model for latest run')
+    parser.add_argument('--facts', '-f', action='store', default=None,
+                        help="File of saved facts, default - latest in facts dir")
+    parser.add_argument('--dir', action='store', default=FACTSDIR,
+                        help="Directory of saved facts")
+    parser.add_argument('--histogram', action='store', nargs='+', default=['model', 'version'],
+                        help="Columns for histogram")
+    parser.add_argument('--csv', action='store', default=None,
+                        help="Export facts to csv file")
+    parser.add_argument('--parquet', action='store', default=None,
+                        help="Export facts to parquet file")
+    args = parser.parse_args()
+
+    facts = core_facts.FactsTable.load(args.facts) if args.facts else core_facts.load_latest(args.dir)
+    if facts is None:
+        logger.error(f'Facts not found in {args.dir}')
+        return
+    for key, count in facts.histogram(*args.histogram).items():
+        print(f"{' '.join(key)}: {count}")
+    if args.csv:
+        facts.to_csv(args.csv)
+    if args.parquet:
+        try:
+            facts.to_parquet(args.parquet)
+        except RuntimeError as error:
+            logger.error(error)
+
+    logger.info("End program")
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,13 @@ Get users from managment devices
 
 import sys
 assert sys.version_info.major == 3, 'For script run please use python3'
+import argparse
 import logging
-from nornir.core.filter import F
-from nornir import InitNornir
+import core_runner
+import core_metrics
 
-import core_qtech_task
-import core_routeros_task
-import core_jun_task
-import core_ios_task
+import core_async
+import core_dispatch
 import core_task
 
 
@@ -41,28 +40,32 @@ def main():
     logger = logging.getLogger(__name__)
     logger.info("Start program")
 
+    logger.debug("Parse arguments")
+    parser = argparse.ArgumentParser(description='Get users from devices')
+    parser.add_argument('--async', dest='async_mode', action='store_true', default=False,
+                        help="Run device tasks in asyncio over asyncssh instead of nornir threads, for big inventory")
+    parser.add_argument('--max-sessions', action='store', type=int, default=core_async.MAX_SESSIONS,
+                        help="Concurrent sessions of async mode")
+    args = parser.parse_args()
+
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file="config.yaml")
+    all_devices = core_runner.init_nornir(config_file="config.yaml")
 
     # Установка пароля
     logger.debug('Fill access info from vault {}'.format(VAULT))
     core_task.init_creds(all_devices, VAULT, PASSWORDVAULT)
 
-    devices = list()
-    devices.extend(core_ios_task.task_get_users(
-        all_devices.filter(F(groups__contains="ios"))))
-    devices.extend(core_jun_task.task_get_users(
-        all_devices.filter(F(groups__contains="jun_srx"))))
-    devices.extend(core_routeros_task.task_get_users(
-        all_devices.filter(F(groups__contains="routeros"))))
-    devices.extend(core_qtech_task.task_get_users(
-        all_devices.filter(F(groups__contains="qtech"))))
+    if args.async_mode:
+        devices = core_async.task_get_users(all_devices, args.max_sessions)
+    else:
+        devices = core_dispatch.task_get_users(all_devices)
 
     for device in devices:
         for user in device.users.keys():
             print("{}\t{}\t{}".format(
                 device.hostname, user, device.users[user].keys()))
 
+    core_metrics.export('get_users')
     logger.info("End program")
 
 
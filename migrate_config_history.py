@@ -0,0 +1,143 @@
+'''
+Module for move legacy config files <host>_<timestamp>.cfg from config dir to config store:
+configs added by core_config_store.store_config to index, refs and delta history of host
+Files already in store skipped, so migrate can be run again after error
+Store keep configs of host in order of time, if store have configs of host newer then legacy file
+not in store (save_config run before migrate) - migrate stopped without changes of store
+'''
+import argparse
+import logging
+import os
+import re
+import sys
+assert sys.version_info.major == 3, 'For script run please use python3'
+
+import core_config_history
+import core_config_store
+import core_normalize
+
+CONFIGDIR = 'config'
+STOREDIR = core_config_store.STORE_DIR
+# example: sw-core_2020-08-13_220653.cfg
+CONFIG_FILE_REGEX = r'^(?P<host>.+)_(?P<timestamp>\d{4}-\d{2}-\d{2}_\d{6})\.cfg$'
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def find_config_files(config_dir):
+    '''
+    Return dict {host: [(timestamp, path), ...]}, files sorted by timestamp
+    '''
+    result = dict()
+    for filename in os.listdir(config_dir):
+        match = re.match(CONFIG_FILE_REGEX, filename)
+        if match:
+            result.setdefault(match.group('host'), list()).append(
+                (match.group('timestamp'), os.path.join(config_dir, filename)))
+    for files in result.values():
+        files.sort()
+    return result
+
+
+def read_config(path):
+    '''
+    Read config file, bytes not in utf-8 replaced as in core_config_store.store_file
+    '''
+    with open(path, 'r', errors='replace') as config_file:
+        return config_file.read()
+
+
+def get_conflicts(store_dir, config_files):
+    '''
+    Return list of (host, path) of legacy files not in store and older then latest config of host in store
+    '''
+    result = list()
+    for host, files in sorted(config_files.items()):
+        latest = core_config_store.get_latest(store_dir, host)
+        saved = {timestamp for timestamp, _ in core_config_store.list_configs(store_dir, host)}
+        result.extend((host, path) for timestamp, path in files
+                      if latest and timestamp not in saved and timestamp <= latest[0])
+    return result
+
+
+def migrate(config_dir, store_dir, delete):
+    '''
+    Add config files to store, files with timestamp already in store of host skipped
+    After add every config verified, if delete - added files removed
+    Return (size of added files, size of history added for them), None if store have newer configs
+    '''
+    logger = logging.getLogger(__name__)
+    config_files = find_config_files(config_dir)
+    conflicts = get_conflicts(store_dir, config_files)
+    if conflicts:
+        for host, path in conflicts:
+            logger.error(f'Config {path} older then latest config of {host} in store')
+        logger.error(f'Store {store_dir} have configs saved before migrate, store not changed')
+        return None
+    history_dir = os.path.join(store_dir, core_config_store.HISTORY_DIR)
+    files_size = 0
+    history_size = core_config_history.history_size(history_dir)
+    for host, files in sorted(config_files.items()):
+        saved = {timestamp for timestamp, _ in core_config_store.list_configs(store_dir, host)}
+        logger.info(f'Add {len([path for timestamp, path in files if timestamp not in saved])} configs of {host}')
+        for timestamp, path in files:
+            if timestamp not in saved:
+                core_config_store.store_config(store_dir, host, read_config(path), timestamp=timestamp)
+                files_size += os.path.getsize(path)
+        for timestamp, path in files:
+            config = core_config_store.get_config(store_dir, host, timestamp)
+            # unchanged configs saved once, configs equal in normalized form
+            if config is None or (core_normalize.hash_text(config.decode('utf-8'))
+                                  != core_normalize.hash_text(read_config(path))):
+                logger.error(f'Config {path} not equal with config in store, file not deleted')
+            elif delete:
+                logger.debug(f'Delete stored file {path}')
+                os.unlink(path)
+    return files_size, core_config_history.history_size(history_dir) - history_size
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start program")
+
+    logger.debug("Parse arguments")
+    parser = argparse.ArgumentParser(
+        description='Move config files to config store with delta compressed history')
+    parser.add_argument('--config', '-c', action='store', default=CONFIGDIR,
+                        help="Directory with config files")
+    parser.add_argument('--store', action='store', default=STOREDIR,
+                        help="Directory of config store")
+    parser.add_argument('--delete', '-d', action='store_true', default=False,
+                        help="Delete config files after add to store and verify")
+    args = parser.parse_args()
+
+    result = migrate(args.config, args.store, args.delete)
+    if result is None:
+        sys.exit(1)
+    files_size, history_size = result
+    print(f'Added files size: {files_size} bytes')
+    print(f'History size for added files: {history_size} bytes')
+    if files_size:
+        print(f'Saved: {files_size - history_size} bytes ({100 - history_size*100/files_size:.1f}%)')
+
+    logger.info("End program")
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
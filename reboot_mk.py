@@ -5,8 +5,9 @@ Module for update routeros devices
 
 import logging
 
-from nornir import InitNornir
 from nornir.core.filter import F
+import core_runner
+import core_metrics
 import core_routeros_task
 import core_task
 
@@ -35,7 +36,7 @@ def main():
     logger.info("Start program for schedule reboot RouterOS devices")
 
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file="config.yaml")
+    all_devices = core_runner.init_nornir(config_file="config.yaml")
 
     # Set auth information
     logger.debug('Fill access info from vault {}'.format(VAULT))
@@ -46,6 +47,7 @@ def main():
         all_devices.filter(F(groups__contains="routeros")).filter(F(reboot_last=False)),
         SCHED_TIMEOUT_SEC)
 
+    core_metrics.export('reboot_mk')
     logger.info(f"End program create reboot task. Devices will reboot at {SCHED_TIMEOUT_SEC} seconds")
 
 configure_logging()
@@ -3,10 +3,14 @@ Module for get config from device and save to config dir
 '''
 import logging
 
-from nornir import InitNornir
 from nornir.core.filter import F
+import core_runner
+import core_metrics
 
 import core_task
+import core_config_diff
+import core_config_store
+import core_normalize
 #import core_ios_task
 #import core_jun_task
 import core_routeros_task
@@ -14,7 +18,9 @@ import core_qtech_task
 
 VAULT = 'inventory/creds.yaml'
 PASSWORDVAULT = 'private/vault.passwd'
-CONFIGDIR = 'config'
+CONFIGDIR = core_config_store.STORE_DIR
+# limit of concurrent downloads from devices
+MAX_TRANSFERS = 5
 
 
 def configure_logging():
@@ -31,6 +37,29 @@ def configure_logging():
     logger.addHandler(console)
 
 
+def save_configs(all_devices, config_dir=CONFIGDIR, max_transfers=MAX_TRANSFERS):
+    '''
+    Get configs from all devices to store in config_dir and update index of changes
+    Output - dict {host: (added, removed)} of changed hosts
+    '''
+    logger = logging.getLogger(__name__)
+    logger.debug("Run task for get config from device")
+
+    core_task.task_get_napalm_config(all_devices.filter(F(groups__contains="ios")), 'startup', config_dir)
+    core_qtech_task.task_get_config(all_devices.filter(F(groups__contains="qtech")),config_dir)
+    core_task.task_get_napalm_config(all_devices.filter(F(groups__contains="jun_srx")), 'running', config_dir)
+    core_routeros_task.task_get_export(all_devices.filter(F(groups__contains="routeros")), config_dir,
+                                       max_transfers=max_transfers)
+    core_routeros_task.task_get_bin_config(all_devices.filter(F(groups__contains="routeros")), config_dir,
+                                           max_transfers=max_transfers)
+
+    logger.debug("Update index of config changes")
+    platforms = {host.name: core_normalize.get_host_platform(host) for host in all_devices.inventory.hosts.values()}
+    run_id = core_config_diff.update_index(config_dir, platforms=platforms)
+    result = core_config_diff.get_changed_hosts(config_dir, run_id)
+    return result
+
+
 def main():
     '''
     Main
@@ -39,20 +68,17 @@ def main():
     logger.info("Start program")
 
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file="config.yaml")
+    all_devices = core_runner.init_nornir(config_file="config.yaml")
 
     # Установка пароля
     logger.debug('Fill access info from vault {}'.format(VAULT))
     core_task.init_creds(all_devices, VAULT, PASSWORDVAULT)
 
-    logger.debug("Run task for get config from device")
-
-    core_task.task_get_napalm_config(all_devices.filter(F(groups__contains="ios")), 'startup', CONFIGDIR)
-    core_qtech_task.task_get_config(all_devices.filter(F(groups__contains="qtech")),CONFIGDIR)
-    core_task.task_get_napalm_config(all_devices.filter(F(groups__contains="jun_srx")), 'running', CONFIGDIR)
-    core_routeros_task.task_get_export(all_devices.filter(F(groups__contains="routeros")), CONFIGDIR)
-    core_routeros_task.task_get_bin_config(all_devices.filter(F(groups__contains="routeros")), CONFIGDIR)
+    for host, (added, removed) in save_configs(all_devices).items():
+        logger.info(f'Config of {host} changed: +{added} -{removed} lines')
 
+    core_task.close_ssh_pool()
+    core_metrics.export('save_config')
     logger.info("End program")
 
 
@@ -0,0 +1,531 @@
+'''
+Module with simulated network devices for load tests without real devices
+Every device - local ssh server on 127.0.0.1, device number N listen on port base_port + N
+Platforms of devices in order of number: RouterOS, Qtech, IOS, JunOS
+Device answer known commands of platform with realistic output after latency:
+    shell - echo of input and prompt, as cli for netmiko and napalm ios
+    exec - output of one command, as for asyncssh tasks
+    scp and sftp - files saved by 'system backup save' and 'export file=' on RouterOS
+Devices can be started in few processes, one event loop per process
+Run: python3 sim_devices.py --hosts 100 --latency 0.05
+'''
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from time import gmtime, strftime
+assert sys.version_info.major == 3, 'For script run please use python3'
+import asyncssh
+
+import core_normalize
+
+USERNAME = 'bench'
+PASSWORD = 'bench'
+ADDRESS = '127.0.0.1'
+BASE_PORT = 30000
+# delay of every command, seconds
+LATENCY = 0.05
+# delay of password check (AAA server), seconds
+LOGIN_LATENCY = 0.0
+# size of RouterOS binary backup
+BACKUP_SIZE = 131072
+# changed bytes of backup on every save (timestamp and counters)
+BACKUP_CHANGED = 64
+PLATFORMS = (core_normalize.PLATFORM_ROUTEROS, core_normalize.PLATFORM_QTECH,
+             core_normalize.PLATFORM_IOS, core_normalize.PLATFORM_JUNOS)
+USERS = (('admin', 15), ('backup', 1), ('monitor', 1))
+INTERFACES = 24
+
+
+def configure_logging():
+    '''
+    Configure logging
+    '''
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def get_fleet(hosts, base_port=BASE_PORT):
+    '''
+    Return list of devices, dict {name, platform, port}, platforms of devices in order of PLATFORMS
+    '''
+    result = list()
+    for num in range(hosts):
+        platform = PLATFORMS[num % len(PLATFORMS)]
+        result.append({'name': f'sim-{platform}-{num:04d}', 'platform': platform, 'port': base_port + num})
+    return result
+
+
+def get_serial(name, length=12):
+    '''
+    Return stable serial number of device
+    '''
+    return ''.join(random.Random(name).choices('0123456789', k=length))
+
+
+def get_mac(name, offset=0):
+    '''
+    Return stable mac address of device
+    '''
+    value = random.Random(name).getrandbits(24) + offset
+    return '00:1f:ce:' + ':'.join(f'{(value >> shift) & 0xff:02x}' for shift in (16, 8, 0))
+
+
+def get_routeros_config(name):
+    '''
+    Return export compact of RouterOS device
+    '''
+    lines = [f'# {strftime("%b/%d/%Y %H:%M:%S", gmtime()).lower()} by RouterOS 6.46.5',
+             f'# software id = {get_serial(name, 4)}-{get_serial(name[::-1], 4)}',
+             '#',
+             '# model = RBM33G',
+             f'# serial number = {get_serial(name)}',
+             '/interface bridge',
+             'add name=bridge-lan',
+             '/interface bridge port']
+    lines.extend(f'add bridge=bridge-lan interface=ether{num}' for num in range(2, INTERFACES + 1))
+    lines.extend(['/ip address',
+                  'add address=192.168.88.1/24 interface=bridge-lan network=192.168.88.0',
+                  '/ip dns',
+                  'set allow-remote-requests=yes servers=192.168.88.254',
+                  '/system identity',
+                  f'set name={name}',
+                  '/system ntp client',
+                  'set enabled=yes primary-ntp=192.168.88.254'])
+    return '\n'.join(lines) + '\n'
+
+
+def get_routeros_outputs(name):
+    '''
+    Return dict {command: output} of RouterOS device
+    '''
+    users = '\n'.join(f'add address="" disabled=no group={"full" if level == 15 else "read"} name={user}'
+                      for user, level in USERS)
+    return {
+        'system resource print': '\n'.join([
+            '                   uptime: 8h42m20s',
+            '                  version: 6.46.5 (stable)',
+            '               build-time: Apr/07/2020 08:28:27',
+            '         factory-software: 6.43.10',
+            '              free-memory: 207.7MiB',
+            '             total-memory: 256.0MiB',
+            '                      cpu: MIPS 1004Kc V2.15',
+            '                cpu-count: 4',
+            '            cpu-frequency: 880MHz',
+            '                 cpu-load: 4%',
+            '           free-hdd-space: 6.8MiB',
+            '          total-hdd-space: 16.3MiB',
+            '  write-sect-since-reboot: 1181',
+            '         write-sect-total: 13673',
+            '               bad-blocks: 0%',
+            '        architecture-name: mmips',
+            '               board-name: RBM33G',
+            '                 platform: MikroTik']) + '\n',
+        'system routerboard print': '\n'.join([
+            '       routerboard: yes',
+            '        board-name: RBM33G',
+            '             model: RBM33G',
+            f'     serial-number: {get_serial(name)}',
+            '     firmware-type: mt7621L',
+            '  factory-firmware: 6.43.10',
+            '  current-firmware: 6.46.5',
+            '  upgrade-firmware: 6.46.5']) + '\n',
+        'system package print terse': '\n'.join(
+            f' {num} name={package} version=6.46.5 build-time=apr/07/2020 08:28:27 scheduled=""'
+            for num, package in enumerate(['routeros-mmips', 'system', 'ipv6', 'wireless', 'hotspot',
+                                           'mpls', 'routing', 'ppp', 'dhcp', 'security', 'advanced-tools']))
+        + '\n',
+        'user export verbose compact': '\n'.join([
+            f'# {strftime("%b/%d/%Y %H:%M:%S", gmtime()).lower()} by RouterOS 6.46.5',
+            '/user group',
+            'set read name=read policy=local,telnet,ssh,reboot,read,test,winbox,password,web,sniff,sensitive,api',
+            '/user',
+            users]) + '\n',
+        'export compact': get_routeros_config(name),
+    }
+
+
+def get_cisco_users(secret):
+    '''
+    Return username lines of cisco-like config
+    '''
+    return [f'username {user} privilege {level} {secret} 5 $1${get_serial(user, 4)}$'
+            f'{get_serial(user + secret, 22)}' for user, level in USERS]
+
+
+def get_qtech_outputs(name):
+    '''
+    Return dict {command: output} of Qtech device
+    '''
+    config = '\n'.join(
+        ['!version 7.0.3.5(R0241.0142)',
+         f'hostname {name}',
+         '!'] + get_cisco_users('password') +
+        ['!', 'authentication line vty login local', '!'] +
+        [f'Interface Ethernet1/0/{num}\n switchport access vlan {num % 4 + 10}\n!' for num in range(1, INTERFACES + 1)] +
+        ['interface Vlan1', ' ip address 192.168.1.2 255.255.255.0', '!',
+         'ip default-gateway 192.168.1.1', '!', 'end']) + '\n'
+    return {
+        'terminal width 511': '',
+        'terminal length 0': '',
+        'show version': '\n'.join([
+            '  QTECH Switch',
+            '  Device: QSW-2800-28T-AC, sys-mac ' + get_mac(name),
+            '  CPU MAC ' + get_mac(name),
+            '  VLAN MAC ' + get_mac(name, 1),
+            '  SoftWare Version 7.0.3.5(R0241.0142)',
+            '  BootRom Version 7.2.25',
+            '  HardWare Version 1.0.3',
+            '  CPLD Version N/A',
+            f'  Serial No.:{get_serial(name, 13)}',
+            '  Copyright (C) 2001-2017 by QTECH LLC.',
+            '  All rights reserved',
+            '  Uptime is 12 weeks, 3 days, 4 hours, 25 minutes']) + '\n',
+        'show run': config,
+        'show running-config': config,
+        'show startup': config,
+        'show startup-config': config,
+    }
+
+
+def get_ios_outputs(name):
+    '''
+    Return dict {command: output} of IOS device
+    '''
+    config = '\n'.join(
+        ['Building configuration...', '', f'Current configuration : {4096 + len(name)} bytes', '!',
+         'version 15.0', 'service timestamps debug datetime msec', 'no service password-encryption', '!',
+         f'hostname {name}', '!'] + get_cisco_users('secret') +
+        ['!', 'aaa new-model', '!', 'ip domain-name example.local', '!'] +
+        [f'interface FastEthernet0/{num}\n switchport access vlan {num % 4 + 10}\n switchport mode access\n!'
+         for num in range(1, INTERFACES + 1)] +
+        ['interface Vlan1', ' ip address 192.168.1.3 255.255.255.0', '!', 'ip default-gateway 192.168.1.1', '!',
+         'line vty 0 15', ' transport input ssh', '!', 'end']) + '\n'
+    return {
+        'terminal width 511': '',
+        'terminal length 0': '',
+        'show version': '\n'.join([
+            'Cisco IOS Software, C2960 Software (C2960-LANBASEK9-M), Version 15.0(2)SE11, RELEASE SOFTWARE (fc3)',
+            'Technical Support: http://www.cisco.com/techsupport',
+            'Copyright (c) 1986-2017 by Cisco Systems, Inc.',
+            'Compiled Sat 19-Aug-17 09:34 by prod_rel_team',
+            '',
+            'ROM: Bootstrap program is C2960 boot loader',
+            'BOOTLDR: C2960 Boot Loader (C2960-HBOOT-M) Version 12.2(44)SE5, RELEASE SOFTWARE (fc1)',
+            '',
+            f'{name} uptime is 1 year, 2 weeks, 3 days, 4 hours, 5 minutes',
+            'System returned to ROM by power-on',
+            'System image file is "flash:/c2960-lanbasek9-mz.150-2.SE11.bin"',
+            '',
+            'cisco WS-C2960-24TT-L (PowerPC405) processor (revision B0) with 65536K bytes of memory.',
+            f'Processor board ID FOC{get_serial(name, 8)}',
+            'Last reset from power-on',
+            '24 FastEthernet interfaces',
+            '2 Gigabit Ethernet interfaces',
+            '',
+            f'Base ethernet MAC Address       : {get_mac(name).upper()}',
+            'Model number                    : WS-C2960-24TT-L',
+            f'System serial number            : FOC{get_serial(name, 8)}',
+            '',
+            'Configuration register is 0xF']) + '\n',
+        'show running-config': config,
+        'show startup-config': config.replace('Building configuration...\n\nCurrent configuration',
+                                              'Using 4096 out of 65536 bytes\n!\nCurrent configuration'),
+        'show run': config,
+    }
+
+
+def get_junos_outputs(name):
+    '''
+    Return dict {command: output} of JunOS device
+    '''
+    login = '\n'.join(f'user {user} {{\n    uid {2000 + num};\n    class {"super-user" if level == 15 else "read-only"};\n'
+                      f'    authentication {{\n        encrypted-password "$1${get_serial(user, 8)}$'
+                      f'{get_serial(user + name, 22)}"; ## SECRET-DATA\n    }}\n}}'
+                      for num, (user, level) in enumerate(USERS))
+    return {
+        'set cli screen-width 511': 'Screen width set to 511',
+        'set cli complete-on-space off': 'Disabling complete-on-space',
+        'set cli screen-length 0': 'Screen length set to 0',
+        'show version': '\n'.join([
+            f'Hostname: {name}',
+            'Model: srx240h2',
+            'JUNOS Software Release [12.1X46-D40.2]']) + '\n',
+        'show configuration system login': login + '\n',
+    }
+
+
+# set mapping from platform to outputs of device
+map_platform_outputs = {core_normalize.PLATFORM_ROUTEROS: get_routeros_outputs,
+                        core_normalize.PLATFORM_QTECH: get_qtech_outputs,
+                        core_normalize.PLATFORM_IOS: get_ios_outputs,
+                        core_normalize.PLATFORM_JUNOS: get_junos_outputs}
+
+# set mapping from platform to output of unknown command
+map_platform_error = {core_normalize.PLATFORM_ROUTEROS: 'bad command name {command} (line 1 column 1)',
+                      core_normalize.PLATFORM_QTECH: '% Invalid input detected at \'^\' marker.',
+                      core_normalize.PLATFORM_IOS: '% Invalid input detected at \'^\' marker.',
+                      core_normalize.PLATFORM_JUNOS: 'syntax error, expecting <command>.'}
+
+
+def filter_output(output, pipe):
+    '''
+    Return output after cisco-like pipe: include, exclude, section
+    '''
+    mode, _, pattern = pipe.partition(' ')
+    lines = output.splitlines()
+    if mode.startswith('i'):
+        lines = [line for line in lines if re.search(pattern, line)]
+    elif mode.startswith('e'):
+        lines = [line for line in lines if not re.search(pattern, line)]
+    elif mode.startswith('s'):
+        section = list()
+        in_section = False
+        for line in lines:
+            if not line.startswith(' '):
+                in_section = bool(re.search(pattern, line))
+            if in_section:
+                section.append(line)
+        lines = section
+    return ''.join(f'{line}\n' for line in lines)
+
+
+class SimDevice:
+    '''
+    Simulated device: outputs of commands, prompt and files of one device
+    '''
+
+    def __init__(self, name, platform, port, files_dir, latency=LATENCY, backup_size=BACKUP_SIZE):
+        self.name = name
+        self.platform = platform
+        self.port = port
+        self.files_dir = os.path.join(files_dir, name)
+        self.latency = latency
+        self.backup_size = backup_size
+        self.outputs = map_platform_outputs[platform](name)
+        self.saves = 0
+        os.makedirs(self.files_dir, exist_ok=True)
+
+    def get_prompt(self, username):
+        '''
+        Return prompt of device cli
+        '''
+        if self.platform == core_normalize.PLATFORM_ROUTEROS:
+            return f'[{username}@{self.name}] > '
+        if self.platform == core_normalize.PLATFORM_JUNOS:
+            return f'\n{username}@{self.name}> '
+        return f'{self.name}#'
+
+    def save_backup(self, filename):
+        '''
+        Save RouterOS binary backup, every save change only few bytes of backup
+        '''
+        self.saves += 1
+        content = bytearray(random.Random(self.name).getrandbits(8 * self.backup_size).to_bytes(self.backup_size,
+                                                                                                 'little'))
+        changed = f'{self.saves}:{time.time()}'.encode().ljust(BACKUP_CHANGED, b'\0')[:BACKUP_CHANGED]
+        offset = random.Random(self.saves).randrange(self.backup_size - BACKUP_CHANGED)
+        content[offset:offset + BACKUP_CHANGED] = changed
+        with open(os.path.join(self.files_dir, filename), 'wb') as backup_file:
+            backup_file.write(b'\x88\xac\xa1\xb1' + bytes(content))
+
+    def run_command(self, command):
+        '''
+        Return output of command, commands of RouterOS with file= save file on device
+        '''
+        command = ' '.join(command.split())
+        if self.platform == core_normalize.PLATFORM_ROUTEROS:
+            command = command.lstrip('/')
+            match = re.fullmatch(r'system backup save .*name=(\S+)', command)
+            if match:
+                self.save_backup(f'{match.group(1)}.backup')
+                return 'Configuration backup saved\n'
+            match = re.fullmatch(r'export( compact)? file=(\S+)', command)
+            if match:
+                with open(os.path.join(self.files_dir, f'{match.group(2)}.rsc'), 'w') as export_file:
+                    export_file.write(get_routeros_config(self.name))
+                return ''
+        command, _, pipe = command.partition(' | ')
+        if command not in self.outputs:
+            return map_platform_error[self.platform].format(command=command) + '\n'
+        output = self.outputs[command]
+        if pipe:
+            output = filter_output(output, pipe)
+        return output
+
+    async def run_shell(self, process, username):
+        '''
+        Cli of device: echo of input, output of command after latency, prompt
+        '''
+        prompt = self.get_prompt(username)
+        process.stdout.write(prompt)
+        line = ''
+        last = ''
+        try:
+            while True:
+                data = await process.stdin.read(1)
+                if not data:
+                    break
+                # cr lf from client is one enter
+                if data == '\n' and last == '\r':
+                    last = data
+                    continue
+                last = data
+                if data in '\r\n':
+                    process.stdout.write('\r\n')
+                    if line.strip():
+                        await asyncio.sleep(self.latency)
+                        if line.strip() in ('quit', 'exit'):
+                            break
+                        process.stdout.write(self.run_command(line).replace('\n', '\r\n'))
+                    line = ''
+                    process.stdout.write(prompt)
+                else:
+                    line += data
+                    process.stdout.write(data)
+        except (asyncssh.BreakReceived, asyncssh.TerminalSizeChanged):
+            pass
+        process.exit(0)
+
+    async def run_process(self, process):
+        '''
+        Handle session: command of exec channel or interactive shell
+        '''
+        username = process.get_extra_info('username').split('+')[0]
+        if process.command:
+            await asyncio.sleep(self.latency)
+            process.stdout.write(self.run_command(process.command).replace('\n', '\r\n'))
+            process.exit(0)
+        else:
+            await self.run_shell(process, username)
+
+
+class SimServer(asyncssh.SSHServer):
+    '''
+    Password check of device, RouterOS login options after '+' in username ignored
+    '''
+
+    def __init__(self, login_latency=LOGIN_LATENCY):
+        self.login_latency = login_latency
+
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    async def validate_password(self, username, password):
+        await asyncio.sleep(self.login_latency)
+        return username.split('+')[0] == USERNAME and password == PASSWORD
+
+
+async def serve(devices, login_latency, ready):
+    '''
+    Start ssh servers of devices and wait forever
+    '''
+    key = asyncssh.generate_private_key('ssh-ed25519')
+    for device in devices:
+        await asyncssh.create_server(lambda: SimServer(login_latency), ADDRESS, device.port,
+                                     server_host_keys=[key], process_factory=device.run_process,
+                                     sftp_factory=lambda chan, device=device: asyncssh.SFTPServer(
+                                         chan, chroot=device.files_dir.encode()),
+                                     allow_scp=True, line_editor=False, backlog=1000, reuse_address=True)
+    ready.set()
+    await asyncio.Event().wait()
+
+
+def run_devices(fleet, files_dir, latency, login_latency, backup_size, ready):
+    '''
+    Run devices of fleet in event loop of process
+    '''
+    # writes to closed sessions of disconnected clients not errors of devices
+    logging.getLogger('asyncio').setLevel(logging.ERROR)
+    devices = [SimDevice(device['name'], device['platform'], device['port'], files_dir, latency, backup_size)
+               for device in fleet]
+    asyncio.run(serve(devices, login_latency, ready))
+
+
+def start_fleet(fleet, files_dir=None, latency=LATENCY, login_latency=LOGIN_LATENCY, backup_size=BACKUP_SIZE,
+                processes=1):
+    '''
+    Start devices of fleet in processes, wait until all devices listen
+    Return list of processes
+    '''
+    logger = logging.getLogger(__name__)
+    files_dir = files_dir or tempfile.mkdtemp(prefix='sim_devices_')
+    result = list()
+    for num in range(processes):
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=run_devices, daemon=True,
+                                          args=(fleet[num::processes], files_dir, latency, login_latency,
+                                                backup_size, ready))
+        process.start()
+        result.append((process, ready))
+    for process, ready in result:
+        while not ready.wait(0.5):
+            if not process.is_alive():
+                stop_fleet([process for process, _ in result])
+                raise RuntimeError(f'Simulated devices not started, exit code {process.exitcode}')
+    logger.info(f'Started {len(fleet)} simulated devices in {processes} processes, files in {files_dir}')
+    return [process for process, _ in result]
+
+
+def stop_fleet(processes):
+    '''
+    Stop processes of devices
+    '''
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def main():
+    '''
+    Main
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info("Start simulated devices")
+    parser = argparse.ArgumentParser(description='Simulated network devices for load tests')
+    parser.add_argument('--hosts', '-n', action='store', type=int, default=10,
+                        help="Count of devices")
+    parser.add_argument('--base-port', '-p', action='store', type=int, default=BASE_PORT,
+                        help="Port of first device")
+    parser.add_argument('--latency', '-l', action='store', type=float, default=LATENCY,
+                        help="Latency of command, seconds")
+    parser.add_argument('--login-latency', action='store', type=float, default=LOGIN_LATENCY,
+                        help="Latency of password check, seconds")
+    parser.add_argument('--backup-size', action='store', type=int, default=BACKUP_SIZE,
+                        help="Size of RouterOS backup, bytes")
+    parser.add_argument('--processes', action='store', type=int, default=1,
+                        help="Count of processes for devices")
+    args = parser.parse_args()
+
+    fleet = get_fleet(args.hosts, args.base_port)
+    processes = start_fleet(fleet, latency=args.latency, login_latency=args.login_latency,
+                            backup_size=args.backup_size, processes=args.processes)
+    for device in fleet:
+        print(f"{device['name']}\t{device['platform']}\t{ADDRESS}:{device['port']}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop_fleet(processes)
+    logger.info("End simulated devices")
+
+
+configure_logging()
+if __name__ == "__main__":
+    main()
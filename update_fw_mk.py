@@ -5,8 +5,9 @@ Module for update fw routeros devices
 
 import logging
 
-from nornir import InitNornir
 from nornir.core.filter import F
+import core_runner
+import core_metrics
 from packaging import version
 import core_routeros_task
 import core_task
@@ -35,7 +36,7 @@ def main():
     logger.info("Start program for update fw RouterOS devices")
 
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file="config.yaml")
+    all_devices = core_runner.init_nornir(config_file="config.yaml")
 
     # Set auth information
     logger.debug('Fill access info from vault {}'.format(VAULT))
@@ -56,6 +57,7 @@ def main():
         logger.info(f'FW was upgrade on {device} - need reboot for activate')
     for device in result['failed']:
         logger.error(f'FW not upgrade on {device} - check log')
+    core_metrics.export('update_fw_mk')
     logger.info("End program for update fw. Please reboot devices manualy")
 
 configure_logging()
@@ -5,18 +5,31 @@ Module for update routeros devices
 
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from nornir import InitNornir
+import numpy as np
 from nornir.core.filter import F
+import core_runner
+import core_metrics
 import core_routeros_task
 import core_task
+import core_transfer
+import core_facts
 
 VAULT = 'inventory/creds.yaml'
 PASSWORDVAULT = 'private/vault.passwd'
 CHECKSUM_URL = 'https://mikrotik.com/download'
 VERSION = '6.47.7'
 PACKAGES_DIR = 'routeros_package'
+# facts of devices saved per run
+FACTS_DIR = 'facts'
 FREE_MEMORY_LIMIT = 50*1024*1024
+# count of versions keep in PACKAGES_DIR
+KEEP_VERSIONS = 2
+# limits for upload packages: all devices, one device, bytes/sec (None - without limit)
+MAX_TRANSFERS = 10
+MAX_TRANSFERS_PER_HOST = 1
+TRANSFER_RATE_LIMIT = None
 
 
 def configure_logging():
@@ -32,6 +45,41 @@ def configure_logging():
     console.setFormatter(formatter)
     logger.addHandler(console)
 
+
+def get_upload_plan(device, all_devices, packages_dir=PACKAGES_DIR):
+    '''
+    Build list of packages for upload to device, packages staged on device by previous run skipped
+    Output - (transport, list of files, size of upload in bytes), None if device skipped
+    Device with error of connect or list of files marked with error and skipped, other devices planned
+    '''
+    logger = logging.getLogger(__name__)
+    logger.info(f'Check device {device.hostname} for need update')
+    logger.info(f'Device {device.hostname} version {device.version} - need update to {VERSION}')
+    logger.debug(f'Build list package for transfer to device {device.hostname}')
+    update_file_list = core_routeros_task.build_update_filelist(device, VERSION, packages_dir)
+    missing_files = [update_file for update_file in update_file_list if not os.path.isfile(update_file)]
+    if missing_files:
+        logger.error(f'Packages {missing_files} not found, skip device {device.hostname}')
+        return None
+    try:
+        transport = core_task.get_host_transport(all_devices.inventory.hosts[device.hostname], all_devices.config)
+        # packages staged on device by previous run not upload again
+        device_files = core_task.sftp_list_files(transport)
+    except Exception as error:
+        logger.error(f'Failed list files on device {device.hostname}, skip device: {error}')
+        all_devices.inventory.hosts[device.hostname]['error'] = True
+        return None
+    update_file_list = [update_file for update_file in update_file_list
+                        if device_files.get(os.path.basename(update_file)) != os.path.getsize(update_file)]
+    # only partial files smaller than package continued, bigger files uploaded again
+    remote_sizes = [device_files.get(os.path.basename(update_file), 0) for update_file in update_file_list]
+    size_files = sum(local_size - (remote_size if remote_size < local_size else 0)
+                     for local_size, remote_size in zip(map(os.path.getsize, update_file_list), remote_sizes))
+    logger.info(f'Device {device.hostname} need {size_files/(1024*1024)} Mb')
+    result = (transport, update_file_list, size_files)
+    return result
+
+
 def main():
     '''
     Main
@@ -40,7 +88,7 @@ def main():
     logger.info("Start program for update RouterOS devices")
 
     logger.debug("Init nornir enviroment")
-    all_devices = InitNornir(config_file="config.yaml")
+    all_devices = core_runner.init_nornir(config_file="config.yaml")
 
     # Set auth information
     logger.debug('Fill access info from vault {}'.format(VAULT))
@@ -55,33 +103,55 @@ def main():
         all_devices.filter(F(groups__contains="routeros")))
 
     device_summary = core_task.summary_devices_descr(routeros_info, routeros_packages)
+    facts = core_facts.FactsTable.from_records(device_summary)
+    facts_path = facts.save(FACTS_DIR)
+    logger.debug(f'Save facts of devices to {facts_path}')
     logger.info('Start precheck for updating')
     file_md5_map = core_routeros_task.get_checksum(CHECKSUM_URL, VERSION)
-    for device in device_summary:
-        logger.warning(f'Check device {device.hostname} for need update')
-        if device.version != VERSION:
-            logger.info(f'Device {device.hostname} version {device.version} - need update to {VERSION}')
-            packages_file = core_routeros_task.download_packages(VERSION, device.arch,
-                                                                 download_dir=PACKAGES_DIR,
-                                                                 hash_dict=file_md5_map)
-            if packages_file:
-                core_task.unzip_file(packages_file, PACKAGES_DIR)
-            logger.debug(f'Build list package for transfer to device {device.hostname}')
-            update_file_list = core_routeros_task.build_update_filelist(device, VERSION, PACKAGES_DIR)
-            size_files = core_task.sum_size_files(update_file_list)
-            logger.info(f'Device {device.hostname} need {size_files/(1024*1024)} Mb')
-            # TODO Do with nornir.plugins.tasks.files.sftp
-            logger.debug(f'Free memory {device.freememory}Mb. Check memory size for upload files')
-            if float(device.freememory)*1024*1024 - size_files > FREE_MEMORY_LIMIT:
-                logger.debug(f'Device {device.hostname} have enough memory for upload packages')
-                logger.info(f'Update device {device.hostname}')
-                for update_file in update_file_list:
-                    dst_file = os.path.basename(update_file)
-                    core_task.scp_put_file(device.address, update_file, dst_file,
-                                           all_devices.inventory.hosts[device.hostname].username,
-                                           all_devices.inventory.hosts[device.hostname].password)
-            else:
-                logger.error(f'Device {device.hostname} not have free memory for upload update packages')
+    scheduler = core_transfer.TransferScheduler(MAX_TRANSFERS, MAX_TRANSFERS_PER_HOST, TRANSFER_RATE_LIMIT,
+                                                transfer_func=core_task.sftp_put_file_resume)
+    update_devices = [device for device in device_summary if device.version != VERSION]
+    packages_files = core_routeros_task.prepare_packages(VERSION, [device.arch for device in update_devices],
+                                                         download_dir=PACKAGES_DIR, hash_dict=file_md5_map)
+    core_routeros_task.evict_packages(PACKAGES_DIR, KEEP_VERSIONS, keep_versions=[VERSION])
+    logger.debug('Extract only packages installed on devices')
+    arch_packages = dict()
+    for device in update_devices:
+        arch_packages.setdefault(device.arch, set()).update(
+            os.path.basename(update_file)
+            for update_file in core_routeros_task.build_update_filelist(device, VERSION, PACKAGES_DIR))
+    for (_, arch), packages_file in packages_files.items():
+        if packages_file:
+            core_task.extract_members(packages_file, sorted(arch_packages[arch]), PACKAGES_DIR, file_md5_map)
+    for device in update_devices:
+        if not packages_files[(VERSION, device.arch)]:
+            logger.error(f'Packages for arch {device.arch} not downloaded, skip device {device.hostname}')
+    plan_devices = [device for device in update_devices if packages_files[(VERSION, device.arch)]]
+    logger.debug('List files on devices concurrently')
+    with ThreadPoolExecutor(MAX_TRANSFERS) as pool:
+        plans = pool.map(get_upload_plan, plan_devices, [all_devices] * len(plan_devices))
+        upload_plan = {device.hostname: plan for device, plan in zip(plan_devices, plans) if plan}
+    logger.debug('Check memory size for upload files on all devices')
+    need_bytes = np.array([upload_plan[hostname][2] if hostname in upload_plan else 0
+                           for hostname in facts['hostname']], dtype=float)
+    low_memory = core_facts.low_memory_mask(facts, need_bytes, FREE_MEMORY_LIMIT)
+    for hostname, free_memory, is_low in zip(facts['hostname'], facts['freememory'], low_memory):
+        if hostname not in upload_plan:
+            continue
+        if is_low:
+            logger.error(f'Device {hostname} not have free memory ({free_memory}Mb) for upload update packages')
+            continue
+        logger.info(f'Update device {hostname}')
+        transport, update_file_list, _ = upload_plan[hostname]
+        for update_file in update_file_list:
+            dst_file = os.path.basename(update_file)
+            scheduler.add(hostname, update_file, dst_file, transport=transport)
+    logger.info('Upload packages to devices')
+    result = scheduler.run()
+    for job in result['failed']:
+        logger.error(f"Package {job['src']} not upload to device {job['host']}")
+    core_task.close_ssh_pool()
+    core_metrics.export('update_mk')
     logger.info("End program for update. Please reboot devices manual")
 
 configure_logging()